@@ -0,0 +1,103 @@
+"""Costo de arranque en frío por handler: cada medición es un intérprete nuevo que importa el módulo (fase INIT de
+Lambda) y después toca los clientes que usa en su primera invocación.
+
+Uso:
+    python bench/cold_start.py                           # todos los handlers, 5 repeticiones
+    python bench/cold_start.py --handlers upload_handler job_status_handler --runs 10
+    python bench/cold_start.py --save bench/results/cold_start.json
+    python bench/cold_start.py --baseline bench/results/cold_start.json
+
+Reporta medianas: 'init' (import del handler), 'first_use' (crear los clientes de la primera invocación),
+los clientes boto3 creados durante el import y el RSS al terminar. No hace llamadas de red.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+SRC_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+# Handler -> clientes de módulo que usa en cada invocación
+HANDLERS = {
+    'upload_handler': ('s3',),
+    'job_status_handler': ('s3',),
+    'start_job_handler': ('s3', 'lambda_client'),
+    'discover_sessions_handler': ('s3', 'lambda_client'),
+    'ingest_archive_handler': ('s3', 'lambda_client'),
+    'append_session_handler': ('s3', 'lambda_client'),
+    'process_job_handler': ('s3', 'transcribe', 'bedrock', 'lambda_client'),
+    'analyze_session_handler': ('s3', 'transcribe', 'bedrock'),
+    'analyze_handler': ('s3', 'transcribe', 'bedrock'),
+}
+
+PROBE = r'''
+import importlib, json, resource, sys, time
+import botocore.client
+created = []
+original = botocore.client.BaseClient.__init__
+def counting(self, *args, **kwargs):
+    created.append(type(self).__name__)
+    original(self, *args, **kwargs)
+botocore.client.BaseClient.__init__ = counting
+sys.path.insert(0, sys.argv[1])
+start = time.perf_counter()
+module = importlib.import_module(sys.argv[2])
+imported = time.perf_counter()
+at_import = len(created)
+for name in sys.argv[3:]:
+    getattr(module, name).meta
+used = time.perf_counter()
+print(json.dumps({'init_ms': (imported - start) * 1000, 'first_use_ms': (used - imported) * 1000,
+                  'clients_at_import': at_import, 'rss_mb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024}))
+'''
+
+def measure(handler, clients, runs):
+    env = dict(os.environ, AUDIO_BUCKET='emova-bench', PROCESS_FUNCTION_NAME='emova-process-job-bench',
+               AWS_DEFAULT_REGION=os.environ.get('AWS_DEFAULT_REGION', 'us-east-1'),
+               AWS_ACCESS_KEY_ID='bench', AWS_SECRET_ACCESS_KEY='bench', PYTHONDONTWRITEBYTECODE='1')
+    samples = []
+    for _ in range(runs):
+        out = subprocess.run([sys.executable, '-c', PROBE, SRC_DIR, handler, *clients], env=env,
+                             capture_output=True, text=True, check=True).stdout
+        samples.append(json.loads(out.strip().splitlines()[-1]))
+    median = lambda key: round(statistics.median(s[key] for s in samples), 1)
+    return {'handler': handler, 'init_ms': median('init_ms'), 'first_use_ms': median('first_use_ms'),
+            'total_ms': round(median('init_ms') + median('first_use_ms'), 1),
+            'clients_at_import': samples[0]['clients_at_import'], 'rss_mb': median('rss_mb')}
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--handlers', nargs='+', default=list(HANDLERS), choices=list(HANDLERS))
+    parser.add_argument('--runs', type=int, default=5, help='Intérpretes nuevos por handler')
+    parser.add_argument('--save', help='Guardar resultados como JSON (baseline)')
+    parser.add_argument('--baseline', help='JSON de una corrida anterior para comparar')
+    args = parser.parse_args()
+
+    baseline = {}
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as f:
+            baseline = {r['handler']: r for r in json.load(f)['results']}
+
+    # Una corrida descartada para calentar el caché de archivos del sistema
+    measure(args.handlers[0], HANDLERS[args.handlers[0]], 1)
+    print(f"{'handler':<28}{'init ms':>10}{'1er uso ms':>12}{'total ms':>10}{'clientes':>10}{'RSS MB':>8}")
+    results = []
+    for handler in args.handlers:
+        result = measure(handler, HANDLERS[handler], args.runs)
+        results.append(result)
+        line = (f"{handler:<28}{result['init_ms']:>10}{result['first_use_ms']:>12}{result['total_ms']:>10}"
+                f"{result['clients_at_import']:>10}{result['rss_mb']:>8}")
+        previous = baseline.get(handler)
+        if previous:
+            line += f"   total {(result['total_ms'] - previous['total_ms']) / previous['total_ms'] * 100:+.1f}% (baseline {previous['total_ms']})"
+        print(line)
+
+    if args.save:
+        os.makedirs(os.path.dirname(args.save) or '.', exist_ok=True)
+        with open(args.save, 'w', encoding='utf-8') as f:
+            json.dump({'args': vars(args), 'results': results}, f, indent=2)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,85 @@
+"""Datos del benchmark: las fixtures de 'Prueba de audio' y sesiones sintéticas escaladas a partir de ellas.
+
+Los clips sintéticos son recortes de los WAV reales (2-6 s, como un pase típico de PTT) con una marca única
+en las primeras muestras, así cada clip tiene un hash distinto y no pega en la caché de transcripciones.
+"""
+import glob
+import os
+import random
+from datetime import datetime, timedelta
+from xml.sax.saxutils import quoteattr
+
+import batching
+
+FIXTURES_DIR = os.path.join(os.path.dirname(__file__), '..', 'Prueba de audio')
+TALK_GROUP = '6752'
+TETRA_DATE = '%d/%m/%Y %H.%M.%S,%f'
+UTC_OFFSET = timedelta(hours=3)
+
+def load_fixtures(base_dir=FIXTURES_DIR):
+    read = lambda path: open(path, 'rb').read()
+    return {
+        'holders': read(os.path.join(base_dir, 'Holders.xml')),
+        'callrefs': read(os.path.join(base_dir, 'CallRefs.xml')),
+        'recordings': {os.path.basename(p): read(p) for p in sorted(glob.glob(os.path.join(base_dir, 'recordings', '*.xml')))},
+        'audios': {os.path.basename(p): read(p) for p in sorted(glob.glob(os.path.join(base_dir, 'audios', '*.wav')))}
+    }
+
+def fixture_session(s3, prefix, fixtures):
+    """Sube las fixtures tal cual bajo prefix. Retorna (audio_keys, xml_keys)"""
+    s3.seed(f'{prefix}/Holders.xml', fixtures['holders'])
+    s3.seed(f'{prefix}/CallRefs.xml', fixtures['callrefs'])
+    recordings = []
+    for name, data in fixtures['recordings'].items():
+        recordings.append(f'{prefix}/recordings/{name}')
+        s3.seed(recordings[-1], data)
+    audio_keys = []
+    for name, data in fixtures['audios'].items():
+        audio_keys.append(f'{prefix}/audios/{name}')
+        s3.seed(audio_keys[-1], data)
+    return audio_keys, {'holders': f'{prefix}/Holders.xml', 'callrefs': f'{prefix}/CallRefs.xml', 'recordings': recordings}
+
+def _tetra_date(dt):
+    return dt.strftime(TETRA_DATE)[:-3]
+
+def _clip_factory(params, frames, start, size, marker):
+    """Genera el WAV al leerlo (evita tener en memoria miles de clips)"""
+    return lambda: batching.write_wav(params, [marker, memoryview(frames)[start + len(marker):start + size]])
+
+def synthetic_session(s3, prefix, num_clips, fixtures, session_index=0, seed=0):
+    """Sesión de num_clips pases del grupo TALK_GROUP con CallRefs.xml y recordings/*.xml coherentes"""
+    rng = random.Random(f'{seed}-{session_index}')
+    sources = [batching.read_wav(data) for data in fixtures['audios'].values()]
+    holders = ('12746', '13544', '14727', '15162')
+    start = datetime(2024, 12, 28, 5, 0, 0) + timedelta(hours=session_index % 12)
+
+    callrefs, audio_keys, recordings = [], [], []
+    for i in range(num_clips):
+        params, frames = sources[i % len(sources)]
+        frame_bytes = params[0] * params[1]
+        source_seconds = len(frames) / frame_bytes / params[2]
+        seconds = min(source_seconds, rng.uniform(2, 6))
+        offset = int(rng.uniform(0, source_seconds - seconds) * params[2]) * frame_bytes
+        size = int(seconds * params[2]) * frame_bytes
+        marker = f'{session_index:04d}{i:06d}'.encode('ascii')
+
+        tetra_ref = f'{700000000 + session_index * 100000 + i}'
+        callref_id = f'{600000000 + session_index * 100000 + i}'
+        calling = rng.choice(holders)
+        duration = max(1, round(seconds))
+        callrefs.append(
+            f'  <callref ID="{callref_id}" TetraCallRef="{tetra_ref}" CallingID="{calling}" CalledID="{TALK_GROUP}" '
+            f'Importance="None" Priority="Normal" Type="Group" Encryption="None" FullDuplex="HD" '
+            f'FromDateUTC="{_tetra_date(start + UTC_OFFSET)}" FromDateLoc="{_tetra_date(start)}" Duration="{duration}" NotComplete="0" Note="0" />')
+        recording = (f'<?xml version="1.0" encoding="UTF-8"?>\n<reclist>\n  <recording ID="{callref_id}" StartDate={quoteattr(_tetra_date(start + UTC_OFFSET))} '
+                     f'Duration="{duration}" CallingID="{calling}" CalledID="{TALK_GROUP}" TalkingID="{calling}" FileSize="{size}" />\n</reclist>\n')
+
+        audio_keys.append(f'{prefix}/audios/{tetra_ref}.wav')
+        s3.seed(audio_keys[-1], _clip_factory(params, frames, offset, size, marker))
+        recordings.append(f'{prefix}/recordings/{callref_id}.xml')
+        s3.seed(recordings[-1], recording.encode('utf-8'))
+        start += timedelta(seconds=seconds + rng.uniform(1, 12))
+
+    s3.seed(f'{prefix}/Holders.xml', fixtures['holders'])
+    s3.seed(f'{prefix}/CallRefs.xml', ('<?xml version="1.0" encoding="UTF-8"?>\n<callreflist>\n' + '\n'.join(callrefs) + '\n</callreflist>\n').encode('utf-8'))
+    return audio_keys, {'holders': f'{prefix}/Holders.xml', 'callrefs': f'{prefix}/CallRefs.xml', 'recordings': recordings}
@@ -0,0 +1,456 @@
+"""Dobles locales de S3, Transcribe, Bedrock y Lambda para el benchmark offline.
+
+Todos comparten un SimClock: las latencias simuladas se duermen escaladas (scale=0.1 -> 10x más rápido que AWS)
+y los handlers ven el mismo tiempo simulado a través de time.monotonic/time.time parcheados (ver harness.py).
+"""
+import hashlib
+import io
+import json
+import random
+import re
+import threading
+import time as _time
+import types
+import uuid
+import wave
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+
+from botocore.exceptions import ClientError, EventStreamError
+
+class SimClock:
+    """Reloj simulado compatible con el módulo time (monotonic, perf_counter, time, sleep)"""
+    def __init__(self, scale=0.1):
+        self.scale = scale
+        self._real0 = _time.perf_counter()
+        self._epoch = _time.time()
+
+    def monotonic(self):
+        return (_time.perf_counter() - self._real0) / self.scale
+
+    perf_counter = monotonic
+
+    def time(self):
+        return self._epoch + self.monotonic()
+
+    def sleep(self, seconds):
+        if seconds > 0:
+            _time.sleep(seconds * self.scale)
+
+    def now(self):
+        return datetime.fromtimestamp(self.time(), timezone.utc)
+
+    def __getattr__(self, name):
+        return getattr(_time, name)  # strftime, gmtime, etc. sin simular
+
+def client_error(code, operation, message=''):
+    return ClientError({'Error': {'Code': code, 'Message': message or code}}, operation)
+
+def wav_duration(data):
+    try:
+        with wave.open(io.BytesIO(data)) as w:
+            return w.getnframes() / w.getframerate()
+    except (wave.Error, EOFError):
+        return len(data) / 16000
+
+class FakeS3:
+    """Bucket en memoria con ETags, escrituras condicionales y conteo de llamadas por operación y prefijo.
+
+    Los objetos pueden guardarse como callable (se generan al leerlos) para no tener en memoria
+    miles de clips sintéticos.
+    """
+    class NoSuchKey(Exception):
+        pass
+
+    def __init__(self, clock, latency=0.02, mbps=100.0):
+        self.clock = clock
+        self.latency = latency
+        self.mbps = mbps
+        self.exceptions = types.SimpleNamespace(NoSuchKey=FakeS3.NoSuchKey, ClientError=ClientError)
+        self.reset()
+
+    def reset(self):
+        self.objects = {}  # key -> (bytes | callable, etag)
+        self.calls = Counter()
+        self.calls_by_prefix = Counter()
+        self.bytes_in = self.bytes_out = 0
+        self._lock = threading.Lock()
+
+    def seed(self, key, data):
+        """Carga un objeto sin contar la llamada (datos de la prueba)"""
+        etag = hashlib.md5(key.encode() if callable(data) else data).hexdigest()
+        self.objects[key] = (data, f'"{etag}"')
+
+    def read(self, key):
+        data = self.objects[key][0]
+        return data() if callable(data) else data
+
+    def _call(self, op, key='', size=0):
+        with self._lock:
+            self.calls[op] += 1
+            self.calls_by_prefix[(op, key.split('/', 1)[0])] += 1
+        self.clock.sleep(self.latency + size / (self.mbps * 1e6))
+
+    def get_object(self, Bucket, Key, Range=None, **kwargs):
+        if Key not in self.objects:
+            self._call('GetObject', Key)
+            raise FakeS3.NoSuchKey(Key)
+        data, etag = self.read(Key), self.objects[Key][1]
+        if Range:
+            start, _, end = Range.replace('bytes=', '').partition('-')
+            data = data[int(start):int(end) + 1 if end else None]
+        self._call('GetObject', Key, len(data))
+        self.bytes_out += len(data)
+        return {'Body': io.BytesIO(data), 'ETag': etag, 'ContentLength': len(data)}
+
+    def head_object(self, Bucket, Key, **kwargs):
+        self._call('HeadObject', Key)
+        if Key not in self.objects:
+            raise client_error('404', 'HeadObject', 'Not Found')
+        return {'ETag': self.objects[Key][1], 'ContentLength': len(self.read(Key))}
+
+    def put_object(self, Bucket, Key, Body, IfMatch=None, IfNoneMatch=None, **kwargs):
+        data = Body.encode('utf-8') if isinstance(Body, str) else Body.read() if hasattr(Body, 'read') else Body
+        self._call('PutObject', Key, len(data))
+        with self._lock:
+            current = self.objects.get(Key)
+            if IfNoneMatch == '*' and current or IfMatch and (not current or current[1] != IfMatch):
+                raise client_error('PreconditionFailed', 'PutObject')
+            etag = f'"{hashlib.md5(data).hexdigest()}"'
+            self.objects[Key] = (data, etag)
+        self.bytes_in += len(data)
+        return {'ETag': etag}
+
+    def upload_fileobj(self, Fileobj, Bucket, Key, ExtraArgs=None, **kwargs):
+        """Como el transfer manager de boto3 pero en un solo PutObject"""
+        self.put_object(Bucket=Bucket, Key=Key, Body=Fileobj.read(), **(ExtraArgs or {}))
+
+    def delete_object(self, Bucket, Key, **kwargs):
+        self._call('DeleteObject', Key)
+        self.objects.pop(Key, None)
+        return {}
+
+    def delete_objects(self, Bucket, Delete):
+        self._call('DeleteObjects', Delete['Objects'][0]['Key'] if Delete['Objects'] else '')
+        for obj in Delete['Objects']:
+            self.objects.pop(obj['Key'], None)
+        return {}
+
+    def list_objects_v2(self, Bucket, Prefix='', ContinuationToken=None, MaxKeys=1000, **kwargs):
+        self._call('ListObjectsV2', Prefix)
+        keys = sorted(k for k in list(self.objects) if k.startswith(Prefix))
+        start = int(ContinuationToken or 0)
+        page = keys[start:start + MaxKeys]
+        resp = {'Contents': [{'Key': k, 'Size': len(self.read(k)) if not callable(self.objects[k][0]) else 0} for k in page],
+                'KeyCount': len(page), 'IsTruncated': start + MaxKeys < len(keys)}
+        if resp['IsTruncated']:
+            resp['NextContinuationToken'] = str(start + MaxKeys)
+        return resp
+
+    def get_paginator(self, operation):
+        assert operation == 'list_objects_v2'
+        s3 = self
+
+        class Paginator:
+            def paginate(self, **kwargs):
+                token = None
+                while True:
+                    page = s3.list_objects_v2(**kwargs, **({'ContinuationToken': token} if token else {}))
+                    yield page
+                    token = page.get('NextContinuationToken')
+                    if not token:
+                        return
+        return Paginator()
+
+    def generate_presigned_url(self, ClientMethod, Params, ExpiresIn=3600, **kwargs):
+        self.calls['PresignUrl'] += 1  # Local, sin llamada de red
+        return f"https://fake-s3.local/{Params['Bucket']}/{Params['Key']}?expires={ExpiresIn}"
+
+WORDS = ('base', 'adelante', 'recibido', 'formación', 'andén', 'estación', 'autorizado', 'cambio', 'copiado',
+         'señal', 'vía', 'uno', 'dos', 'tres', 'cabecera', 'tren', 'detenido', 'liberado', 'confirmo', 'puesto')
+
+class FakeTranscribe:
+    """Transcribe batch: cola + procesamiento proporcional al audio, cuota de jobs concurrentes y fallos aleatorios"""
+    class LimitExceededException(Exception):
+        pass
+
+    class ConflictException(ClientError):
+        pass
+
+    def __init__(self, clock, s3, quota=250, queue_delay=5.0, base_seconds=8.0, rtf=0.3, jitter=0.2,
+                 failure_rate=0.0, throttle_rate=0.0, api_latency=0.05, seed=0):
+        self.clock, self.s3 = clock, s3
+        self.quota, self.queue_delay, self.base_seconds, self.rtf, self.jitter = quota, queue_delay, base_seconds, rtf, jitter
+        self.failure_rate, self.throttle_rate, self.api_latency = failure_rate, throttle_rate, api_latency
+        self.exceptions = types.SimpleNamespace(LimitExceededException=FakeTranscribe.LimitExceededException,
+                                                ConflictException=FakeTranscribe.ConflictException)
+        self.random = random.Random(seed)
+        self.reset()
+
+    def reset(self):
+        self.jobs = {}
+        self.calls = Counter()
+        self.audio_seconds = 0.0
+        self._lock = threading.Lock()
+
+    def _call(self, op):
+        with self._lock:
+            self.calls[op] += 1
+        self.clock.sleep(self.api_latency)
+
+    def _status(self, job, now):
+        if now < job['started']:
+            return 'QUEUED'
+        if now < job['completed']:
+            return 'IN_PROGRESS'
+        if job['failed']:
+            return 'FAILED'
+        if not job['written']:
+            self.s3.seed(job['output_key'], json.dumps(self._output(job)).encode('utf-8'))
+            job['written'] = True
+        return 'COMPLETED'
+
+    def _output(self, job):
+        rng = random.Random(job['name'])
+        items, t = [], 0.2
+        while t + 0.4 < job['duration']:
+            items.append({'type': 'pronunciation', 'start_time': f'{t:.2f}', 'end_time': f'{t + 0.35:.2f}',
+                          'alternatives': [{'confidence': '0.95', 'content': rng.choice(WORDS)}]})
+            if rng.random() < 0.15:
+                items.append({'type': 'punctuation', 'alternatives': [{'confidence': '0.0', 'content': ','}]})
+            t += rng.uniform(0.35, 0.7)
+        text = ''
+        for item in items:
+            content = item['alternatives'][0]['content']
+            text += content if item['type'] == 'punctuation' or not text else ' ' + content
+        return {'jobName': job['name'], 'results': {'transcripts': [{'transcript': text}], 'items': items}}
+
+    def start_transcription_job(self, TranscriptionJobName, Media, OutputBucketName, OutputKey, **kwargs):
+        self._call('StartTranscriptionJob')
+        now = self.clock.monotonic()
+        with self._lock:
+            active = sum(1 for job in self.jobs.values() if now < job['completed'])
+            if active >= self.quota or self.random.random() < self.throttle_rate:
+                self.calls['LimitExceeded'] += 1
+                raise FakeTranscribe.LimitExceededException('Concurrent job limit exceeded')
+            if TranscriptionJobName in self.jobs:
+                raise FakeTranscribe.ConflictException({'Error': {'Code': 'ConflictException', 'Message': 'job name already exists'}},
+                                                       'StartTranscriptionJob')
+        duration = wav_duration(self.s3.read(Media['MediaFileUri'].split('/', 3)[3]))
+        jitter = lambda: self.random.uniform(1 - self.jitter, 1 + self.jitter)
+        started = now + self.queue_delay * jitter()
+        with self._lock:
+            self.audio_seconds += duration
+            self.jobs[TranscriptionJobName] = {
+                'name': TranscriptionJobName, 'duration': duration, 'output_key': OutputKey, 'created': now, 'started': started,
+                'completed': started + (self.base_seconds + duration * self.rtf) * jitter(),
+                'failed': self.random.random() < self.failure_rate, 'written': False
+            }
+        return {'TranscriptionJob': {'TranscriptionJobName': TranscriptionJobName, 'TranscriptionJobStatus': 'QUEUED'}}
+
+    def _summary(self, job, now):
+        status = self._status(job, now)
+        at = lambda t: datetime.fromtimestamp(self.clock.time() - (now - t), timezone.utc)
+        summary = {'TranscriptionJobName': job['name'], 'TranscriptionJobStatus': status, 'CreationTime': at(job['created'])}
+        if status != 'QUEUED':
+            summary['StartTime'] = at(job['started'])
+        if status in ('COMPLETED', 'FAILED'):
+            summary['CompletionTime'] = at(job['completed'])
+        if status == 'FAILED':
+            summary['FailureReason'] = 'Simulated failure'
+        return summary
+
+    def get_transcription_job(self, TranscriptionJobName):
+        self._call('GetTranscriptionJob')
+        if TranscriptionJobName not in self.jobs:
+            raise client_error('BadRequestException', 'GetTranscriptionJob', 'job not found')
+        return {'TranscriptionJob': self._summary(self.jobs[TranscriptionJobName], self.clock.monotonic())}
+
+    def list_transcription_jobs(self, JobNameContains='', MaxResults=100, NextToken=None, Status=None):
+        self._call('ListTranscriptionJobs')
+        now = self.clock.monotonic()
+        with self._lock:
+            matching = sorted((job for name, job in self.jobs.items() if JobNameContains in name), key=lambda j: -j['created'])
+        summaries = [s for s in (self._summary(job, now) for job in matching) if not Status or s['TranscriptionJobStatus'] == Status]
+        start = int(NextToken or 0)
+        resp = {'TranscriptionJobSummaries': summaries[start:start + MaxResults]}
+        if start + MaxResults < len(summaries):
+            resp['NextToken'] = str(start + MaxResults)
+        return resp
+
+class FakeBedrock:
+    """bedrock-runtime: latencia por tokens de entrada/salida, throttling por concurrencia o aleatorio y fallos.
+    En streaming puede anteponer texto al JSON (preamble_rate), cortar la respuesta a la mitad (truncate_rate) o
+    cortar el stream con un evento de throttling (stream_throttle_rate), que botocore levanta como EventStreamError"""
+    class ThrottlingException(ClientError):
+        pass
+
+    class ModelErrorException(ClientError):
+        pass
+
+    def __init__(self, clock, base_seconds=1.0, input_tokens_per_second=20000, output_tokens_per_second=60,
+                 max_concurrency=0, throttle_rate=0.0, failure_rate=0.0, preamble_rate=0.0, truncate_rate=0.0,
+                 stream_throttle_rate=0.0, seed=0):
+        self.clock = clock
+        self.preamble_rate, self.truncate_rate, self.stream_throttle_rate = preamble_rate, truncate_rate, stream_throttle_rate
+        self.base_seconds, self.input_tps, self.output_tps = base_seconds, input_tokens_per_second, output_tokens_per_second
+        self.max_concurrency, self.throttle_rate, self.failure_rate = max_concurrency, throttle_rate, failure_rate
+        self.exceptions = types.SimpleNamespace(ThrottlingException=FakeBedrock.ThrottlingException,
+                                                ModelErrorException=FakeBedrock.ModelErrorException, ClientError=ClientError)
+        self.random = random.Random(seed)
+        self.reset()
+
+    def reset(self):
+        self.calls = Counter()
+        self.input_tokens = self.output_tokens = 0
+        self.in_flight = 0
+        self._lock = threading.Lock()
+
+    def _evaluation(self, prompt):
+        rng = random.Random(hashlib.md5(prompt.encode('utf-8')).hexdigest())
+        scores = {c: round(rng.uniform(5, 9.5), 1) for c in ('fraseologia', 'claridad', 'protocolo', 'formalidad')}
+        participants = re.search(r'Participantes: (.*)', prompt)
+        # Con la leyenda de la plantilla compacta ('A=Op-1, B=...') el modelo responde por alias
+        names = [n.split('=')[0] for n in (participants.group(1).split(', ') if participants else []) if n and n != 'No identificados']
+        return dict(scores, score=round(sum(scores.values()) / 4, 1),
+                    justification='Comunicación mayormente clara; faltan identificaciones en algunos pases.',
+                    errores_detectados=['Falta identificación del receptor', 'Confirmación incompleta'][:rng.randint(0, 2)],
+                    recommendations=['Identificar emisor y receptor en cada pase'],
+                    analisis_por_operador={n: {'score': round(rng.uniform(5, 9.5), 1), 'observacion': 'Sin observaciones'} for n in names})
+
+    def _begin(self, operation):
+        with self._lock:
+            self.calls[operation] += 1
+            if self.max_concurrency and self.in_flight >= self.max_concurrency or self.random.random() < self.throttle_rate:
+                self.calls['Throttled'] += 1
+                raise FakeBedrock.ThrottlingException({'Error': {'Code': 'ThrottlingException', 'Message': 'Too many requests'}}, operation)
+            if self.random.random() < self.failure_rate:
+                self.calls['Failed'] += 1
+                raise FakeBedrock.ModelErrorException({'Error': {'Code': 'ModelErrorException', 'Message': 'Simulated failure'}}, operation)
+            self.in_flight += 1
+
+    def _respond(self, body):
+        request = json.loads(body)
+        prompt = ''.join(m['content'] if isinstance(m['content'], str) else ''.join(c.get('text', '') for c in m['content'])
+                         for m in request['messages'])
+        text = json.dumps(self._evaluation(prompt), ensure_ascii=False)
+        usage = {'input_tokens': len(prompt) // 4, 'output_tokens': min(len(text) // 4, request.get('max_tokens', 2048))}
+        with self._lock:
+            self.input_tokens += usage['input_tokens']
+            self.output_tokens += usage['output_tokens']
+        return text, usage
+
+    def _wait(self, usage):
+        self.clock.sleep(self.base_seconds + usage['input_tokens'] / self.input_tps + usage['output_tokens'] / self.output_tps)
+
+    def invoke_model(self, modelId, body, **kwargs):
+        self._begin('InvokeModel')
+        try:
+            text, usage = self._respond(body)
+            self._wait(usage)
+        finally:
+            with self._lock:
+                self.in_flight -= 1
+        payload = {'id': f'msg_{uuid.uuid4().hex[:12]}', 'type': 'message', 'role': 'assistant', 'model': modelId,
+                   'content': [{'type': 'text', 'text': text}], 'stop_reason': 'end_turn', 'usage': usage}
+        return {'body': io.BytesIO(json.dumps(payload).encode('utf-8')), 'contentType': 'application/json'}
+
+    def invoke_model_with_response_stream(self, modelId, body, **kwargs):
+        self._begin('InvokeModelWithResponseStream')
+        try:
+            text, usage = self._respond(body)
+        except Exception:
+            with self._lock:
+                self.in_flight -= 1
+            raise
+        with self._lock:
+            preamble = self.random.random() < self.preamble_rate
+            truncate = self.random.random() < self.truncate_rate
+            throttle = self.random.random() < self.stream_throttle_rate
+            if throttle:
+                self.calls['StreamThrottled'] += 1
+        if preamble:
+            text = 'Aquí está la evaluación solicitada:\n```json\n' + text + '\n```'
+        if truncate:
+            text = text[:len(text) // 2]
+        return {'body': self._stream(modelId, text, usage, 'max_tokens' if truncate else 'end_turn', throttle),
+                'contentType': 'application/json'}
+
+    def _stream(self, model_id, text, usage, stop_reason, throttle=False, chunk_chars=40):
+        """Eventos como los de la API de mensajes; la latencia se reparte entre el primer token y cada chunk"""
+        def event(payload):
+            return {'chunk': {'bytes': json.dumps(payload).encode('utf-8')}}
+        try:
+            self.clock.sleep(self.base_seconds + usage['input_tokens'] / self.input_tps)
+            yield event({'type': 'message_start', 'message': {'id': f'msg_{uuid.uuid4().hex[:12]}', 'role': 'assistant', 'model': model_id,
+                                                              'usage': {'input_tokens': usage['input_tokens'], 'output_tokens': 1}}})
+            yield event({'type': 'content_block_start', 'index': 0, 'content_block': {'type': 'text', 'text': ''}})
+            per_chunk = usage['output_tokens'] / self.output_tps * chunk_chars / max(len(text), 1)
+            for i in range(0, len(text), chunk_chars):
+                if throttle and i >= len(text) // 2:
+                    raise EventStreamError({'Error': {'Code': 'throttlingException', 'Message': 'Too many tokens'}}, 'InvokeModelWithResponseStream')
+                self.clock.sleep(per_chunk)
+                yield event({'type': 'content_block_delta', 'index': 0, 'delta': {'type': 'text_delta', 'text': text[i:i + chunk_chars]}})
+            yield event({'type': 'content_block_stop', 'index': 0})
+            yield event({'type': 'message_delta', 'delta': {'stop_reason': stop_reason}, 'usage': {'output_tokens': usage['output_tokens']}})
+            yield event({'type': 'message_stop'})
+        finally:
+            with self._lock:
+                self.in_flight -= 1
+
+class FakeContext:
+    """Contexto de Lambda con el tiempo restante según el reloj simulado"""
+    def __init__(self, clock, function_name, timeout):
+        self.clock = clock
+        self.function_name = function_name
+        self.aws_request_id = str(uuid.uuid4())
+        self.deadline = clock.monotonic() + timeout
+
+    def get_remaining_time_in_millis(self):
+        return max(0, int((self.deadline - self.clock.monotonic()) * 1000))
+
+class FakeLambda:
+    """Invocaciones asíncronas ('Event') en un pool con concurrencia limitada; registra duración y timeouts"""
+    def __init__(self, clock, concurrency=100, timeout=900):
+        self.clock = clock
+        self.concurrency, self.timeout = concurrency, timeout
+        self.functions = {}
+        self.reset()
+
+    def register(self, function_name, handler):
+        self.functions[function_name] = handler
+
+    def reset(self):
+        self.pool = ThreadPoolExecutor(max_workers=self.concurrency)
+        self.invocations = []  # {'function', 'payload', 'start', 'end', 'error', 'timed_out'}
+        self.calls = Counter()
+        self._lock = threading.Lock()
+
+    def _run(self, record):
+        record['start'] = self.clock.monotonic()
+        try:
+            self.functions[record['function']](record['payload'], FakeContext(self.clock, record['function'], self.timeout))
+        except Exception as e:
+            record['error'] = repr(e)
+        record['end'] = self.clock.monotonic()
+        record['timed_out'] = record['end'] - record['start'] > self.timeout
+
+    def invoke(self, FunctionName, Payload, InvocationType='RequestResponse', **kwargs):
+        self.calls[InvocationType] += 1
+        record = {'function': FunctionName, 'payload': json.loads(Payload), 'queued': self.clock.monotonic(), 'error': None}
+        with self._lock:
+            self.invocations.append(record)
+        if InvocationType == 'Event':
+            self.pool.submit(self._run, record)
+            return {'StatusCode': 202}
+        self._run(record)
+        return {'StatusCode': 200, 'Payload': io.BytesIO(b'null')}
+
+    def idle(self):
+        with self._lock:
+            return all('end' in record for record in self.invocations)
+
+    def drain(self):
+        self.pool.shutdown(wait=True)
+        self.pool = ThreadPoolExecutor(max_workers=self.concurrency)
@@ -0,0 +1,118 @@
+"""Monta el pipeline real (start_job / append_session -> process_job -> job_status) sobre los dobles de fakes.py.
+
+Los dobles se registran en core.clients, así los clientes de módulo de los handlers (que se crean al primer uso),
+el job store y las cachés quedan apuntando a ellos. Los módulos que miden o esperan tiempo usan el SimClock.
+"""
+import contextlib
+import importlib
+import io
+import json
+import os
+import resource
+import sys
+import time
+
+SRC_DIR = os.path.join(os.path.dirname(__file__), '..', 'src')
+BUCKET = 'emova-bench'
+PROCESS_FUNCTION = 'emova-process-job-bench'
+POLL_INTERVAL = 5.0  # Igual que pollJobStatus del frontend
+TIMED_MODULES = ('poller', 'rate_limit', 'transcription', 'job_store', 'checkpoint', 'tracing', 'process_job_handler', 'evaluation_cache', 'transcription_cache')
+
+class Pipeline:
+    def __init__(self, clock, s3, transcribe, bedrock, lambda_client):
+        self.clock, self.s3, self.transcribe, self.bedrock, self.lambda_client = clock, s3, transcribe, bedrock, lambda_client
+        os.environ.update(AUDIO_BUCKET=BUCKET, PROCESS_FUNCTION_NAME=PROCESS_FUNCTION, AWS_DEFAULT_REGION='us-east-1')
+        sys.path.insert(0, os.path.abspath(SRC_DIR))
+
+        from core import clients
+        clients.use({'s3': s3, 'transcribe': transcribe, 'bedrock-runtime': bedrock, 'lambda': lambda_client})
+        self.start_job = importlib.import_module('start_job_handler')
+        self.process_job = importlib.import_module('process_job_handler')
+        self.job_status = importlib.import_module('job_status_handler')
+        self.append_session = importlib.import_module('append_session_handler')
+        for name in TIMED_MODULES:
+            importlib.import_module(name).time = clock
+        lambda_client.register(PROCESS_FUNCTION, self.process_job.handler)
+
+    def reset(self):
+        for fake in (self.s3, self.transcribe, self.bedrock, self.lambda_client):
+            fake.reset()
+        self.process_job.eval_cache._memory.clear()
+
+    def submit(self, audio_keys, xml_keys):
+        resp = self.start_job.handler({'body': json.dumps({'audio_keys': audio_keys, 'xml_keys': xml_keys})}, None)
+        if resp['statusCode'] != 202:
+            raise RuntimeError(resp['body'])
+        return json.loads(resp['body'])['job_id']
+
+    def append(self, job_id, audio_keys, xml_keys):
+        resp = self.append_session.handler({'pathParameters': {'job_id': job_id},
+                                            'body': json.dumps({'audio_keys': audio_keys, 'xml_keys': xml_keys})}, None)
+        if resp['statusCode'] not in (200, 202):
+            raise RuntimeError(resp['body'])
+        return json.loads(resp['body'])
+
+    def wait(self, job_id, poll_interval=POLL_INTERVAL):
+        """Sigue un job hasta que termine. Retorna (registro, segundos simulados)"""
+        started = self.clock.monotonic()
+        with contextlib.redirect_stdout(io.StringIO()):
+            while True:
+                self.clock.sleep(poll_interval)
+                idle = self.lambda_client.idle()
+                data = self.status(job_id)
+                if data.get('status') in ('done', 'error') or idle:
+                    return data, self.clock.monotonic() - started
+
+    def status(self, job_id, poll=None):
+        """Consulta como pollJobStatus: con cursor y ETag del poll anterior (dict 'poll', se actualiza)"""
+        poll = poll if poll is not None else {}
+        event = {'pathParameters': {'job_id': job_id}, 'queryStringParameters': {'cursor': poll.get('cursor', '0')},
+                 'headers': {'If-None-Match': poll['etag']} if poll.get('etag') else {}}
+        resp = self.job_status.handler(event, None)
+        poll['polls'] = poll.get('polls', 0) + 1
+        if resp['statusCode'] == 304:
+            poll['not_modified'] = poll.get('not_modified', 0) + 1
+            return poll['data']
+        data = json.loads(resp['body'])
+        poll['bytes'] = poll.get('bytes', 0) + len(resp['body'])
+        poll['etag'] = resp['headers'].get('ETag')
+        poll['cursor'] = data.get('next_cursor', poll.get('cursor', '0'))
+        poll['clips'] = poll.get('clips', 0) + len(data.get('clips', []))
+        if data.get('clips') and 'first_clip' not in poll:
+            poll['first_clip'] = self.clock.monotonic()
+        poll['data'] = data
+        return data
+
+    def run(self, sessions, arrival_interval=0.0, poll_interval=POLL_INTERVAL):
+        """Envía las sesiones [(audio_keys, xml_keys)] y las sigue como el frontend hasta que terminen.
+
+        Retorna un dict por sesión con submitted/finished (segundos simulados), status y error.
+        """
+        jobs = {}
+        started_real, started_cpu = time.perf_counter(), time.process_time()
+        with contextlib.redirect_stdout(io.StringIO()):  # Líneas EMF de tracing
+            for audio_keys, xml_keys in sessions:
+                submitted = self.clock.monotonic()
+                jobs[self.submit(audio_keys, xml_keys)] = {'submitted': submitted, 'num_audios': len(audio_keys), 'poll': {}}
+                self.clock.sleep(arrival_interval)
+
+            pending = set(jobs)
+            while pending:
+                self.clock.sleep(poll_interval)
+                idle = self.lambda_client.idle()  # Antes de leer, para no perder una escritura final en curso
+                for job_id in sorted(pending):
+                    data = self.status(job_id, jobs[job_id]['poll'])
+                    if data.get('status') in ('done', 'error'):
+                        jobs[job_id].update(finished=self.clock.monotonic(), status=data['status'], error=data.get('error'))
+                        pending.discard(job_id)
+                if pending and idle:
+                    for job_id in pending:  # La Lambda terminó sin marcar el job (excepción fuera del try)
+                        jobs[job_id].update(finished=self.clock.monotonic(), status='lost', error='Job sin estado final')
+                    pending.clear()
+            self.lambda_client.drain()
+        return {
+            'jobs': jobs,
+            'real_seconds': time.perf_counter() - started_real,
+            'cpu_seconds': time.process_time() - started_cpu,
+            'peak_rss_mb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+        }
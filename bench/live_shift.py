@@ -0,0 +1,74 @@
+"""Turno en vivo: una sesión sintética que crece por tramos. Compara agregar cada tramo al job
+(POST /job/{id}/append) contra volver a enviar la sesión completa hasta ese punto como un job nuevo.
+
+Uso:
+    python bench/live_shift.py                          # 300 clips en 6 tramos
+    python bench/live_shift.py --clips 1200 --steps 12 --no-full
+
+Por tramo reporta el audio enviado a Transcribe, llamadas y tokens de entrada de Bedrock, lecturas de entradas en S3
+(audios y XML) y la latencia (segundos simulados). El reenvío completo aprovecha el caché de transcripciones; el de
+evaluaciones en memoria se vacía antes de cada tramo.
+"""
+import argparse
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(__file__))
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+import dataset
+from fakes import FakeBedrock, FakeLambda, FakeS3, FakeTranscribe, SimClock
+from harness import Pipeline
+
+def counters(pipeline):
+    return {
+        'audio_s': pipeline.transcribe.audio_seconds,
+        'bedrock_calls': pipeline.bedrock.calls['InvokeModel'] + pipeline.bedrock.calls['InvokeModelWithResponseStream'],
+        'input_tokens': pipeline.bedrock.input_tokens,
+        'input_reads': sum(n for (op, prefix), n in pipeline.s3.calls_by_prefix.items() if op == 'GetObject' and prefix == 'bench')
+    }
+
+def step(pipeline, action):
+    """Ejecuta 'action' (retorna job_id), espera el final y retorna las diferencias de los contadores"""
+    before = counters(pipeline)
+    pipeline.process_job.eval_cache._memory.clear()
+    job_id = action()
+    data, seconds = pipeline.wait(job_id)
+    after = counters(pipeline)
+    row = {k: round(after[k] - before[k], 1) for k in after}
+    row.update(seconds=round(seconds, 1), status=data.get('status'), score=(data.get('result') or {}).get('evaluation', {}).get('score'))
+    return job_id, row
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--clips', type=int, default=300)
+    parser.add_argument('--steps', type=int, default=6, help='Tramos (el primero crea el job)')
+    parser.add_argument('--scale', type=float, default=0.1, help='Segundos reales por segundo simulado')
+    parser.add_argument('--no-full', action='store_true', help='No medir el reenvío completo')
+    args = parser.parse_args()
+
+    clock = SimClock(args.scale)
+    s3 = FakeS3(clock)
+    pipeline = Pipeline(clock, s3, FakeTranscribe(clock, s3), FakeBedrock(clock), FakeLambda(clock))
+    audio_keys, xml_keys = dataset.synthetic_session(s3, 'bench/live', args.clips, dataset.load_fixtures())
+    size = -(-len(audio_keys) // args.steps)
+    chunks = [(audio_keys[i:i + size], xml_keys['recordings'][i:i + size]) for i in range(0, len(audio_keys), size)]
+
+    print(f"{'tramo':>6}{'clips':>7}  {'modo':<9}{'audio s':>9}{'bedrock':>9}{'tokens in':>11}{'lecturas':>10}{'latencia s':>12}{'score':>7}")
+    job_id = None
+    for n, (keys, recordings) in enumerate(chunks):
+        total = n * size + len(keys)
+        if job_id is None:
+            job_id, row = step(pipeline, lambda: pipeline.submit(keys, dict(xml_keys, recordings=recordings)))
+        else:
+            _, row = step(pipeline, lambda: (pipeline.append(job_id, keys, {'recordings': recordings}), job_id)[1])
+        rows = [('agregado', row)]
+        if not args.no_full and n:
+            _, full = step(pipeline, lambda: pipeline.submit(audio_keys[:total], dict(xml_keys, recordings=xml_keys['recordings'][:total])))
+            rows.append(('completo', full))
+        for mode, r in rows:
+            print(f"{n:>6}{total:>7}  {mode:<9}{r['audio_s']:>9}{r['bedrock_calls']:>9}{r['input_tokens']:>11}{r['input_reads']:>10}"
+                  f"{r['seconds']:>12}{r['score']!s:>7}  {'' if r['status'] == 'done' else r['status']}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,173 @@
+"""Benchmark offline del pipeline completo con S3, Transcribe, Bedrock y Lambda simulados.
+
+Uso:
+    python bench/run.py                                   # fixtures de 'Prueba de audio', 1 sesión
+    python bench/run.py --clips 100 1000 10000            # sesiones sintéticas escaladas
+    python bench/run.py --clips 100 --sessions 20 --bedrock-throttle 0.05 --transcribe-failure 0.01
+    python bench/run.py --clips 1000 --save bench/results/baseline.json
+    python bench/run.py --clips 1000 --baseline bench/results/baseline.json
+
+Los tiempos reportados son simulados (latencias de AWS configurables). El trabajo de CPU de los handlers corre en
+tiempo real y se amplifica por 1/scale en el tiempo simulado: para comparar contra un baseline usar el mismo --scale.
+"""
+import argparse
+import json
+import math
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(__file__))
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+import dataset
+import rate_limit
+from fakes import FakeBedrock, FakeLambda, FakeS3, FakeTranscribe, SimClock
+from harness import Pipeline
+
+COMPARED = ('sessions_per_hour', 'latency_p50', 'latency_p99', 's3_calls_per_session', 'transcribe_calls_per_session',
+            'bedrock_calls_per_session')
+
+def percentile(values, p):
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(p / 100 * len(ordered)) - 1)] if ordered else None
+
+def run_scenario(pipeline, fixtures, clips, sessions, args):
+    pipeline.reset()
+    data = []
+    for i in range(sessions):
+        prefix = f'bench/s{i:04d}'
+        if clips:
+            data.append(dataset.synthetic_session(pipeline.s3, prefix, clips, fixtures, session_index=i, seed=args.seed))
+        else:
+            data.append(dataset.fixture_session(pipeline.s3, prefix, fixtures))
+
+    run = pipeline.run(data, arrival_interval=args.arrival_interval)
+    jobs = run['jobs'].values()
+    done = [j for j in jobs if j['status'] == 'done']
+    latencies = [j['finished'] - j['submitted'] for j in done]
+    first_clip = [j['poll']['first_clip'] - j['submitted'] for j in jobs if 'first_clip' in j['poll']]
+    polls = sum(j['poll'].get('polls', 0) for j in jobs)
+    makespan = max(j['finished'] for j in jobs) - min(j['submitted'] for j in jobs)
+    invocations = pipeline.lambda_client.invocations
+    s3_calls = sum(pipeline.s3.calls.values()) - pipeline.s3.calls['PresignUrl']
+    transcribe_calls = sum(v for k, v in pipeline.transcribe.calls.items() if k != 'LimitExceeded')
+    errors = {}
+    for job in jobs:
+        if job['status'] != 'done':
+            errors[job.get('error') or job['status']] = errors.get(job.get('error') or job['status'], 0) + 1
+
+    return {
+        'scenario': f"{clips or 'fixtures'} clips x {sessions} sesiones",
+        'clips': clips or len(fixtures['audios']),
+        'sessions': sessions,
+        'completed': len(done),
+        'failed': sessions - len(done),
+        'errors': errors,
+        'makespan_seconds': round(makespan, 1),
+        'sessions_per_hour': round(len(done) / makespan * 3600, 1) if makespan else None,
+        'latency_p50': round(percentile(latencies, 50), 1) if latencies else None,
+        'latency_p99': round(percentile(latencies, 99), 1) if latencies else None,
+        'first_clip_p50': round(percentile(first_clip, 50), 1) if first_clip else None,
+        'status_polls': polls,
+        'status_not_modified': sum(j['poll'].get('not_modified', 0) for j in jobs),
+        'status_kb': round(sum(j['poll'].get('bytes', 0) for j in jobs) / 1e3, 1),
+        'lambda_p50': round(percentile([r['end'] - r['start'] for r in invocations if 'end' in r], 50) or 0, 1),
+        'lambda_timeouts': sum(1 for r in invocations if r.get('timed_out')),
+        'lambda_invocations': len(invocations),
+        's3_calls': dict(sorted(pipeline.s3.calls.items())),
+        's3_calls_by_prefix': {f'{op} {prefix}': n for (op, prefix), n in sorted(pipeline.s3.calls_by_prefix.items())},
+        's3_calls_per_session': round(s3_calls / sessions, 1),
+        's3_mb_in': round(pipeline.s3.bytes_in / 1e6, 1),
+        's3_mb_out': round(pipeline.s3.bytes_out / 1e6, 1),
+        'transcribe_calls': dict(sorted(pipeline.transcribe.calls.items())),
+        'transcribe_calls_per_session': round(transcribe_calls / sessions, 1),
+        'transcribe_audio_seconds': round(pipeline.transcribe.audio_seconds, 1),
+        'bedrock_calls': dict(sorted(pipeline.bedrock.calls.items())),
+        'bedrock_calls_per_session': round((pipeline.bedrock.calls['InvokeModel'] +
+                                            pipeline.bedrock.calls['InvokeModelWithResponseStream']) / sessions, 1),
+        'bedrock_tokens': {'input': pipeline.bedrock.input_tokens, 'output': pipeline.bedrock.output_tokens},
+        'real_seconds': round(run['real_seconds'], 1),
+        'cpu_seconds': round(run['cpu_seconds'], 1),
+        'peak_rss_mb': round(run['peak_rss_mb'])
+    }
+
+def print_result(result, baseline=None):
+    print(f"\n== {result['scenario']} ==")
+    print(f"completadas {result['completed']}/{result['sessions']}  |  makespan {result['makespan_seconds']}s simulados  |  "
+          f"real {result['real_seconds']}s, CPU {result['cpu_seconds']}s, RSS pico {result['peak_rss_mb']} MB")
+    for error, count in sorted(result['errors'].items(), key=lambda kv: -kv[1])[:3]:
+        print(f"  error x{count}: {error[:120]}")
+    for name in COMPARED:
+        value, line = result[name], f"  {name:<32}{result[name]!s:>12}"
+        previous = (baseline or {}).get(name)
+        if previous and value is not None:
+            line += f"{(value - previous) / previous * 100:>+10.1f}%  (baseline {previous})"
+        print(line)
+    print(f"  primer clip p50 {result['first_clip_p50']}s  |  polls {result['status_polls']} "
+          f"({result['status_not_modified']} sin cambios, {result['status_kb']} KB)")
+    print(f"  lambda p50 {result['lambda_p50']}s, invocaciones {result['lambda_invocations']}, timeouts {result['lambda_timeouts']}  |  "
+          f"audio transcrito {result['transcribe_audio_seconds']}s  |  tokens Bedrock {result['bedrock_tokens']}")
+    print(f"  S3 ({result['s3_mb_in']} MB in / {result['s3_mb_out']} MB out): " +
+          ', '.join(f'{k}={v}' for k, v in result['s3_calls_by_prefix'].items()))
+    print('  Transcribe: ' + ', '.join(f'{k}={v}' for k, v in result['transcribe_calls'].items()) +
+          '  |  Bedrock: ' + ', '.join(f'{k}={v}' for k, v in result['bedrock_calls'].items()))
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--clips', type=int, nargs='+', default=[0], help='Clips por sesión (0 = fixtures reales)')
+    parser.add_argument('--sessions', type=int, nargs='+', default=[1], help='Sesiones simultáneas')
+    parser.add_argument('--arrival-interval', type=float, default=0.0, help='Segundos simulados entre envíos')
+    parser.add_argument('--scale', type=float, default=0.1, help='Segundos reales por segundo simulado')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--s3-latency', type=float, default=0.02)
+    parser.add_argument('--transcribe-quota', type=int, default=250, help='Jobs concurrentes de la cuenta')
+    parser.add_argument('--transcribe-queue', type=float, default=5.0, help='Segundos en cola antes de procesar')
+    parser.add_argument('--transcribe-rtf', type=float, default=0.3, help='Segundos de proceso por segundo de audio')
+    parser.add_argument('--transcribe-failure', type=float, default=0.0)
+    parser.add_argument('--transcribe-throttle', type=float, default=0.0)
+    parser.add_argument('--bedrock-latency', type=float, default=1.0)
+    parser.add_argument('--bedrock-output-tps', type=float, default=60.0, help='Tokens de salida por segundo')
+    parser.add_argument('--bedrock-concurrency', type=int, default=0, help='Invocaciones simultáneas antes de throttling (0 = sin límite)')
+    parser.add_argument('--bedrock-throttle', type=float, default=0.0)
+    parser.add_argument('--bedrock-failure', type=float, default=0.0)
+    parser.add_argument('--bedrock-preamble', type=float, default=0.0, help='Fracción de respuestas con texto antes del JSON')
+    parser.add_argument('--bedrock-truncate', type=float, default=0.0, help='Fracción de respuestas cortadas a la mitad')
+    parser.add_argument('--bedrock-stream-throttle', type=float, default=0.0, help='Fracción de streams cortados por throttling')
+    parser.add_argument('--lambda-concurrency', type=int, default=100)
+    parser.add_argument('--lambda-timeout', type=float, default=900, help='Timeout de process_job en segundos simulados')
+    parser.add_argument('--save', help='Guardar resultados como JSON (baseline)')
+    parser.add_argument('--baseline', help='JSON de una corrida anterior para comparar')
+    args = parser.parse_args()
+
+    clock = SimClock(args.scale)
+    s3 = FakeS3(clock, latency=args.s3_latency)
+    pipeline = Pipeline(
+        clock, s3,
+        FakeTranscribe(clock, s3, quota=args.transcribe_quota, queue_delay=args.transcribe_queue, rtf=args.transcribe_rtf,
+                       failure_rate=args.transcribe_failure, throttle_rate=args.transcribe_throttle, seed=args.seed),
+        FakeBedrock(clock, base_seconds=args.bedrock_latency, output_tokens_per_second=args.bedrock_output_tps,
+                    max_concurrency=args.bedrock_concurrency, throttle_rate=args.bedrock_throttle,
+                    failure_rate=args.bedrock_failure, preamble_rate=args.bedrock_preamble,
+                    truncate_rate=args.bedrock_truncate, stream_throttle_rate=args.bedrock_stream_throttle, seed=args.seed),
+        FakeLambda(clock, concurrency=args.lambda_concurrency, timeout=args.lambda_timeout)
+    )
+    rate_limit.SLOTS['transcribe'] = args.transcribe_quota  # Los cupos compartidos son la cuota simulada de la cuenta
+    fixtures = dataset.load_fixtures()
+    baseline = {}
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as f:
+            baseline = {r['scenario']: r for r in json.load(f)['results']}
+
+    results = []
+    for clips in args.clips:
+        for sessions in args.sessions:
+            results.append(run_scenario(pipeline, fixtures, clips, sessions, args))
+            print_result(results[-1], baseline.get(results[-1]['scenario']))
+
+    if args.save:
+        os.makedirs(os.path.dirname(args.save) or '.', exist_ok=True)
+        with open(args.save, 'w', encoding='utf-8') as f:
+            json.dump({'args': vars(args), 'results': results}, f, indent=2, ensure_ascii=False)
+
+if __name__ == '__main__':
+    main()
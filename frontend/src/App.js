@@ -4,14 +4,17 @@ import './App.css';
 const API_URL = 'https://h7llsoo392.execute-api.us-east-1.amazonaws.com/dev';
 const LOGO_EMOVA = 'https://emova.com.ar/wp-content/uploads/2023/09/aplicacion-ppal-logotag-concesionario-digital-footer-web.png';
 const LOGO_GOBIERNO = 'https://www.argentina.gob.ar/profiles/argentinagobar/themes/argentinagobar/argentinagobar_theme/logo_argentina-azul.svg';
+const UPLOAD_CONCURRENCY = 8;
+const ARCHIVE_PATTERN = /\.(zip|tar|tar\.gz|tgz)$/i;
 const LOGO_AWS = 'https://a0.awsstatic.com/libra-css/images/logos/aws_smile-header-desktop-en-white_59x35.png';
 
 function App() {
-  const [files, setFiles] = useState({ wavs: [], xmls: [], holders: null, callrefs: null });
+  const [files, setFiles] = useState({ wavs: [], xmls: [], holders: null, callrefs: null, archive: null });
   const [loading, setLoading] = useState(false);
   const [status, setStatus] = useState('');
   const [progress, setProgress] = useState(0);
   const [result, setResult] = useState(null);
+  const [liveClips, setLiveClips] = useState([]);
   const [error, setError] = useState(null);
   const fileInputRef = useRef(null);
   const folderInputRef = useRef(null);
@@ -25,8 +28,9 @@ function App() {
     );
     const holders = allFiles.find(f => f.name.toLowerCase() === 'holders.xml');
     const callrefs = allFiles.find(f => f.name.toLowerCase() === 'callrefs.xml');
+    const archive = allFiles.find(f => ARCHIVE_PATTERN.test(f.name)) || null;
     
-    setFiles({ wavs, xmls, holders, callrefs });
+    setFiles({ wavs, xmls, holders, callrefs, archive });
     setResult(null);
     setError(null);
   };
@@ -39,29 +43,40 @@ function App() {
     processFiles(e.target.files);
   };
 
-  const uploadFile = async (file, prefix) => {
-    const res = await fetch(`${API_URL}/upload-url?filename=${prefix}/${encodeURIComponent(file.name)}`);
-    const { upload_url, key } = await res.json();
-    
-    // Determinar content-type que coincida con el presigned URL
-    let contentType = 'application/octet-stream';
-    if (file.name.toLowerCase().endsWith('.wav')) contentType = 'audio/wav';
-    else if (file.name.toLowerCase().endsWith('.xml')) contentType = 'application/xml';
-    else if (file.name.toLowerCase().endsWith('.mp3')) contentType = 'audio/mpeg';
-    
-    await fetch(upload_url, {
-      method: 'PUT',
-      body: file,
-      headers: { 'Content-Type': contentType }
+  // Una sola llamada firma todas las URLs; los PUT van en paralelo con concurrencia acotada
+  const uploadFiles = async (entries) => {
+    const res = await fetch(`${API_URL}/upload-urls`, {
+      method: 'POST',
+      headers: { 'Content-Type': 'application/json' },
+      body: JSON.stringify({ filenames: entries.map(e => e.key) })
     });
-    return key;
+    const data = await res.json();
+    if (!res.ok) throw new Error(data.error || 'Error obteniendo URLs de subida');
+    
+    let next = 0;
+    const worker = async () => {
+      while (next < entries.length) {
+        const i = next++;
+        const { upload_url, content_type } = data.uploads[i];
+        const put = await fetch(upload_url, { method: 'PUT', body: entries[i].file, headers: { 'Content-Type': content_type } });
+        if (!put.ok) throw new Error(`Error subiendo ${entries[i].file.name}`);
+      }
+    };
+    await Promise.all(Array.from({ length: Math.min(UPLOAD_CONCURRENCY, entries.length) }, worker));
+    return data.uploads.map(u => u.key);
   };
 
+  // Polling condicional: If-None-Match evita bajar el estado si no cambió (304) y el cursor trae solo los clips nuevos
   const pollJobStatus = async (jobId) => {
+    let etag = null;
+    let cursor = '0';
     return new Promise((resolve, reject) => {
       const interval = setInterval(async () => {
         try {
-          const res = await fetch(`${API_URL}/job/${jobId}`);
+          const res = await fetch(`${API_URL}/job/${jobId}?cursor=${cursor}`, {
+            headers: etag ? { 'If-None-Match': etag } : {}
+          });
+          if (res.status === 304) return;
           const data = await res.json();
           
           if (!res.ok) {
@@ -70,10 +85,18 @@ function App() {
             return;
           }
           
+          etag = res.headers.get('ETag');
+          if (data.next_cursor !== undefined) cursor = data.next_cursor;
+          if (data.clips?.length) setLiveClips(prev => [...prev, ...data.clips]);
           setProgress(data.progress || 0);
           
-          if (data.status === 'processing') {
-            setStatus(`Procesando análisis... ${data.progress || 0}%`);
+          if (data.status === 'extracting') {
+            setStatus('Extrayendo archivo...');
+          } else if (data.status === 'processing') {
+            const partialScore = data.partial_evaluation?.score;
+            setStatus(partialScore !== undefined
+              ? `Evaluando... ${data.progress || 0}% (puntaje preliminar: ${partialScore}/10)`
+              : `Procesando análisis... ${data.progress || 0}%`);
           } else if (data.status === 'done') {
             clearInterval(interval);
             resolve(data.result);
@@ -90,57 +113,66 @@ function App() {
   };
 
   const handleAnalyze = async () => {
-    if (files.wavs.length === 0) return;
+    if (files.wavs.length === 0 && !files.archive) return;
     
     setLoading(true);
     setError(null);
     setResult(null);
+    setLiveClips([]);
     setProgress(0);
     
     try {
       const sessionId = Date.now();
       
-      // 1. Subir WAVs
-      setStatus(`Subiendo ${files.wavs.length} archivos de audio...`);
-      const audioKeys = await Promise.all(
-        files.wavs.map(f => uploadFile(f, `sessions/${sessionId}/audios`))
-      );
-      
-      // 2. Subir XMLs
-      const xmlKeys = { recordings: [] };
-      
-      if (files.holders) {
-        setStatus('Subiendo metadatos (Holders.xml)...');
-        xmlKeys.holders = await uploadFile(files.holders, `sessions/${sessionId}`);
-      }
-      
-      if (files.callrefs) {
-        setStatus('Subiendo metadatos (CallRefs.xml)...');
-        xmlKeys.callrefs = await uploadFile(files.callrefs, `sessions/${sessionId}`);
-      }
-      
-      if (files.xmls.length > 0) {
-        setStatus(`Subiendo ${files.xmls.length} archivos de recordings...`);
-        xmlKeys.recordings = await Promise.all(
-          files.xmls.map(f => uploadFile(f, `sessions/${sessionId}/recordings`))
-        );
-      }
-      
-      // 3. Iniciar análisis asíncrono
-      setStatus('Iniciando análisis...');
-      const analyzeRes = await fetch(`${API_URL}/analyze-session`, {
-        method: 'POST',
-        headers: { 'Content-Type': 'application/json' },
-        body: JSON.stringify({ audio_keys: audioKeys, xml_keys: xmlKeys })
-      });
-      
-      const jobData = await analyzeRes.json();
+      let jobData;
       
-      if (!analyzeRes.ok) {
-        throw new Error(jobData.error || 'Error iniciando el análisis');
+      if (files.archive) {
+        // Export comprimido: se sube un solo archivo y el backend lo extrae y lanza el análisis
+        setStatus(`Subiendo ${files.archive.name}...`);
+        const [archiveKey] = await uploadFiles([{ file: files.archive, key: `archives/${sessionId}/${files.archive.name}` }]);
+        setStatus('Extrayendo archivo...');
+        const ingestRes = await fetch(`${API_URL}/ingest-archive`, {
+          method: 'POST',
+          headers: { 'Content-Type': 'application/json' },
+          body: JSON.stringify({ archive_key: archiveKey, start: true })
+        });
+        jobData = await ingestRes.json();
+        if (!ingestRes.ok) {
+          throw new Error(jobData.error || 'Error procesando el archivo');
+        }
+      } else {
+        // 1. Subir WAVs y XMLs con un único pedido de URLs
+        const prefix = `sessions/${sessionId}`;
+        const entries = [
+          ...files.wavs.map(f => ({ file: f, key: `${prefix}/audios/${f.name}` })),
+          ...(files.holders ? [{ file: files.holders, key: `${prefix}/Holders.xml` }] : []),
+          ...(files.callrefs ? [{ file: files.callrefs, key: `${prefix}/CallRefs.xml` }] : []),
+          ...files.xmls.map(f => ({ file: f, key: `${prefix}/recordings/${f.name}` }))
+        ];
+        setStatus(`Subiendo ${entries.length} archivos...`);
+        await uploadFiles(entries);
+        
+        const audioKeys = entries.filter(e => e.key.startsWith(`${prefix}/audios/`)).map(e => e.key);
+        const xmlKeys = { recordings: entries.filter(e => e.key.startsWith(`${prefix}/recordings/`)).map(e => e.key) };
+        if (files.holders) xmlKeys.holders = `${prefix}/Holders.xml`;
+        if (files.callrefs) xmlKeys.callrefs = `${prefix}/CallRefs.xml`;
+        
+        // 2. Iniciar análisis asíncrono
+        setStatus('Iniciando análisis...');
+        const analyzeRes = await fetch(`${API_URL}/analyze-session`, {
+          method: 'POST',
+          headers: { 'Content-Type': 'application/json' },
+          body: JSON.stringify({ audio_keys: audioKeys, xml_keys: xmlKeys })
+        });
+        
+        jobData = await analyzeRes.json();
+        
+        if (!analyzeRes.ok) {
+          throw new Error(jobData.error || 'Error iniciando el análisis');
+        }
       }
       
-      // 4. Polling hasta completar
+      // 3. Polling hasta completar
       const result = await pollJobStatus(jobData.job_id);
       
       setResult({
@@ -433,7 +465,7 @@ ${result.analisis_por_operador ? Object.entries(result.analisis_por_operador).ma
     URL.revokeObjectURL(url);
   };
 
-  const totalFiles = files.wavs.length + files.xmls.length + (files.holders ? 1 : 0) + (files.callrefs ? 1 : 0);
+  const totalFiles = files.wavs.length + files.xmls.length + (files.holders ? 1 : 0) + (files.callrefs ? 1 : 0) + (files.archive ? 1 : 0);
 
   return (
     <div className="app">
@@ -469,6 +501,7 @@ ${result.analisis_por_operador ? Object.entries(result.analisis_por_operador).ma
                   <p><strong>{files.xmls.length}</strong> archivos XML (recordings)</p>
                   {files.holders && <p>✓ Holders.xml</p>}
                   {files.callrefs && <p>✓ CallRefs.xml</p>}
+                  {files.archive && <p>✓ {files.archive.name} (se extrae en el servidor)</p>}
                 </div>
               ) : (
                 <>
@@ -488,13 +521,13 @@ ${result.analisis_por_operador ? Object.entries(result.analisis_por_operador).ma
                 type="file"
                 ref={fileInputRef}
                 onChange={handleFileChange}
-                accept=".wav,.xml"
+                accept=".wav,.xml,.zip,.tar,.tgz,.gz"
                 multiple
                 style={{ display: 'none' }}
               />
               <div className="upload-icon">📄</div>
               <p>Seleccionar archivos</p>
-              <span className="upload-hint">WAV + XML individuales</span>
+              <span className="upload-hint">WAV + XML individuales o un export .zip/.tar</span>
             </div>
           </div>
 
@@ -515,9 +548,9 @@ ${result.analisis_por_operador ? Object.entries(result.analisis_por_operador).ma
           <button 
             className="analyze-btn" 
             onClick={handleAnalyze}
-            disabled={files.wavs.length === 0 || loading}
+            disabled={(files.wavs.length === 0 && !files.archive) || loading}
           >
-            {loading ? 'Procesando...' : `Analizar Sesión (${files.wavs.length} audios)`}
+            {loading ? 'Procesando...' : files.archive ? `Analizar Sesión (${files.archive.name})` : `Analizar Sesión (${files.wavs.length} audios)`}
           </button>
           
           {status && (
@@ -534,6 +567,19 @@ ${result.analisis_por_operador ? Object.entries(result.analisis_por_operador).ma
           {error && <p className="error">{error}</p>}
         </section>
 
+        {loading && liveClips.length > 0 && (
+          <section className="results-section">
+            <div className="card transcript-card">
+              <h3>Transcripción en curso ({liveClips.length} clips)</h3>
+              <div className="transcript-content">
+                {[...liveClips].sort((a, b) => a.start.localeCompare(b.start)).flatMap(clip =>
+                  clip.lines.map((line, i) => <p key={`${clip.clip}-${i}`} className="transcript-line">{line}</p>)
+                )}
+              </div>
+            </div>
+          </section>
+        )}
+
         {result && (
           <section className="results-section">
             {/* Info de sesión */}
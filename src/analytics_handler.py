@@ -0,0 +1,50 @@
+"""Lambda de analítica de evaluaciones
+
+GET /analytics?operator=&talk_group=&period=day|week&from=YYYY-MM-DD&to=YYYY-MM-DD -> serie de promedios
+GET /analytics?group_by=operator&... -> promedios por operador en el rango (peor primero)
+refresh=true fuerza revalidar la copia local de la base. La regla programada compacta los deltas pendientes.
+"""
+import os
+from datetime import date
+
+import analytics_store
+from core import api, clients
+
+s3 = clients.lazy('s3')
+BUCKET = os.environ['AUDIO_BUCKET']
+
+analytics = analytics_store.from_env(s3, BUCKET)
+
+def handler(event, context):
+    if event.get('source') == 'aws.events':
+        return {'applied': analytics.compact()}
+    try:
+        params = event.get('queryStringParameters') or {}
+        period = params.get('period', 'day')
+        if period not in analytics_store.PERIODS:
+            raise api.BadRequest('period debe ser day o week')
+        start, end = parse_date(params, 'from'), parse_date(params, 'to')
+        if params.get('group_by') not in (None, 'operator'):
+            raise api.BadRequest('group_by solo admite operator')
+
+        analytics.sync(force=params.get('refresh') == 'true')
+        talk_group = params.get('talk_group') or analytics_store.ALL
+        if params.get('group_by') == 'operator':
+            return api.response(200, {'period': period, 'talk_group': talk_group, 'operators': analytics.ranking(talk_group, period, start, end)})
+        operator = params.get('operator') or analytics_store.ALL
+        return api.response(200, {'period': period, 'operator': operator, 'talk_group': talk_group,
+                                  'series': analytics.series(operator, talk_group, period, start, end)})
+
+    except api.BadRequest as e:
+        return api.response(400, {'error': str(e)})
+    except Exception as e:
+        return api.response(500, {'error': str(e)})
+
+def parse_date(params, name):
+    value = params.get(name)
+    if value is None:
+        return None
+    try:
+        return date.fromisoformat(value).isoformat()
+    except ValueError:
+        raise api.BadRequest(f'{name} debe ser YYYY-MM-DD')
@@ -0,0 +1,290 @@
+"""Almacén analítico de las evaluaciones terminadas: SQLite con una fila por sesión y operador (más una fila '*' de la
+sesión) y rollups diarios y semanales por operador y grupo que se mantienen de forma incremental.
+
+process_job deja cada resultado como un delta chico en analytics/pending/{job_id}/{ms}-{versión}.json, sin competir
+con otros jobs; cada escritura usa una clave nueva, así reprocesar un job no pisa un delta que la compactación ya leyó. La compactación (regla programada del handler de analítica) aplica los deltas pendientes al SQLite en una
+transacción y lo sube a analytics/analytics.sqlite con escritura condicional (IfMatch). Las consultas usan una
+copia en /tmp revalidada por ETag y leen solo los rollups, así que no dependen del tamaño del historial.
+
+Los rollups guardan sumas y cantidades, no promedios: reprocesar un job resta sus filas anteriores y suma las nuevas.
+Fechas en hora local del grabador (FromDateLoc); la semana se identifica por su lunes.
+
+Backends: S3 (producción) o un archivo local que se actualiza en el momento (ANALYTICS_STORE=s3|file).
+"""
+import contextlib
+import fcntl
+import hashlib
+import json
+import os
+import sqlite3
+import time
+from collections import Counter
+from datetime import datetime, timedelta
+
+import evaluation
+import lexicon
+
+DB_KEY = 'analytics/analytics.sqlite'
+PENDING_PREFIX = 'analytics/pending/'
+LOCAL_PATH = os.environ.get('ANALYTICS_DB', '/tmp/emova-analytics.sqlite')
+SYNC_INTERVAL = float(os.environ.get('ANALYTICS_SYNC_SECONDS', '60'))  # Revalidación de la copia local
+MAX_DELTAS = 1000  # Por compactación
+MAX_CONFLICT_RETRIES = 5
+ALL = '*'
+PERIODS = ('day', 'week')
+METRICS = ('score',) + evaluation.CRITERIA + ('operator_score',)
+
+# Categoría -> palabras (sin acentos) que la identifican en errores_detectados
+ERROR_CATEGORIES = (
+    ('identificacion', ('identific', 'emisor', 'receptor')),
+    ('confirmacion', ('confirm', 'colacion', 'acuse', 'readback')),
+    ('formalidad', ('apodo', 'coloquial', 'informal', 'tuteo', 'muletilla')),
+    ('fraseologia', ('fraseolog', 'terminolog', 'termino', 'afirmativo', 'copiado')),
+    ('claridad', ('ambig', 'incomplet', 'ubicacion', 'confus', 'fragment')),
+    ('protocolo', ('protocolo', 'estructura', 'turno')),
+)
+
+SCHEMA = f"""
+CREATE TABLE IF NOT EXISTS evaluations (
+    job_id TEXT NOT NULL, operator TEXT NOT NULL, operator_name TEXT, talk_group TEXT NOT NULL, ts TEXT,
+    day TEXT NOT NULL, week TEXT NOT NULL, {', '.join(f'{m} REAL' for m in METRICS)}, errors TEXT,
+    PRIMARY KEY (job_id, operator)
+);
+CREATE TABLE IF NOT EXISTS rollups (
+    period TEXT NOT NULL, bucket TEXT NOT NULL, operator TEXT NOT NULL, talk_group TEXT NOT NULL, n INTEGER NOT NULL,
+    {', '.join(f'{m} REAL' for m in METRICS)},
+    PRIMARY KEY (period, operator, talk_group, bucket)
+);
+CREATE TABLE IF NOT EXISTS error_rollups (
+    period TEXT NOT NULL, bucket TEXT NOT NULL, operator TEXT NOT NULL, talk_group TEXT NOT NULL, category TEXT NOT NULL,
+    n INTEGER NOT NULL,
+    PRIMARY KEY (period, operator, talk_group, bucket, category)
+);
+CREATE TABLE IF NOT EXISTS operators (operator TEXT PRIMARY KEY, name TEXT);
+CREATE TABLE IF NOT EXISTS applied (job_id TEXT PRIMARY KEY, version TEXT);
+"""
+
+ROLLUP_UPSERT = f"""
+INSERT INTO rollups (period, bucket, operator, talk_group, n, {', '.join(METRICS)}) VALUES (?, ?, ?, ?, ?, {', '.join('?' for _ in METRICS)})
+ON CONFLICT (period, operator, talk_group, bucket) DO UPDATE SET n = n + excluded.n, {', '.join(f'{m} = {m} + excluded.{m}' for m in METRICS)}
+"""
+
+ERROR_UPSERT = """
+INSERT INTO error_rollups (period, bucket, operator, talk_group, category, n) VALUES (?, ?, ?, ?, ?, ?)
+ON CONFLICT (period, operator, talk_group, bucket, category) DO UPDATE SET n = n + excluded.n
+"""
+
+def error_categories(errors):
+    found = set()
+    for error in errors or []:
+        text = lexicon.normalize(str(error))
+        found.update(category for category, words in ERROR_CATEGORIES if any(w in text for w in words))
+    return sorted(found) or (['otros'] if errors else [])
+
+def _number(value, default=None):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return default
+
+def session_delta(job_id, result, holders, calls):
+    """Delta de un job terminado: grupo más frecuente e inicio de sus llamadas, criterios de la sesión, categorías
+    de error y score por operador (analisis_por_operador se indexa por nombre; se vuelve al ID de Holders)"""
+    calls = [c for c in calls if c]
+    starts = [c['start_dt'] for c in calls if c.get('start_dt')]
+    ids_by_name = {h['name']: holder_id for holder_id, h in holders.items()}
+    operators = {}
+    for name, data in (result.get('analisis_por_operador') or {}).items():
+        score = _number(data.get('score')) if isinstance(data, dict) else _number(data)
+        operators[ids_by_name.get(name, name)] = {'name': name, 'score': score}
+    talk_groups = Counter(c.get('called_id') for c in calls if c.get('called_id'))
+    delta = {
+        'job_id': job_id,
+        'ts': min(starts).isoformat() if starts else datetime.utcnow().isoformat(timespec='seconds'),
+        'talk_group': talk_groups.most_common(1)[0][0] if talk_groups else ALL,
+        'criteria': {m: _number(result.get(m), 0.0) for m in ('score',) + evaluation.CRITERIA},
+        'errors': error_categories(result.get('errores_detectados')),
+        'operators': operators,
+    }
+    # La versión es el contenido: reaplicar el mismo delta no cambia nada, uno distinto reemplaza al anterior
+    delta['version'] = hashlib.sha256(json.dumps(delta, sort_keys=True).encode('utf-8')).hexdigest()[:16]
+    return delta
+
+def delta_rows(delta):
+    """Filas de evaluations: una por operador y la de la sesión completa (operator '*')"""
+    ts = datetime.fromisoformat(delta['ts'])
+    base = dict(delta['criteria'], job_id=delta['job_id'], talk_group=delta.get('talk_group') or ALL, ts=ts.isoformat(),
+                day=ts.date().isoformat(), week=(ts.date() - timedelta(days=ts.weekday())).isoformat(),
+                errors=json.dumps(delta.get('errors', [])))
+    rows = [dict(base, operator=ALL, operator_name=None, operator_score=base['score'])]
+    for operator, info in delta.get('operators', {}).items():
+        score = info.get('score')
+        rows.append(dict(base, operator=operator, operator_name=info.get('name'), operator_score=base['score'] if score is None else score))
+    return rows
+
+class AnalyticsStore:
+    def __init__(self, path=LOCAL_PATH):
+        self.path = path
+
+    @contextlib.contextmanager
+    def connect(self):
+        conn = sqlite3.connect(self.path)
+        conn.row_factory = sqlite3.Row
+        try:
+            conn.executescript(SCHEMA)
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def _rollup(self, conn, row, sign):
+        errors = json.loads(row['errors'] or '[]')
+        for period, bucket in (('day', row['day']), ('week', row['week'])):
+            for talk_group in {row['talk_group'], ALL}:
+                conn.execute(ROLLUP_UPSERT, (period, bucket, row['operator'], talk_group, sign, *[sign * (row[m] or 0.0) for m in METRICS]))
+                for category in errors:
+                    conn.execute(ERROR_UPSERT, (period, bucket, row['operator'], talk_group, category, sign))
+
+    def apply(self, conn, delta):
+        """Aplica un delta dentro de la transacción de conn. Retorna False si esa versión ya estaba aplicada"""
+        applied = conn.execute('SELECT version FROM applied WHERE job_id = ?', (delta['job_id'],)).fetchone()
+        if applied and applied['version'] == delta['version']:
+            return False
+        if applied:
+            # Job reprocesado: se restan sus filas anteriores de los rollups
+            for row in conn.execute('SELECT * FROM evaluations WHERE job_id = ?', (delta['job_id'],)).fetchall():
+                self._rollup(conn, row, -1)
+            conn.execute('DELETE FROM evaluations WHERE job_id = ?', (delta['job_id'],))
+            conn.execute('DELETE FROM rollups WHERE n <= 0')
+            conn.execute('DELETE FROM error_rollups WHERE n <= 0')
+        columns = ('job_id', 'operator', 'operator_name', 'talk_group', 'ts', 'day', 'week') + METRICS + ('errors',)
+        for row in delta_rows(delta):
+            conn.execute(f"INSERT INTO evaluations ({', '.join(columns)}) VALUES ({', '.join('?' for _ in columns)})",
+                         [row[c] for c in columns])
+            self._rollup(conn, row, 1)
+            if row['operator'] != ALL:
+                conn.execute('INSERT OR REPLACE INTO operators (operator, name) VALUES (?, ?)', (row['operator'], row['operator_name']))
+        conn.execute('INSERT OR REPLACE INTO applied (job_id, version) VALUES (?, ?)', (delta['job_id'], delta['version']))
+        return True
+
+    def series(self, operator=ALL, talk_group=ALL, period='day', start=None, end=None):
+        """Promedios por día o semana de un operador y/o grupo ('*' = todos)"""
+        where = 'period = ? AND operator = ? AND talk_group = ? AND bucket BETWEEN ? AND ?'
+        args = (period, operator, talk_group, start or '0000-00-00', end or '9999-99-99')
+        with self.connect() as conn:
+            errors = {}
+            for row in conn.execute(f'SELECT bucket, category, n FROM error_rollups WHERE {where}', args):
+                errors.setdefault(row['bucket'], {})[row['category']] = row['n']
+            return [dict({m: round(row[m] / row['n'], 2) for m in METRICS}, bucket=row['bucket'], sessions=row['n'],
+                         errors=errors.get(row['bucket'], {}))
+                    for row in conn.execute(f'SELECT * FROM rollups WHERE {where} ORDER BY bucket', args)]
+
+    def ranking(self, talk_group=ALL, period='day', start=None, end=None):
+        """Promedios por operador en el rango, sumando los rollups (no las filas)"""
+        args = (period, talk_group, start or '0000-00-00', end or '9999-99-99')
+        with self.connect() as conn:
+            rows = conn.execute(f"""
+                SELECT r.operator, o.name, SUM(r.n) AS n, {', '.join(f'SUM(r.{m}) AS {m}' for m in METRICS)}
+                FROM rollups r LEFT JOIN operators o ON o.operator = r.operator
+                WHERE r.period = ? AND r.talk_group = ? AND r.operator != '*' AND r.bucket BETWEEN ? AND ?
+                GROUP BY r.operator ORDER BY SUM(r.operator_score) / SUM(r.n)""", args).fetchall()
+            return [dict({m: round(row[m] / row['n'], 2) for m in METRICS}, operator=row['operator'], name=row['name'], sessions=row['n'])
+                    for row in rows]
+
+class LocalAnalyticsStore(AnalyticsStore):
+    """SQLite en un archivo local; add() aplica el delta en el momento (pruebas offline)"""
+    def add(self, delta):
+        with open(self.path + '.lock', 'w') as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            with self.connect() as conn:
+                self.apply(conn, delta)
+
+    def sync(self, force=False):
+        pass
+
+    def compact(self, max_deltas=MAX_DELTAS):
+        return 0
+
+class S3AnalyticsStore(AnalyticsStore):
+    def __init__(self, s3, bucket, path=LOCAL_PATH):
+        super().__init__(path)
+        self.s3, self.bucket = s3, bucket
+        self.etag = None
+        self._synced = None
+
+    def add(self, delta):
+        key = f"{PENDING_PREFIX}{delta['job_id']}/{int(time.time() * 1000):013d}-{delta['version']}.json"
+        self.s3.put_object(Bucket=self.bucket, Key=key,
+                           Body=json.dumps(delta, ensure_ascii=False), ContentType='application/json')
+
+    def sync(self, force=False):
+        """Trae la última versión del SQLite si cambió; sin 'force' revalida como mucho cada SYNC_INTERVAL segundos"""
+        if not force and self._synced is not None and time.monotonic() - self._synced < SYNC_INTERVAL:
+            return
+        try:
+            etag = self.s3.head_object(Bucket=self.bucket, Key=DB_KEY)['ETag']
+        except self.s3.exceptions.ClientError as e:
+            if e.response['Error']['Code'] not in ('404', 'NoSuchKey'):
+                raise
+            etag = None
+            if os.path.exists(self.path):
+                os.remove(self.path)
+        if etag is not None and (etag != self.etag or not os.path.exists(self.path)):
+            obj = self.s3.get_object(Bucket=self.bucket, Key=DB_KEY)
+            with open(self.path + '.tmp', 'wb') as f:
+                f.write(obj['Body'].read())
+            os.replace(self.path + '.tmp', self.path)
+            etag = obj['ETag']
+        self.etag, self._synced = etag, time.monotonic()
+
+    @staticmethod
+    def _pending_job(key):
+        """job_id de una clave pendiente (también las del formato anterior, analytics/pending/{job_id}.json)"""
+        name = key[len(PENDING_PREFIX):]
+        return name.split('/', 1)[0] if '/' in name else name[:-len('.json')]
+
+    def pending(self, max_deltas=MAX_DELTAS):
+        """Claves pendientes en orden (por job y, dentro del job, por antigüedad). El corte en max_deltas no separa
+        las claves de un mismo job, para que una versión vieja no quede para la compactación siguiente"""
+        keys = []
+        for page in self.s3.get_paginator('list_objects_v2').paginate(Bucket=self.bucket, Prefix=PENDING_PREFIX):
+            for obj in page.get('Contents', []):
+                if len(keys) >= max_deltas and self._pending_job(obj['Key']) != self._pending_job(keys[-1]):
+                    return keys
+                keys.append(obj['Key'])
+        return keys
+
+    def compact(self, max_deltas=MAX_DELTAS):
+        """Aplica los deltas pendientes y sube la base con IfMatch; ante un conflicto vuelve a bajarla y reintenta
+        (la tabla 'applied' hace idempotente reaplicar). De cada job se aplica solo el delta más nuevo y se borran
+        únicamente las claves leídas. Retorna la cantidad de deltas aplicados"""
+        keys = self.pending(max_deltas)
+        if not keys:
+            return 0
+        latest = {self._pending_job(key): key for key in keys}  # Las claves de un job vienen de la más vieja a la más nueva
+        deltas = [json.loads(self.s3.get_object(Bucket=self.bucket, Key=key)['Body'].read()) for key in latest.values()]
+        for attempt in range(MAX_CONFLICT_RETRIES):
+            self.sync(force=True)
+            with self.connect() as conn:
+                applied = sum(self.apply(conn, delta) for delta in deltas)
+            condition = {'IfMatch': self.etag} if self.etag else {'IfNoneMatch': '*'}
+            try:
+                with open(self.path, 'rb') as f:
+                    resp = self.s3.put_object(Bucket=self.bucket, Key=DB_KEY, Body=f.read(),
+                                              ContentType='application/vnd.sqlite3', **condition)
+            except self.s3.exceptions.ClientError as e:
+                if e.response['Error']['Code'] not in ('PreconditionFailed', 'ConditionalRequestConflict'):
+                    raise
+                self.etag = None  # La copia local tiene deltas que la remota no: se descarta en el próximo sync
+                time.sleep(0.2 * 2 ** attempt)
+                continue
+            self.etag, self._synced = resp['ETag'], time.monotonic()
+            for i in range(0, len(keys), 1000):
+                self.s3.delete_objects(Bucket=self.bucket, Delete={'Objects': [{'Key': k} for k in keys[i:i + 1000]], 'Quiet': True})
+            return applied
+        raise RuntimeError('No se pudo subir la base analítica: conflictos repetidos')
+
+def from_env(s3=None, bucket=None):
+    if os.environ.get('ANALYTICS_STORE', 's3') == 'file':
+        return LocalAnalyticsStore(LOCAL_PATH)
+    return S3AnalyticsStore(s3, bucket)
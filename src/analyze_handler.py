@@ -3,62 +3,44 @@ Lambda de análisis completo: Transcribe + Bedrock
 Flujo: Audio S3 → Transcribe → Bedrock → Scoring JSON
 """
 import json
-import boto3
 import os
-import time
 import base64
 
-transcribe = boto3.client('transcribe')
-bedrock = boto3.client('bedrock-runtime')
-s3 = boto3.client('s3')
+import evaluation
+import evaluation_cache
+import lexicon
+import prompt_builder
+import transcription
+from core import api, clients
+from poller import TranscribePoller
+
+transcribe = clients.lazy('transcribe')
+bedrock = clients.lazy('bedrock-runtime')
+s3 = clients.lazy('s3')
 
 BUCKET = os.environ['AUDIO_BUCKET']
 MODEL_ID = 'us.anthropic.claude-sonnet-4-20250514-v1:0'
 
-PROMPT_TEMPLATE = """Eres un evaluador experto en comunicaciones ferroviarias operativas del metro de Buenos Aires.
-
-Evalúa la siguiente transcripción según estos criterios (25% cada uno):
-
-1. FRASEOLOGÍA (0-10): Uso de términos oficiales como "Afirmativo", "Copiado", "Solicito", "Confirme", "Repita"
-2. CLARIDAD (0-10): Mensaje completo, sin ambigüedades, ubicación exacta
-3. PROTOCOLO (0-10): Identificación emisor/receptor, estructura correcta
-4. FORMALIDAD (0-10): Lenguaje profesional, sin apodos ni coloquialismos
+CLIP_PROMPT = prompt_builder.load('clip')
 
-TRANSCRIPCIÓN:
-{transcripcion}
-
-Responde ÚNICAMENTE con JSON válido:
-{{"score": <promedio 0-10>, "fraseologia": <0-10>, "claridad": <0-10>, "protocolo": <0-10>, "formalidad": <0-10>, "justification": "<explicación>", "errores_detectados": ["<error1>"], "recommendations": ["<mejora1>"]}}"""
+eval_cache = evaluation_cache.EvaluationCache(s3, BUCKET)
 
 def handler(event, context):
     try:
-        body = json.loads(event.get('body', '{}'))
+        body = api.json_body(event)
         audio_key = body.get('audio_key')
         
         if not audio_key:
-            return response(400, {'error': 'audio_key requerido'})
+            return api.response(400, {'error': 'audio_key requerido'})
         
         # 1. Iniciar transcripción
         job_name = f"emova-{context.aws_request_id[:8]}"
-        transcribe.start_transcription_job(
-            TranscriptionJobName=job_name,
-            LanguageCode='es-ES',
-            MediaFormat=audio_key.split('.')[-1] or 'mp3',
-            Media={'MediaFileUri': f's3://{BUCKET}/{audio_key}'},
-            OutputBucketName=BUCKET,
-            OutputKey=f'transcriptions/{job_name}.json',
-            Settings={'ShowSpeakerLabels': True, 'MaxSpeakerLabels': 5}
-        )
+        transcription.start_job_waiting(transcribe, BUCKET, job_name, audio_key, media_format=audio_key.split('.')[-1] or 'mp3')
         
-        # 2. Esperar transcripción (polling)
-        while True:
-            status = transcribe.get_transcription_job(TranscriptionJobName=job_name)
-            job_status = status['TranscriptionJob']['TranscriptionJobStatus']
-            if job_status == 'COMPLETED':
-                break
-            elif job_status == 'FAILED':
-                return response(500, {'error': 'Transcripción falló'})
-            time.sleep(2)
+        # 2. Esperar transcripción (polling con backoff)
+        job_status, reason = TranscribePoller(transcribe, job_name).wait_for(job_name)
+        if job_status == 'FAILED':
+            return api.response(500, {'error': f'Transcripción falló: {reason}'})
         
         # 3. Leer transcripción
         trans_obj = s3.get_object(Bucket=BUCKET, Key=f'transcriptions/{job_name}.json')
@@ -66,37 +48,32 @@ def handler(event, context):
         transcript = trans_data.get('results', {}).get('transcripts', [{}])[0].get('transcript', '')
         
         if not transcript:
-            return response(400, {'error': 'No se pudo transcribir el audio'})
+            return api.response(400, {'error': 'No se pudo transcribir el audio'})
+        
+        # 4. Léxico local: un acuse de recibo no necesita el modelo; si no, va como hechos en el prompt
+        matches = lexicon.scan([transcript])
+        if lexicon.is_trivial([transcript]):
+            return api.response(200, {'transcript': transcript, 'evaluation': lexicon.local_evaluation(matches)})
+        report = lexicon.summarize(matches)
         
-        # 4. Evaluar con Bedrock
-        prompt = PROMPT_TEMPLATE.replace('{transcripcion}', transcript)
-        bedrock_response = bedrock.invoke_model(
-            modelId=MODEL_ID,
-            body=json.dumps({
-                "anthropic_version": "bedrock-2023-05-31",
-                "max_tokens": 1024,
-                "messages": [{"role": "user", "content": prompt}]
-            })
-        )
+        # 5. Evaluar con Bedrock (o reutilizar una evaluación idéntica previa)
+        cache_key = evaluation_cache.cache_key(MODEL_ID, CLIP_PROMPT.fingerprint, transcript, {'lexicon': lexicon.FINGERPRINT})
+        clip_evaluation = eval_cache.get(cache_key)
         
-        result = json.loads(bedrock_response['body'].read())
-        evaluation = json.loads(result['content'][0]['text'])
+        if clip_evaluation is None:
+            values = {'transcripcion': transcript, 'hechos': lexicon.facts(report)}
+            clip_evaluation = evaluation.invoke(bedrock, MODEL_ID, CLIP_PROMPT.render(**{f: values[f] for f in CLIP_PROMPT.fields}), max_tokens=1024)
+            if 'hechos' in CLIP_PROMPT.fields and lexicon.OVERRIDE_SCORES:
+                clip_evaluation = lexicon.apply(clip_evaluation, report)
+            eval_cache.put(cache_key, clip_evaluation)
         
-        # 5. Retornar resultado
-        return response(200, {
+        # 6. Retornar resultado
+        return api.response(200, {
             'transcript': transcript,
-            'evaluation': evaluation
+            'evaluation': clip_evaluation
         })
         
+    except api.BadRequest as e:
+        return api.response(400, {'error': str(e)})
     except Exception as e:
-        return response(500, {'error': str(e)})
-
-def response(status, body):
-    return {
-        'statusCode': status,
-        'headers': {
-            'Access-Control-Allow-Origin': '*',
-            'Content-Type': 'application/json'
-        },
-        'body': json.dumps(body, ensure_ascii=False)
-    }
+        return api.response(500, {'error': str(e)})
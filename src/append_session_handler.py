@@ -0,0 +1,43 @@
+"""Lambda para agregar clips a una sesión ya evaluada (turno en vivo)
+
+POST /job/{job_id}/append con {audio_keys: [...], xml_keys: {recordings: [...]}}: transcribe solo los clips
+nuevos y actualiza la evaluación desde la previa. Responde 409 si el job todavía está procesando.
+"""
+import os
+
+import job_store
+from core import api, clients
+from job_submission import append_clips
+
+s3 = clients.lazy('s3')
+lambda_client = clients.lazy('lambda')
+
+BUCKET = os.environ['AUDIO_BUCKET']
+PROCESS_FUNCTION = os.environ['PROCESS_FUNCTION_NAME']
+
+jobs = job_store.from_env(s3, BUCKET)
+
+def handler(event, context):
+    try:
+        job_id = (event.get('pathParameters') or {}).get('job_id')
+        if not job_id:
+            return api.response(400, {'error': 'job_id requerido'})
+
+        body = api.json_body(event)
+        audio_keys = body.get('audio_keys', [])
+        if not audio_keys:
+            return api.response(400, {'error': 'audio_keys requerido'})
+
+        record, new_keys = append_clips(jobs, lambda_client, PROCESS_FUNCTION, job_id, audio_keys, body.get('xml_keys', {}))
+        if record is None:
+            current = jobs.get(job_id)
+            if current is None:
+                return api.response(404, {'error': 'Job no encontrado'})
+            return api.response(409, {'error': 'El job todavía está procesando; reintentar cuando termine', 'status': current.get('status')})
+
+        return api.response(202 if new_keys else 200, {'job_id': job_id, 'status': record['status'], 'appended': len(new_keys), 'append': record.get('appends', 0)})
+
+    except api.BadRequest as e:
+        return api.response(400, {'error': str(e)})
+    except Exception as e:
+        return api.response(500, {'error': str(e)})
@@ -0,0 +1,136 @@
+"""Ingesta de un export del grabador subido como un único zip o tar (audios + CallRefs + Holders + recordings).
+
+El archivo no se baja entero: un zip se lee con GETs por rango sobre S3 (zipfile necesita el directorio central
+del final, así que alcanza con un objeto seekable), y un tar (también .tar.gz) se recorre en modo stream
+sobre el Body de get_object. Cada miembro se sube con upload_fileobj (multipart por partes) a la estructura
+que esperan discover_sessions y process_job: {prefix}/audios/, {prefix}/recordings/, CallRefs.xml y Holders.xml.
+"""
+import io
+import posixpath
+import tarfile
+import zipfile
+
+RANGE_CHUNK = 1024 * 1024  # Lectura mínima por GET con rango
+ARCHIVE_SUFFIXES = ('.zip', '.tar', '.tar.gz', '.tgz')
+CONTENT_TYPES = {'.wav': 'audio/wav', '.xml': 'application/xml'}  # Extensión normalizada -> ContentType
+
+class S3RangeFile(io.RawIOBase):
+    """Archivo de solo lectura y seekable sobre un objeto S3, con un buffer de RANGE_CHUNK bytes"""
+    def __init__(self, s3, bucket, key, chunk=RANGE_CHUNK):
+        self.s3, self.bucket, self.key, self.chunk = s3, bucket, key, chunk
+        self.size = s3.head_object(Bucket=bucket, Key=key)['ContentLength']
+        self.pos = 0
+        self.requests = 0
+        self._buffer, self._buffer_start = b'', 0
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def tell(self):
+        return self.pos
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        base = {io.SEEK_SET: 0, io.SEEK_CUR: self.pos, io.SEEK_END: self.size}[whence]
+        self.pos = max(0, base + offset)
+        return self.pos
+
+    def _fetch(self, start, length):
+        end = min(self.size, start + max(length, self.chunk)) - 1
+        self.requests += 1
+        self._buffer = self.s3.get_object(Bucket=self.bucket, Key=self.key, Range=f'bytes={start}-{end}')['Body'].read()
+        self._buffer_start = start
+
+    def read(self, size=-1):
+        if size is None or size < 0:
+            size = self.size - self.pos
+        size = min(size, self.size - self.pos)
+        if size <= 0:
+            return b''
+        offset = self.pos - self._buffer_start
+        if offset < 0 or offset + size > len(self._buffer):
+            self._fetch(self.pos, size)
+            offset = 0
+        data = self._buffer[offset:offset + size]
+        self.pos += len(data)
+        return data
+
+    def readinto(self, b):
+        data = self.read(len(b))
+        b[:len(data)] = data
+        return len(data)
+
+class DuplicateMember(ValueError):
+    """Dos miembros del archivo (en carpetas distintas) van a la misma clave de destino"""
+
+def is_archive(key):
+    return key.lower().endswith(ARCHIVE_SUFFIXES)
+
+def destination(name, prefix):
+    """Clave de destino de un miembro según su nombre, o None si no es parte del export. La extensión queda en
+    minúsculas ('138928171.WAV' -> audios/138928171.wav), que es lo que esperan sessionizer y process_job"""
+    stem, ext = posixpath.splitext(posixpath.basename(name.replace('\\', '/')))
+    ext = ext.lower()
+    if not stem or stem.startswith('.') or '__MACOSX' in name or ext not in CONTENT_TYPES:
+        return None
+    if ext == '.xml' and stem.lower() == 'callrefs':
+        return f'{prefix}/CallRefs.xml'
+    if ext == '.xml' and stem.lower() == 'holders':
+        return f'{prefix}/Holders.xml'
+    return f"{prefix}/{'audios' if ext == '.wav' else 'recordings'}/{stem}{ext}"
+
+def _content_type(key):
+    return CONTENT_TYPES[posixpath.splitext(key)[1]]
+
+def _members(s3, bucket, key):
+    """Genera (nombre, archivo abierto) de cada miembro regular del zip o tar"""
+    if key.lower().endswith('.zip'):
+        with zipfile.ZipFile(S3RangeFile(s3, bucket, key)) as archive:
+            for info in archive.infolist():
+                if not info.is_dir():
+                    with archive.open(info) as member:
+                        yield info.filename, member
+        return
+    body = s3.get_object(Bucket=bucket, Key=key)['Body']
+    with tarfile.open(fileobj=body, mode='r|*') as archive:
+        for info in archive:
+            if info.isfile():
+                yield info.name, archive.extractfile(info)
+
+def ingest(s3, bucket, archive_key, prefix):
+    """Extrae el archivo bajo 'prefix'. Retorna {'audio_keys', 'xml_keys': {'callrefs', 'holders', 'recordings'},
+    'skipped'} listo para start_job / discover_sessions. DuplicateMember si dos miembros tienen el mismo nombre"""
+    audio_keys, xml_keys, skipped = [], {'recordings': []}, []
+    sources = {}  # clave de destino -> miembro que la escribió
+    for name, member in _members(s3, bucket, archive_key):
+        key = destination(name, prefix)
+        if key is None:
+            skipped.append(name)
+            continue
+        if key in sources:
+            # Se aplana la estructura de carpetas: un nombre repetido pisaría el clip o el XML anterior
+            raise DuplicateMember(f'{sources[key]} y {name} tienen el mismo nombre de archivo')
+        sources[key] = name
+        s3.upload_fileobj(member, bucket, key, ExtraArgs={'ContentType': _content_type(key)})
+        if key.endswith('.wav'):  # destination() ya normalizó la extensión
+            audio_keys.append(key)
+        elif key.endswith('/CallRefs.xml'):
+            xml_keys['callrefs'] = key
+        elif key.endswith('/Holders.xml'):
+            xml_keys['holders'] = key
+        else:
+            xml_keys['recordings'].append(key)
+    return {'audio_keys': sorted(audio_keys), 'xml_keys': dict(xml_keys, recordings=sorted(xml_keys['recordings'])), 'skipped': skipped}
+
+def default_prefix(archive_key):
+    """archives/{id}/export.zip -> sessions/{id}/export"""
+    parts = archive_key.split('/')
+    name = parts[-1]
+    for suffix in ARCHIVE_SUFFIXES:
+        if name.lower().endswith(suffix):
+            name = name[:-len(suffix)]
+            break
+    return posixpath.join('sessions', *parts[1:-1], name) if len(parts) > 2 else f'sessions/{name}'
+
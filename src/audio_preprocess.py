@@ -0,0 +1,133 @@
+"""Preprocesado de WAV antes de Transcribe: VAD por energía, recorte de silencios y normalización a PCM mono.
+
+Los clips TETRA traen silencio de PTT, colas de ruido y pausas largas; Transcribe cobra y encola por duración.
+Cada clip se decodifica, se marca voz/silencio por tramas de 20 ms (vectorizado con NumPy), se quitan los
+silencios de los extremos y las pausas de más de VAD_MAX_GAP_SECONDS, y se pasa a mono 16 bits. Los clips sin voz
+se descartan sin llegar a Transcribe. 'segments' guarda el mapeo al audio original para que los timestamps
+de las palabras sigan alineados con recordings/*.xml.
+"""
+import bisect
+import os
+
+import batching
+import transcription
+import transcription_cache
+from core.imports import lazy_module
+
+np = lazy_module('numpy')  # ~100 ms de import que solo paga la ejecución que tiene clips nuevos para preprocesar
+
+ENABLED = os.environ.get('VAD_ENABLED', 'true').lower() == 'true'
+THRESHOLD_DB = float(os.environ.get('VAD_THRESHOLD_DB', '-45'))  # dBFS por trama
+MIN_SPEECH_SECONDS = float(os.environ.get('VAD_MIN_SPEECH_SECONDS', '0.3'))
+MAX_GAP_SECONDS = float(os.environ.get('VAD_MAX_GAP_SECONDS', '1.0'))
+PAD_SECONDS = 0.25
+FRAME_SECONDS = 0.02
+MIN_RUN_FRAMES = 3  # Descarta picos aislados (clic de PTT) más cortos que 60 ms
+TARGET_RATE = int(os.environ.get('TRANSCRIBE_SAMPLE_RATE', '0'))  # 0 = conservar si Transcribe lo acepta
+MIN_RATE, MAX_RATE = 8000, 48000
+
+EMPTY_RESULTS = {'transcripts': [{'transcript': ''}], 'items': []}
+
+# Parámetros que cambian lo que llega a Transcribe (y si el clip se descarta): forman parte de la clave del caché
+SETTINGS = {'threshold_db': THRESHOLD_DB, 'min_speech_seconds': MIN_SPEECH_SECONDS, 'max_gap_seconds': MAX_GAP_SECONDS,
+            'pad_seconds': PAD_SECONDS, 'min_run_frames': MIN_RUN_FRAMES, 'target_rate': TARGET_RATE}
+
+def cache_key(audio_bytes):
+    """Clave del caché de transcripciones de un clip procesado como en process_job (con o sin VAD)"""
+    settings = dict(transcription.SETTINGS, vad=SETTINGS) if ENABLED else transcription.SETTINGS
+    return transcription_cache.cache_key(audio_bytes, transcription.LANGUAGE_CODE, settings)
+
+def decode(data):
+    """Retorna (muestras float32 mono en [-1, 1], (canales, bytes por muestra, sample_rate)) o None si no es PCM legible"""
+    wav = batching.read_wav(data)
+    if wav is None:
+        return None
+    (channels, width, rate), frames = wav
+    frames = frames[:len(frames) // (channels * width) * channels * width]
+    if width == 1:
+        samples = (np.frombuffer(frames, np.uint8).astype(np.float32) - 128) / 128
+    elif width == 3:
+        raw = np.frombuffer(frames, np.uint8).reshape(-1, 3)
+        samples = ((raw[:, 0].astype(np.int32) << 8 | raw[:, 1].astype(np.int32) << 16 | raw[:, 2].astype(np.int32) << 24) >> 8) / 2 ** 23
+    else:
+        samples = np.frombuffer(frames, {2: '<i2', 4: '<i4'}[width]).astype(np.float32) / 2 ** (8 * width - 1)
+    return samples.reshape(-1, channels).mean(axis=1, dtype=np.float32), (channels, width, rate)
+
+def resample(samples, rate, target):
+    """Interpolación lineal; suficiente para voz de banda angosta"""
+    if rate == target or not len(samples):
+        return samples
+    positions = np.arange(int(len(samples) * target / rate)) * (rate / target)
+    return np.interp(positions, np.arange(len(samples)), samples).astype(np.float32)
+
+def frame_energy_db(samples, rate, frame_seconds=FRAME_SECONDS):
+    size = max(1, int(rate * frame_seconds))
+    frames = samples[:len(samples) // size * size].reshape(-1, size)
+    return 10 * np.log10(np.mean(frames ** 2, axis=1) + 1e-10)
+
+def speech_mask(energy_db, threshold_db=THRESHOLD_DB, min_run=MIN_RUN_FRAMES):
+    """Tramas con voz: sobre el umbral y en rachas de al menos min_run tramas (apertura morfológica)"""
+    voiced = energy_db > threshold_db
+    if min_run <= 1 or len(voiced) < min_run:
+        return voiced
+    windows = np.lib.stride_tricks.sliding_window_view
+    core = windows(np.pad(voiced, (0, min_run - 1)), min_run).all(axis=1)
+    return windows(np.pad(core, (min_run - 1, 0)), min_run).any(axis=1)
+
+def speech_regions(mask, frame_seconds=FRAME_SECONDS, pad=PAD_SECONDS, max_gap=MAX_GAP_SECONDS):
+    """[(inicio, fin)] en segundos de los tramos con voz, con margen 'pad' y uniendo pausas de hasta max_gap"""
+    edges = np.flatnonzero(np.diff(np.concatenate(([0], mask.astype(np.int8), [0]))))
+    total = len(mask) * frame_seconds
+    regions = []
+    for start, end in zip(edges[::2], edges[1::2]):
+        start, end = max(0.0, float(start) * frame_seconds - pad), min(total, float(end) * frame_seconds + pad)
+        if regions and start - regions[-1][1] <= max_gap:
+            regions[-1] = (regions[-1][0], end)
+        else:
+            regions.append((start, end))
+    return regions
+
+def prepare(data):
+    """Retorna {'audio': bytes WAV o None si el clip no tiene voz, 'segments': [(origen, destino, duración)] o None
+    si el audio no cambió, 'duration', 'original_duration', 'speech_seconds'}"""
+    decoded = decode(data)
+    if decoded is None:
+        return {'audio': data, 'segments': None, 'duration': None, 'original_duration': None, 'speech_seconds': None}
+    samples, params = decoded
+    rate = params[2]
+    original_duration = len(samples) / rate
+    energy = frame_energy_db(samples, rate)
+    mask = speech_mask(energy)
+    speech_seconds = float(mask.sum() * FRAME_SECONDS)
+    info = {'original_duration': original_duration, 'speech_seconds': speech_seconds}
+    if speech_seconds < MIN_SPEECH_SECONDS:
+        return dict(info, audio=None, segments=None, duration=0.0)
+
+    target = TARGET_RATE or min(max(rate, MIN_RATE), MAX_RATE)
+    regions = speech_regions(mask)
+    if params == (1, 2, target) and len(regions) == 1 and regions[0][0] == 0 and regions[0][1] >= len(energy) * FRAME_SECONDS:
+        return dict(info, audio=data, segments=None, duration=original_duration)
+
+    chunks, segments, position = [], [], 0.0
+    for start, end in regions:
+        chunks.append(samples[int(start * rate):int(end * rate)])
+        segments.append((start, position, end - start))
+        position += end - start
+    out = resample(np.concatenate(chunks), rate, target)
+    pcm = (np.clip(out, -1, 1) * 32767).astype('<i2').tobytes()
+    return dict(info, audio=batching.write_wav((1, 2, target), [pcm]), segments=segments, duration=len(out) / target)
+
+def to_source_time(t, segments):
+    """Convierte un tiempo del audio preprocesado al del clip original"""
+    idx = max(bisect.bisect_right([dst for _, dst, _ in segments], t) - 1, 0)
+    src, dst, length = segments[idx]
+    return src + min(max(t - dst, 0.0), length)
+
+def shift_results(results, segments):
+    """Lleva los timestamps de 'items' de vuelta a la línea de tiempo del clip original"""
+    if not results or not segments:
+        return results
+    items = [dict(item, start_time=f"{to_source_time(float(item['start_time']), segments):.3f}",
+                  end_time=f"{to_source_time(float(item['end_time']), segments):.3f}") if 'start_time' in item else item
+             for item in results.get('items', [])]
+    return dict(results, items=items)
@@ -0,0 +1,86 @@
+"""Inferencia por lotes de Bedrock (CreateModelInvocationJob), para evaluar muchas sesiones a precio de lote.
+
+Los registros van en archivos JSONL ({"recordId", "modelInput"}, con el mismo cuerpo que InvokeModel) en el
+bucket; el servicio deja la salida en {prefijo de salida}/{id del job}/{archivo}.out, una línea por registro
+con "modelOutput" o "error". LocalBatch cumple el mismo contrato sin el servicio: procesa el archivo con
+InvokeModel registro por registro al enviarlo (pruebas, y corridas con menos de MIN_RECORDS registros, que el
+servicio no acepta).
+"""
+import json
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+import evaluation
+
+MIN_RECORDS = 100  # Mínimo de registros por job del servicio
+MAX_RECORDS = 50000  # Máximo de registros por archivo de entrada
+TERMINAL = ('Completed', 'PartiallyCompleted', 'Failed', 'Stopped', 'Expired')
+LOCAL_ARN_PREFIX = 'arn:local:bedrock:model-invocation-job/'
+
+def record(record_id, prompt, max_tokens=2048):
+    return {'recordId': record_id, 'modelInput': evaluation.request_body([{'role': 'user', 'content': prompt}], max_tokens)}
+
+def write_input(s3, bucket, key, records):
+    body = ''.join(json.dumps(r, ensure_ascii=False) + '\n' for r in records)
+    s3.put_object(Bucket=bucket, Key=key, Body=body.encode('utf-8'), ContentType='application/jsonl')
+
+def job_id(job_arn):
+    return job_arn.rsplit('/', 1)[-1]
+
+def output_key(output_prefix, job_arn, input_key):
+    return f"{output_prefix.rstrip('/')}/{job_id(job_arn)}/{input_key.rsplit('/', 1)[-1]}.out"
+
+def read_output(s3, bucket, key):
+    """{recordId: (texto, usage, error)} de un archivo de salida; texto None si el registro falló"""
+    outputs = {}
+    for line in s3.get_object(Bucket=bucket, Key=key)['Body'].read().decode('utf-8').splitlines():
+        if not line.strip():
+            continue
+        item = json.loads(line)
+        output = item.get('modelOutput')
+        text = ''.join(block.get('text', '') for block in output.get('content', [])) if output else None
+        outputs[item['recordId']] = (text, (output or {}).get('usage', {}), item.get('error'))
+    return outputs
+
+class BedrockBatch:
+    """El servicio de Bedrock; role_arn es el rol con que el job lee y escribe el bucket"""
+    def __init__(self, client, bucket, role_arn):
+        self.client, self.bucket, self.role_arn = client, bucket, role_arn
+
+    def submit(self, name, model_id, input_key, output_prefix):
+        """Retorna el ARN del job"""
+        return self.client.create_model_invocation_job(
+            jobName=name, roleArn=self.role_arn, modelId=model_id,
+            inputDataConfig={'s3InputDataConfig': {'s3Uri': f's3://{self.bucket}/{input_key}', 's3InputFormat': 'JSONL'}},
+            outputDataConfig={'s3OutputDataConfig': {'s3Uri': f"s3://{self.bucket}/{output_prefix.rstrip('/')}/"}}
+        )['jobArn']
+
+    def status(self, job_arn):
+        """Retorna (status, mensaje)"""
+        job = self.client.get_model_invocation_job(jobIdentifier=job_arn)
+        return job['status'], job.get('message')
+
+class LocalBatch:
+    """Sustituto local del servicio sobre bedrock-runtime: el job corre entero dentro de submit"""
+    def __init__(self, s3, bucket, runtime, max_parallel=evaluation.MAX_PARALLEL):
+        self.s3, self.bucket, self.runtime, self.max_parallel = s3, bucket, runtime, max_parallel
+
+    def _run(self, model_id, item):
+        try:
+            response = self.runtime.invoke_model(modelId=model_id, body=json.dumps(item['modelInput']))
+            return dict(item, modelOutput=json.loads(response['body'].read()))
+        except Exception as e:
+            # Como el servicio: el registro queda con el error y el resto del lote sigue
+            return dict(item, error={'errorCode': 500, 'errorMessage': str(e)})
+
+    def submit(self, name, model_id, input_key, output_prefix):
+        job_arn = f'{LOCAL_ARN_PREFIX}{name}-{uuid.uuid4().hex[:8]}'
+        lines = self.s3.get_object(Bucket=self.bucket, Key=input_key)['Body'].read().decode('utf-8').splitlines()
+        items = [json.loads(line) for line in lines if line.strip()]
+        with ThreadPoolExecutor(max_workers=max(1, self.max_parallel)) as pool:
+            outputs = list(pool.map(lambda item: self._run(model_id, item), items))
+        write_input(self.s3, self.bucket, output_key(output_prefix, job_arn, input_key), outputs)
+        return job_arn
+
+    def status(self, job_arn):
+        return 'Completed', None
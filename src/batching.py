@@ -0,0 +1,129 @@
+"""Batching de clips TETRA: une los WAV cortos de una sesión en pocos archivos con silencio entre clips,
+transcribe un job por lote y reparte las palabras de vuelta a cada llamada usando los timestamps de 'items'"""
+import bisect
+import io
+import os
+import wave
+
+import transcription
+
+BATCH_MAX_SECONDS = float(os.environ.get('TRANSCRIBE_BATCH_MAX_SECONDS', '900'))
+PAD_SECONDS = 1.0
+
+def read_wav(data):
+    """Retorna (params, frames) o None si el archivo no es PCM legible por el módulo wave"""
+    try:
+        with wave.open(io.BytesIO(data)) as w:
+            return (w.getnchannels(), w.getsampwidth(), w.getframerate()), w.readframes(w.getnframes())
+    except (wave.Error, EOFError):
+        return None
+
+def write_wav(params, chunks):
+    buf = io.BytesIO()
+    with wave.open(buf, 'wb') as w:
+        w.setnchannels(params[0])
+        w.setsampwidth(params[1])
+        w.setframerate(params[2])
+        w.writeframes(b''.join(chunks))
+    return buf.getvalue()
+
+def build_batches(s3, bucket, audio_keys, batch_prefix, max_seconds=BATCH_MAX_SECONDS, pad_seconds=PAD_SECONDS, load=None):
+    """Concatena los clips (en el orden recibido) en lotes de hasta max_seconds y los sube a S3.
+
+    Cada lote es {'key', 'segments': [{'audio_key', 'start', 'end'}]} con los rangos en segundos
+    dentro del audio del lote. Los clips que no son PCM se transcriben solos, sin reempaquetar.
+    load(audio_key) permite proveer los bytes del WAV; por defecto se leen de S3.
+    """
+    load = load or (lambda key: s3.get_object(Bucket=bucket, Key=key)['Body'].read())
+    batches, current = [], None
+
+    def flush():
+        if current and current['segments']:
+            key = f"{batch_prefix}/batch-{len(batches):03d}.wav"
+            s3.put_object(Bucket=bucket, Key=key, Body=write_wav(current['params'], current['chunks']), ContentType='audio/wav')
+            batches.append({'key': key, 'segments': current['segments']})
+
+    for audio_key in audio_keys:
+        wav = read_wav(load(audio_key))
+        if wav is None:
+            batches.append({'key': audio_key, 'segments': [{'audio_key': audio_key, 'start': 0.0, 'end': None}]})
+            continue
+        params, frames = wav
+        frame_bytes = params[0] * params[1]
+        clip_seconds = len(frames) / frame_bytes / params[2]
+        if current and (current['params'] != params or current['seconds'] + clip_seconds > max_seconds):
+            flush()
+            current = None
+        if current is None:
+            current = {'params': params, 'chunks': [], 'segments': [], 'seconds': 0.0}
+        elif pad_seconds:
+            pad_frames = int(pad_seconds * params[2])
+            current['chunks'].append(b'\x00' * pad_frames * frame_bytes)
+            current['seconds'] += pad_frames / params[2]
+        current['segments'].append({'audio_key': audio_key, 'start': current['seconds'], 'end': current['seconds'] + clip_seconds})
+        current['chunks'].append(frames)
+        current['seconds'] += clip_seconds
+    flush()
+    return batches
+
+def join_items(items):
+    """Reconstruye el texto a partir de items de Transcribe (la puntuación va pegada a la palabra anterior)"""
+    text = ''
+    for item in items:
+        content = item['alternatives'][0]['content']
+        text += content if item['type'] == 'punctuation' or not text else ' ' + content
+    return text
+
+def split_results(results, segments):
+    """Reparte los items del lote entre sus clips. Retorna {audio_key: results} con el mismo formato
+    que una salida de Transcribe por clip y los timestamps relativos al inicio de cada clip."""
+    if len(segments) == 1 and segments[0]['end'] is None:
+        return {segments[0]['audio_key']: results}
+    if results is None:
+        return {seg['audio_key']: None for seg in segments}
+
+    starts = [seg['start'] for seg in segments]
+    per_clip = {seg['audio_key']: [] for seg in segments}
+    last = None
+    for item in results.get('items', []):
+        if 'start_time' in item:
+            # Cada palabra va al último clip que empieza antes que ella (incluye el silencio posterior)
+            idx = max(bisect.bisect_right(starts, float(item['start_time'])) - 1, 0)
+            seg = segments[idx]
+            item = dict(item, start_time=f"{float(item['start_time']) - seg['start']:.3f}",
+                        end_time=f"{float(item['end_time']) - seg['start']:.3f}")
+            last = seg['audio_key']
+        elif last is None:
+            continue
+        per_clip[last].append(item)
+
+    return {key: {'transcripts': [{'transcript': join_items(items)}], 'items': items} for key, items in per_clip.items()}
+
+def transcribe_batched(transcribe, s3, bucket, audio_keys, job_prefix, batch_prefix, settings=None, on_done=None, load=None,
+                       running=None, on_start=None, stop=None, poller=None):
+    """Equivalente a transcription.transcribe_all pero con un job por lote en lugar de uno por clip.
+
+    running ({job_name: {'media', 'segments'}}) son lotes lanzados por una ejecución anterior;
+    on_start(job_name, batch_key, segments) avisa cada lote nuevo.
+    """
+    batches = build_batches(s3, bucket, audio_keys, batch_prefix, load=load) if audio_keys else []
+    segments_by_key = {b['key']: b['segments'] for b in batches}
+    for job in (running or {}).values():
+        segments_by_key[job['media']] = job['segments']
+    results = {}
+
+    def on_batch_done(batch_key, batch_results, _):
+        for audio_key, clip_results in split_results(batch_results, segments_by_key[batch_key]).items():
+            results[audio_key] = clip_results
+            if on_done:
+                on_done(audio_key, clip_results, len(results))
+
+    def on_batch_start(job_name, batch_key):
+        if on_start:
+            on_start(job_name, batch_key, segments_by_key[batch_key])
+
+    durations = {key: (segments[-1]['end'] or 0) for key, segments in segments_by_key.items()}
+    transcription.transcribe_all(transcribe, s3, bucket, [b['key'] for b in batches], job_prefix, settings=settings,
+                                 on_done=on_batch_done, durations=durations, poller=poller, on_start=on_batch_start, stop=stop,
+                                 running={name: job['media'] for name, job in (running or {}).items()})
+    return results
@@ -0,0 +1,75 @@
+"""Índice de un caché persistido en S3 ({prefijo}/index.json) para acotar su tamaño.
+
+Registra creación y último uso de cada entrada ({prefijo}/{clave}.json); save() fusiona los accesos de la ejecución,
+aplica TTL y desalojo LRU por cantidad y borra las entradas que quedaron afuera. El índice se escribe con
+escritura condicional (IfMatch), como los registros de job_store, para no perder los accesos de jobs concurrentes.
+Lo usan transcription_cache y evaluation_cache.
+"""
+import json
+import random
+import time
+
+import tracing
+
+MAX_CONFLICT_RETRIES = 5
+
+class CacheIndex:
+    def __init__(self, s3, bucket, prefix, ttl_seconds, max_entries, name='cache'):
+        """name: prefijo de la métrica de conflictos ({name}_index_conflicts)"""
+        self.s3, self.bucket, self.prefix = s3, bucket, prefix
+        self.ttl, self.max_entries, self.name = ttl_seconds, max_entries, name
+        self._touched = {}  # clave -> entrada del índice modificada en esta ejecución
+
+    def entry_key(self, key):
+        return f'{self.prefix}/{key}.json'
+
+    def touch(self, key, created, now=None):
+        self._touched[key] = {'created': created, 'last_used': now or time.time()}
+
+    def _load(self):
+        """Retorna (índice, ETag) o ({}, None) si todavía no existe"""
+        try:
+            obj = self.s3.get_object(Bucket=self.bucket, Key=f'{self.prefix}/index.json')
+        except self.s3.exceptions.NoSuchKey:
+            return {}, None
+        return json.loads(obj['Body'].read()), obj['ETag']
+
+    def _write(self, index, etag):
+        """Escritura condicional del índice. Retorna False si otra ejecución lo cambió desde la lectura"""
+        condition = {'IfMatch': etag} if etag else {'IfNoneMatch': '*'}
+        try:
+            self.s3.put_object(Bucket=self.bucket, Key=f'{self.prefix}/index.json', Body=json.dumps(index),
+                               ContentType='application/json', **condition)
+        except self.s3.exceptions.ClientError as e:
+            if e.response['Error']['Code'] in ('PreconditionFailed', 'ConditionalRequestConflict'):
+                return False
+            raise
+        return True
+
+    def save(self):
+        """Fusiona los accesos de esta ejecución en el índice persistido, aplica TTL/LRU y borra lo desalojado.
+        Si otra ejecución cambió el índice, se relee y se vuelve a fusionar"""
+        if not self._touched:
+            return
+        for attempt in range(MAX_CONFLICT_RETRIES):
+            index, etag = self._load()
+            index.update(self._touched)
+            now = time.time()
+            evicted = [k for k, e in index.items() if now - e['created'] > self.ttl]
+            for k in evicted:
+                del index[k]
+            if len(index) > self.max_entries:
+                by_use = sorted(index, key=lambda k: index[k]['last_used'])
+                for k in by_use[:len(index) - self.max_entries]:
+                    del index[k]
+                    evicted.append(k)
+            if self._write(index, etag):
+                break
+            tracing.current().count(f'{self.name}_index_conflicts')
+            time.sleep(random.uniform(0, 0.1 * 2 ** attempt))
+        else:
+            return  # Los accesos quedan para el próximo save; el caché sigue sirviendo sin el índice al día
+        # Se borra recién con el índice escrito: lo borrado es exactamente lo que quedó fuera del índice vigente
+        for i in range(0, len(evicted), 1000):
+            self.s3.delete_objects(Bucket=self.bucket, Delete={'Objects': [{'Key': self.entry_key(k)} for k in evicted[i:i + 1000]], 'Quiet': True})
+        self._touched = {}
@@ -0,0 +1,66 @@
+"""Checkpoint por clip de un job de procesamiento, para retomar tras un timeout o un reintento de Lambda.
+
+Vive en jobs/{job_id}/checkpoint.json (job_store) junto al registro de estado. Por clip guarda el estado
+('running', 'done', 'failed'), el job de Transcribe y dónde está la transcripción (salida de Transcribe mientras
+corre, entrada del caché de transcripciones cuando terminó). Por job de Transcribe guarda el audio enviado y, en un lote, los
+rangos de cada clip, para poder repartir la salida al retomar. Se escribe como mucho cada MIN_INTERVAL segundos
+y siempre antes de cortar la ejecución.
+"""
+import os
+import time
+
+import transcription_cache
+
+MIN_INTERVAL = float(os.environ.get('CHECKPOINT_MIN_INTERVAL', '10'))
+
+class JobCheckpoint:
+    def __init__(self, jobs, job_id, run=0, min_interval=MIN_INTERVAL):
+        """run: agregado a la sesión que se procesa (0 = la sesión inicial); el checkpoint de otro run no se retoma"""
+        self.jobs, self.job_id, self.run, self.min_interval = jobs, job_id, run, min_interval
+        data = jobs.get_checkpoint(job_id) or {}
+        if data.get('run', 0) != run:
+            data = {}
+        self.invocation = data.get('invocation', -1) + 1
+        self.clips = data.get('clips', {})  # audio_key -> {'status', 'job', 'output', 'hash', 'vad'}
+        self.transcribe_jobs = data.get('transcribe_jobs', {})  # job_name -> {'media', 'segments'}
+        self._dirty, self._last_save = True, 0.0
+
+    def keys(self, *statuses):
+        return [k for k, clip in self.clips.items() if clip['status'] in statuses]
+
+    def running(self):
+        """{job_name: {'media', 'segments'}} de los jobs de Transcribe que quedaron en vuelo"""
+        names = {self.clips[k]['job'] for k in self.keys('running')}
+        return {name: job for name, job in self.transcribe_jobs.items() if name in names}
+
+    def mark_running(self, job_name, media_key, clips, segments=None):
+        """clips: {audio_key: {'hash', 'vad'}} que van en el job 'job_name'"""
+        self.transcribe_jobs[job_name] = {'media': media_key, 'segments': segments}
+        for audio_key, info in clips.items():
+            self.clips[audio_key] = dict(info, status='running', job=job_name, output=f'transcriptions/{job_name}.json')
+        self._changed()
+
+    def mark_done(self, audio_key, cache_hash):
+        clip = self.clips.setdefault(audio_key, {})
+        clip.update(status='done', hash=cache_hash, output=f'{transcription_cache.CACHE_PREFIX}/{cache_hash}.json')
+        self._changed()
+
+    def mark_failed(self, audio_key):
+        self.clips.setdefault(audio_key, {})['status'] = 'failed'
+        self._changed()
+
+    def _changed(self):
+        self._dirty = True
+        if time.monotonic() - self._last_save >= self.min_interval:
+            self.save()
+
+    def save(self):
+        if not self._dirty:
+            return
+        # Los jobs de Transcribe ya resueltos no hacen falta para retomar
+        live = {clip['job'] for clip in self.clips.values() if clip['status'] == 'running'}
+        self.transcribe_jobs = {name: job for name, job in self.transcribe_jobs.items() if name in live}
+        self.jobs.put_checkpoint(self.job_id, {'run': self.run, 'invocation': self.invocation, 'clips': self.clips,
+                                               'transcribe_jobs': self.transcribe_jobs})
+        self._dirty, self._last_save = False, time.monotonic()
+
@@ -0,0 +1,3 @@
+"""Código compartido por las Lambdas: clientes AWS creados al primer uso (clients), respuestas de API Gateway (api)
+e import diferido de dependencias pesadas (imports)
+"""
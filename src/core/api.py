@@ -0,0 +1,22 @@
+"""Cuerpo de las requests y respuestas JSON de API Gateway (proxy), comunes a los handlers HTTP"""
+import json
+
+class BadRequest(Exception):
+    pass
+
+def json_body(event):
+    """Body JSON de la request ({} si no viene); BadRequest si no es un objeto JSON"""
+    try:
+        body = json.loads((event or {}).get('body') or '{}')
+    except ValueError:
+        raise BadRequest('body JSON inválido')
+    if not isinstance(body, dict):
+        raise BadRequest('body JSON inválido')
+    return body
+
+def response(status, body, headers=None):
+    return {
+        'statusCode': status,
+        'headers': dict({'Access-Control-Allow-Origin': '*', 'Content-Type': 'application/json'}, **(headers or {})),
+        'body': json.dumps(body, ensure_ascii=False) if body is not None else ''
+    }
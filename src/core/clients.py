@@ -0,0 +1,54 @@
+"""Clientes boto3 del contenedor, creados recién cuando un handler los usa.
+
+Cada handler declara sus clientes a nivel de módulo con lazy('servicio'): el import no carga boto3 ni los
+modelos de servicio, y un handler que solo usa S3 nunca crea los de Transcribe o Bedrock. Todos los módulos
+comparten una instancia por servicio, con reintentos estándar, keep-alive y un pool de conexiones dimensionado
+para el fan-out en threads (descargas de a 16, ventanas de evaluación en paralelo).
+"""
+import os
+import threading
+
+S3_MAX_POOL_CONNECTIONS = int(os.environ.get('S3_MAX_POOL_CONNECTIONS', '32'))  # download_all/tetra_metadata usan 16 threads + job store
+BEDROCK_READ_TIMEOUT = int(os.environ.get('BEDROCK_READ_TIMEOUT', '300'))  # Una evaluación larga supera los 60 s por defecto
+
+# Servicio -> parámetros de botocore.config.Config
+SETTINGS = {
+    's3': {'max_pool_connections': S3_MAX_POOL_CONNECTIONS, 'retries': {'mode': 'standard', 'max_attempts': 5}},
+    'transcribe': {'max_pool_connections': 10, 'retries': {'mode': 'standard', 'max_attempts': 3}},  # LimitExceeded lo maneja transcription
+    'bedrock-runtime': {'max_pool_connections': 16, 'read_timeout': BEDROCK_READ_TIMEOUT, 'retries': {'mode': 'standard', 'max_attempts': 3}},
+    'lambda': {'max_pool_connections': 10, 'retries': {'mode': 'standard', 'max_attempts': 3}},
+}
+
+_clients = {}
+_lock = threading.Lock()
+
+def get(service):
+    client = _clients.get(service)
+    if client is None:
+        with _lock:
+            client = _clients.get(service)
+            if client is None:
+                import boto3
+                from botocore.config import Config
+                config = Config(connect_timeout=5, tcp_keepalive=True, **SETTINGS.get(service, {}))
+                client = _clients[service] = boto3.client(service, config=config)
+    return client
+
+def use(clients):
+    """Reemplaza clientes por servicio ({'s3': ..., 'bedrock-runtime': ...}); para el benchmark y pruebas locales"""
+    with _lock:
+        _clients.update(clients)
+
+class LazyClient:
+    """Se comporta como el cliente de 'service' y lo crea en el primer acceso a un atributo"""
+    def __init__(self, service):
+        self.service = service
+
+    def __getattr__(self, name):
+        return getattr(get(self.service), name)
+
+    def __repr__(self):
+        return f'<LazyClient {self.service} {"creado" if self.service in _clients else "sin crear"}>'
+
+def lazy(service):
+    return LazyClient(service)
@@ -0,0 +1,16 @@
+"""Import diferido de dependencias pesadas que solo algunos caminos de un handler usan"""
+import importlib
+
+class LazyModule:
+    """Se comporta como el módulo 'name' y lo importa en el primer acceso a un atributo"""
+    def __init__(self, name):
+        self.name = name
+        self._module = None
+
+    def __getattr__(self, attr):
+        if self._module is None:
+            self._module = importlib.import_module(self.name)
+        return getattr(self._module, attr)
+
+def lazy_module(name):
+    return LazyModule(name)
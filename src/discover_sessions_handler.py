@@ -0,0 +1,89 @@
+"""Lambda de descubrimiento de sesiones: agrupa un día de CallRefs en conversaciones y lanza un job por sesión.
+
+Con dry_run responde las sesiones encontradas (200) sin lanzar nada. Si no, como leer un día de CallRefs y lanzar
+cientos de jobs puede pasar los 29 s de API Gateway, registra un descubrimiento en estado 'discovering', se
+re-invoca en forma asíncrona y responde 202 con su id; GET /job/{id} lo muestra en 'submitted' con el job_id de
+cada sesión cuando termina.
+"""
+import json
+import os
+
+import job_store
+import sessionizer
+import tetra_metadata
+from core import api, clients
+from job_submission import new_job_id, submit_job
+
+s3 = clients.lazy('s3')
+lambda_client = clients.lazy('lambda')
+
+BUCKET = os.environ['AUDIO_BUCKET']
+PROCESS_FUNCTION = os.environ['PROCESS_FUNCTION_NAME']
+
+jobs = job_store.from_env(s3, BUCKET)
+
+def handler(event, context):
+    """Body: {"prefix": "exports/2024-12-28"} con la estructura del grabador (CallRefs.xml, Holders.xml,
+    audios/, recordings/). Cada ruta se puede sobreescribir; opcionales: gap_seconds, talk_groups, dry_run."""
+    if 'discover' in event:
+        return submit(event['discover'])
+    try:
+        body = api.json_body(event)
+        prefix = body.get('prefix', '').rstrip('/')
+        request = {
+            'callrefs': body.get('callrefs', f'{prefix}/CallRefs.xml'),
+            'holders': body.get('holders', f'{prefix}/Holders.xml'),
+            'audio_prefix': body.get('audio_prefix', f'{prefix}/audios/'),
+            'recordings_prefix': body.get('recordings_prefix', f'{prefix}/recordings/'),
+            'gap_seconds': float(body.get('gap_seconds', sessionizer.SESSION_GAP_SECONDS)),
+            'talk_groups': body.get('talk_groups'),
+        }
+
+        if not prefix and 'callrefs' not in body:
+            return api.response(400, {'error': 'prefix o callrefs requerido'})
+
+        if body.get('dry_run'):
+            return api.response(200, summary(discover(request)))
+
+        request['job_id'] = new_job_id()
+        jobs.create(request['job_id'], {'job_id': request['job_id'], 'status': 'discovering', 'request': request})
+        lambda_client.invoke(FunctionName=context.function_name, InvocationType='Event', Payload=json.dumps({'discover': request}))
+        return api.response(202, {'job_id': request['job_id'], 'status': 'discovering'})
+
+    except (api.BadRequest, ValueError) as e:
+        return api.response(400, {'error': str(e)})
+    except Exception as e:
+        return api.response(500, {'error': str(e)})
+
+def discover(request):
+    xml_keys = {'callrefs': request['callrefs'], 'holders': request['holders']}
+    metadata = tetra_metadata.load(s3, BUCKET, xml_keys)
+    return sessionizer.discover(
+        metadata,
+        sessionizer.list_keys(s3, BUCKET, request['audio_prefix'], '.wav'),
+        sessionizer.list_keys(s3, BUCKET, request['recordings_prefix'], '.xml'),
+        xml_keys,
+        gap_seconds=request['gap_seconds'],
+        talk_groups=request['talk_groups']
+    )
+
+def summary(sessions):
+    return {'num_sessions': len(sessions), 'sessions': [
+        {k: session.get(k) for k in ('job_id', 'talk_group', 'start', 'end')} | {'num_audios': len(session['audio_keys'])}
+        for session in sessions
+    ]}
+
+def submit(request):
+    """Invocación asíncrona: descubre las sesiones, lanza un job por cada una y deja el resumen en el registro"""
+    discovery_id = request['job_id']
+    sessions = []
+    try:
+        for session in discover(request):
+            session['job_id'] = submit_job(jobs, lambda_client, PROCESS_FUNCTION, session['audio_keys'], session['xml_keys'],
+                                           extra={'session': {k: session[k] for k in ('talk_group', 'start', 'end')}})
+            sessions.append(session)
+    except Exception as e:
+        # Las sesiones ya lanzadas siguen: quedan en el registro para no relanzarlas a ciegas
+        jobs.update(discovery_id, dict(summary(sessions), status='error', error=str(e)))
+        return
+    jobs.update(discovery_id, dict(summary(sessions), status='submitted'))
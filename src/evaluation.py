@@ -0,0 +1,327 @@
+"""Evaluación con Bedrock, con modo map-reduce para sesiones que exceden el presupuesto del prompt.
+
+La sesión se describe como entradas con tiempo ({'time', 'speaker', 'duration', 'text'}): líneas de transcripción
+e intervenciones. Si el prompt completo supera EVAL_WINDOW_TOKENS, la línea de tiempo se parte en ventanas que se
+evalúan en paralelo con el mismo esquema y se combinan en un paso final (promedio ponderado por tamaño de ventana).
+"""
+import json
+import math
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime
+
+import rate_limit
+import tracing
+
+CRITERIA = ('fraseologia', 'claridad', 'protocolo', 'formalidad')
+CHARS_PER_TOKEN = 3.5
+WINDOW_TOKENS = int(os.environ.get('EVAL_WINDOW_TOKENS', '12000'))
+MAX_PARALLEL = int(os.environ.get('EVAL_MAX_PARALLEL', '4'))
+MAX_LIST_ITEMS = 10
+STREAMING = os.environ.get('BEDROCK_STREAMING', 'true').lower() == 'true'
+MAX_REASKS = 1
+MAX_THROTTLE_RETRIES = int(os.environ.get('BEDROCK_THROTTLE_RETRIES', '8'))
+REQUIRED_FIELDS = CRITERIA + ('justification',)
+SESSION_REQUIRED_FIELDS = REQUIRED_FIELDS + ('analisis_por_operador',)
+
+def estimate_tokens(text):
+    return math.ceil(len(text) / CHARS_PER_TOKEN)
+
+class PartialJSON:
+    """Parser incremental y tolerante del objeto JSON de una respuesta del modelo.
+
+    Ignora el texto previo al objeto (incluidas llaves sueltas como '{score}') y lo posterior a su cierre. Cada
+    miembro de primer nivel se decodifica apenas se completa, y también los de segundo nivel (p. ej. cada operador
+    de analisis_por_operador), así una respuesta truncada conserva todo lo que alcanzó a llegar.
+    """
+    def __init__(self, on_update=None):
+        self.on_update = on_update
+        self.reset()
+
+    def reset(self):
+        """Descarta lo recibido (la respuesta se vuelve a pedir desde el principio)"""
+        self.text = ''
+        self.fields = {}
+        self.nested = {}  # clave de primer nivel -> miembros ya completos de un objeto aún abierto
+        self.done = False
+        self._pos = 0
+        self._stack = []  # '{' o '[' por nivel
+        self._keys = {}  # nivel -> clave actual
+        self._value_start = {}  # nivel -> índice donde empieza el valor del miembro actual
+        self._string_start = None
+        self._last_string = None
+        self._in_string = self._escape = False
+
+    def feed(self, chunk):
+        if self.done:
+            return
+        self.text += chunk
+        if not self._stack and self._pos == 0:
+            start = self.text.find('{')
+            if start < 0:
+                return
+            self.text, self._pos = self.text[start:], 0
+        changed = False
+        while self._pos < len(self.text) and not self.done:
+            changed |= self._step(self.text[self._pos], self._pos)
+            self._pos += 1
+        if changed and self.on_update:
+            self.on_update(self.partial())
+
+    def _step(self, c, i):
+        if self._in_string:
+            if self._escape:
+                self._escape = False
+            elif c == '\\':
+                self._escape = True
+            elif c == '"':
+                self._in_string = False
+                self._last_string = (self._string_start, i + 1)
+            return False
+        depth = len(self._stack)
+        if depth == 1 and 1 not in self._keys and not c.isspace() and c not in '"}' and not (c == ':' and self._last_string):
+            self._skip()
+            return False
+        if c == '"':
+            self._in_string, self._string_start = True, i
+        elif c in '{[':
+            self._stack.append(c)
+        elif c == ':' and self._stack and self._stack[-1] == '{' and self._last_string:
+            self._keys[depth] = json.loads(self.text[slice(*self._last_string)])
+            self._value_start[depth] = i + 1
+        elif c in ',}]':
+            emitted = False
+            if depth in self._value_start:
+                emitted = self._member(depth, self.text[self._value_start.pop(depth):i])
+            if c in '}]' and self._stack:
+                self._stack.pop()
+                self.done = not self._stack
+            return emitted
+        return False
+
+    def _skip(self):
+        """La '{' inicial era una llave suelta del texto previo (p. ej. 'formato {score}'): el objeto empieza en la próxima"""
+        start = self.text.find('{', 1)
+        rest = self.text[start:] if start > 0 else ''
+        self.reset()
+        self.text, self._pos = rest, -1  # feed avanza a 0
+
+    def _member(self, depth, raw):
+        try:
+            value = json.loads(raw)
+        except ValueError:
+            return False
+        if depth == 1:
+            self.fields[self._keys[1]] = value
+            self.nested.pop(self._keys[1], None)
+        elif depth == 2 and self._stack[0] == '{':
+            self.nested.setdefault(self._keys[1], {})[self._keys[2]] = value
+        else:
+            return False
+        return True
+
+    def partial(self):
+        """Campos completos más los objetos a medio llegar con los miembros que ya están"""
+        return dict({k: dict(v) for k, v in self.nested.items() if k not in self.fields}, **self.fields)
+
+def _throttled(error):
+    """ThrottlingException al empezar la llamada o el mismo error como evento en medio del stream (EventStreamError,
+    con el código en minúscula)"""
+    return error.response.get('Error', {}).get('Code', '').lower() == 'throttlingexception'
+
+def _call(bedrock, operation, tokens, read, **kwargs):
+    """read(bedrock.<operation>(**kwargs)) dentro del límite compartido de tokens por minuto. Bedrock descuenta
+    de la cuota la entrada más max_tokens al empezar; el throttling (al empezar o mientras read consume el stream)
+    baja la tasa compartida y se reintenta la llamada completa"""
+    limiter = rate_limit.get('bedrock')
+    for attempt in range(MAX_THROTTLE_RETRIES + 1):
+        limiter.acquire(tokens)
+        try:
+            return read(getattr(bedrock, operation)(**kwargs))
+        except bedrock.exceptions.ClientError as e:
+            if not _throttled(e):
+                raise
+            limiter.throttled()
+            if attempt == MAX_THROTTLE_RETRIES:
+                raise
+
+def request_body(messages, max_tokens):
+    """Cuerpo de InvokeModel (también el modelInput de cada registro de inferencia por lotes)"""
+    return {"anthropic_version": "bedrock-2023-05-31", "max_tokens": max_tokens, "messages": messages}
+
+def _request(bedrock, model_id, messages, max_tokens, parser):
+    """Una llamada a Bedrock que alimenta 'parser'. Retorna (texto, usage)"""
+    body = json.dumps(request_body(messages, max_tokens))
+    reserved = estimate_tokens(body) + max_tokens
+    if not STREAMING:
+        result = _call(bedrock, 'invoke_model', reserved, lambda response: json.loads(response['body'].read()), modelId=model_id, body=body)
+        text = result['content'][0]['text']
+        parser.feed(text)
+        _refund(reserved, result.get('usage', {}))
+        return text, result.get('usage', {})
+
+    def read_stream(response):
+        parser.reset()  # Un reintento por throttling a mitad del stream vuelve a empezar la respuesta
+        text, usage = '', {}
+        for event in response['body']:
+            chunk = json.loads(event['chunk']['bytes'])
+            if chunk['type'] == 'message_start':
+                usage.update(chunk['message'].get('usage', {}))
+            elif chunk['type'] == 'content_block_delta' and chunk['delta'].get('type') == 'text_delta':
+                text += chunk['delta']['text']
+                parser.feed(chunk['delta']['text'])
+            elif chunk['type'] == 'message_delta':
+                usage.update(chunk.get('usage', {}))
+        return text, usage
+
+    text, usage = _call(bedrock, 'invoke_model_with_response_stream', reserved, read_stream, modelId=model_id, body=body)
+    _refund(reserved, usage)
+    return text, usage
+
+def _refund(reserved, usage):
+    """Lo reservado que la respuesta no usó vuelve a la reserva local del limitador"""
+    if 'input_tokens' in usage:
+        rate_limit.get('bedrock').refund(reserved - usage['input_tokens'] - usage.get('output_tokens', 0))
+
+def _valid(result, field):
+    if field in CRITERIA or field == 'score':
+        try:
+            float(result[field])
+        except (KeyError, TypeError, ValueError):
+            return False
+        return True
+    return field in result
+
+def repair(result):
+    """Completa lo que se puede derivar sin volver a preguntar (score y listas vacías)"""
+    if not _valid(result, 'score') and all(_valid(result, c) for c in CRITERIA):
+        result['score'] = round(sum(float(result[c]) for c in CRITERIA) / len(CRITERIA), 1)
+    result.setdefault('errores_detectados', [])
+    result.setdefault('recommendations', [])
+    return result
+
+def parse(text, required=REQUIRED_FIELDS):
+    """Evaluación a partir del texto completo de una respuesta. Retorna (evaluación, campos de 'required' que faltan)"""
+    parser = PartialJSON()
+    parser.feed(text)
+    result = repair(parser.partial())
+    return result, [f for f in required if not _valid(result, f)]
+
+def invoke(bedrock, model_id, prompt, max_tokens=2048, on_partial=None, required=REQUIRED_FIELDS):
+    """Invoca el modelo (en streaming) y retorna el JSON de evaluación.
+
+    Tolera texto antes o después del JSON y respuestas truncadas: on_partial(campos) recibe lo que va llegando,
+    lo derivable se repara y, si aún faltan campos de 'required', se piden solo esos en una segunda llamada.
+    """
+    tracer = tracing.current()
+    started, first_field = time.perf_counter(), []
+
+    def on_update(partial):
+        if not first_field:
+            first_field.append(True)
+            tracer.add_span('bedrock_first_field', (time.perf_counter() - started) * 1000)
+        if on_partial:
+            on_partial(partial)
+
+    messages = [{"role": "user", "content": prompt}]
+    result = {}
+    for attempt in range(MAX_REASKS + 1):
+        parser = PartialJSON(on_update)
+        with tracer.span('bedrock_invoke'):
+            text, usage = _request(bedrock, model_id, messages, max_tokens, parser)
+        tracer.count('bedrock_calls')
+        tracer.count('bedrock_input_tokens', usage.get('input_tokens', 0))
+        tracer.count('bedrock_output_tokens', usage.get('output_tokens', 0))
+        result.update(parser.partial())
+        missing = [f for f in required if not _valid(repair(result), f)]
+        if not missing:
+            return result
+        tracer.count('bedrock_reasks')
+        messages = messages[:1] + [
+            {"role": "assistant", "content": text.strip() or "{}"},
+            {"role": "user", "content": f"Tu respuesta quedó incompleta. Responde ÚNICAMENTE con un objeto JSON que contenga solo estas claves, con el formato pedido: {', '.join(missing)}"}
+        ]
+    raise ValueError(f"Evaluación incompleta, faltan: {', '.join(missing)}")
+
+def split_windows(entries, budget):
+    """Parte las entradas (ordenadas por tiempo) en ventanas consecutivas de hasta 'budget' tokens estimados
+    ('tokens' de la entrada si el prompt la serializa distinto de 'text')"""
+    windows, current, used = [], [], 0
+    for entry in entries:
+        tokens = entry['tokens'] if 'tokens' in entry else estimate_tokens(entry['text'])
+        if current and used + tokens > budget:
+            windows.append(current)
+            current, used = [], 0
+        current.append(entry)
+        used += tokens
+    if current:
+        windows.append(current)
+    return windows
+
+def _time(entry):
+    return entry.get('time') or datetime.max
+
+def _dedupe(items):
+    return list(dict.fromkeys(item for item in items if item))[:MAX_LIST_ITEMS]
+
+def reduce_evaluations(evaluations, weights):
+    """Combina evaluaciones de ventanas en el esquema de una evaluación de sesión"""
+    total = sum(weights) or 1
+    merged = {c: round(sum(float(e.get(c, 0)) * w for e, w in zip(evaluations, weights)) / total, 1) for c in CRITERIA}
+    merged['score'] = round(sum(merged[c] for c in CRITERIA) / len(CRITERIA), 1)
+    merged['justification'] = ' '.join(f"[Tramo {i + 1}] {e.get('justification', '')}".strip() for i, e in enumerate(evaluations))
+    merged['errores_detectados'] = _dedupe(err for e in evaluations for err in e.get('errores_detectados', []))
+    merged['recommendations'] = _dedupe(rec for e in evaluations for rec in e.get('recommendations', []))
+
+    operators = {}
+    for e, w in zip(evaluations, weights):
+        for name, data in (e.get('analisis_por_operador') or {}).items():
+            op = operators.setdefault(name, {'total': 0.0, 'weight': 0.0, 'observaciones': []})
+            op['total'] += float(data.get('score', 0)) * w
+            op['weight'] += w
+            op['observaciones'].append(data.get('observacion'))
+    merged['analisis_por_operador'] = {
+        name: {'score': round(op['total'] / op['weight'], 1) if op['weight'] else 0, 'observacion': ' / '.join(_dedupe(op['observaciones']))}
+        for name, op in operators.items()
+    }
+    return merged
+
+def session_requests(build_prompt, transcript_entries, intervention_entries, window_tokens=WINDOW_TOKENS):
+    """Prompts con que se evalúa la sesión: [(prompt, None)] si entra en el presupuesto; si no, [(prompt, peso)]
+    por ventana, a combinar con reduce_evaluations"""
+    prompt = build_prompt(transcript_entries, intervention_entries)
+    if estimate_tokens(prompt) <= window_tokens:
+        return [(prompt, None)]
+
+    overhead = estimate_tokens(build_prompt([], []))
+    # Transcripción e intervenciones comparten el presupuesto de cada ventana
+    timeline = sorted(transcript_entries + intervention_entries, key=_time)
+    windows = split_windows(timeline, max(window_tokens - overhead, 1))
+    transcript_ids = {id(e) for e in transcript_entries}
+    parts = [([e for e in w if id(e) in transcript_ids], [e for e in w if id(e) not in transcript_ids]) for w in windows]
+    parts = [p for p in parts if p[0]]  # Una ventana sin transcripción no aporta a la evaluación
+    return [(build_prompt(*p), sum(estimate_tokens(e['text']) for e in p[0])) for p in parts]
+
+def evaluate_session(bedrock, model_id, build_prompt, transcript_entries, intervention_entries, max_tokens=2048,
+                     window_tokens=WINDOW_TOKENS, max_parallel=MAX_PARALLEL, on_partial=None):
+    """Evalúa la sesión con una sola llamada si el prompt entra en el presupuesto; si no, por ventanas en paralelo.
+
+    build_prompt(transcript_entries, intervention_entries) arma el prompt de una sesión o de una ventana.
+    on_partial(evaluación parcial) recibe los campos a medida que llegan (o la combinación de las ventanas terminadas).
+    """
+    requests = session_requests(build_prompt, transcript_entries, intervention_entries, window_tokens)
+    if requests[0][1] is None:
+        return invoke(bedrock, model_id, requests[0][0], max_tokens, on_partial=on_partial, required=SESSION_REQUIRED_FIELDS)
+
+    weights = [weight for _, weight in requests]
+    evaluations = [None] * len(requests)
+    with ThreadPoolExecutor(max_workers=max(1, min(max_parallel, len(requests)))) as pool:
+        futures = {pool.submit(invoke, bedrock, model_id, prompt, max_tokens, required=SESSION_REQUIRED_FIELDS): i
+                   for i, (prompt, _) in enumerate(requests)}
+        for future in as_completed(futures):
+            evaluations[futures[future]] = future.result()
+            if on_partial:
+                done = [i for i, e in enumerate(evaluations) if e is not None]
+                on_partial(reduce_evaluations([evaluations[i] for i in done], [weights[i] for i in done]))
+    return reduce_evaluations(evaluations, weights)
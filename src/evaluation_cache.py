@@ -0,0 +1,94 @@
+"""Memoización de evaluaciones de Bedrock por modelo, versión del prompt y transcripción normalizada.
+
+Dos niveles: un LRU en memoria del contenedor (acotado y con TTL) y, si se provee S3, entradas persistidas
+en cache/evaluations/{hash}.json para compartirlas entre contenedores. Las persistidas se acotan con un índice
+(cache_index, como las transcripciones): cada put lo actualiza y borra lo vencido y lo que excede MAX_PERSISTED.
+"""
+import hashlib
+import json
+import os
+import re
+import time
+from collections import OrderedDict
+
+import cache_index
+import evaluation
+import lexicon
+
+CACHE_PREFIX = 'cache/evaluations'
+MAX_ENTRIES = int(os.environ.get('EVAL_CACHE_MAX_ENTRIES', '256'))  # En memoria
+MAX_PERSISTED = int(os.environ.get('EVAL_CACHE_MAX_PERSISTED', '20000'))  # En S3
+TTL_SECONDS = float(os.environ.get('EVAL_CACHE_TTL_SECONDS', str(7 * 86400)))
+
+def prompt_version(template):
+    return hashlib.sha256(template.encode('utf-8')).hexdigest()[:12]
+
+def normalize_transcript(transcript):
+    """Colapsa espacios y líneas vacías para que diferencias triviales no invaliden la entrada"""
+    return '\n'.join(re.sub(r'\s+', ' ', line).strip() for line in transcript.splitlines() if line.strip())
+
+def cache_key(model_id, template, transcript, metadata=None):
+    payload = json.dumps({
+        'model': model_id,
+        'prompt': prompt_version(template),
+        'transcript': normalize_transcript(transcript),
+        'metadata': metadata or {},
+    }, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+def session_key(model_id, template, transcript_entries, intervention_entries, total_duration):
+    """Clave de la evaluación de una sesión completa (process_job y bulk_reprocess): transcripción, metadatos de
+    las intervenciones y todo lo que cambia el resultado (ventanas, léxico)"""
+    return cache_key(model_id, template.fingerprint, "\n".join(e['text'] for e in transcript_entries), {
+        'duracion_total': total_duration, 'participantes': sorted({e['speaker'] for e in intervention_entries}),
+        'metadatos': [e['text'] for e in intervention_entries], 'window_tokens': evaluation.WINDOW_TOKENS, 'lexicon': lexicon.FINGERPRINT
+    })
+
+class EvaluationCache:
+    def __init__(self, s3=None, bucket=None, max_entries=MAX_ENTRIES, ttl_seconds=TTL_SECONDS, prefix=CACHE_PREFIX,
+                 max_persisted=MAX_PERSISTED):
+        self.s3 = s3
+        self.bucket = bucket
+        self.max_entries = max_entries
+        self.ttl = ttl_seconds
+        self.prefix = prefix
+        self._memory = OrderedDict()  # key -> (created, evaluation)
+        self.index = cache_index.CacheIndex(s3, bucket, prefix, ttl_seconds, max_persisted, name='evaluation_cache') if s3 else None
+
+    def _remember(self, key, created, evaluation):
+        self._memory[key] = (created, evaluation)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+
+    def get(self, key):
+        now = time.time()
+        entry = self._memory.get(key)
+        if entry and now - entry[0] <= self.ttl:
+            self._memory.move_to_end(key)
+            return entry[1]
+        self._memory.pop(key, None)
+        if not self.s3:
+            return None
+        try:
+            stored = json.loads(self.s3.get_object(Bucket=self.bucket, Key=self.index.entry_key(key))['Body'].read())
+        except self.s3.exceptions.NoSuchKey:
+            return None
+        if now - stored['created'] > self.ttl:
+            # Vencida: se borra al encontrarla (la reemplaza el put de la evaluación nueva)
+            self.s3.delete_object(Bucket=self.bucket, Key=self.index.entry_key(key))
+            return None
+        self.index.touch(key, stored['created'], now)
+        self._remember(key, stored['created'], stored['evaluation'])
+        return stored['evaluation']
+
+    def put(self, key, evaluation):
+        now = time.time()
+        self._remember(key, now, evaluation)
+        if self.s3:
+            self.s3.put_object(Bucket=self.bucket, Key=self.index.entry_key(key),
+                               Body=json.dumps({'created': now, 'evaluation': evaluation}, ensure_ascii=False),
+                               ContentType='application/json')
+            # Una evaluación cuesta una llamada a Bedrock: el índice se actualiza en cada put (con los accesos acumulados)
+            self.index.touch(key, now, now)
+            self.index.save()
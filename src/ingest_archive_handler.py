@@ -0,0 +1,70 @@
+"""Lambda de ingesta de un export comprimido: extrae el zip/tar subido a S3 y opcionalmente lanza el análisis.
+
+La extracción de un export real tarda más que los 29 s de API Gateway, así que POST /ingest-archive solo registra
+un job en estado 'extracting', se re-invoca en forma asíncrona y responde 202 con el job_id. El frontend lo sigue
+con GET /job/{job_id}: termina en 'extracted' (con audio_keys y xml_keys) o, con start, pasa a 'pending' con el
+mismo job_id y se lanza process_job.
+"""
+import json
+import os
+
+import archive_ingest
+import job_store
+from core import api, clients
+from job_submission import dispatch, new_job_id
+
+s3 = clients.lazy('s3')
+lambda_client = clients.lazy('lambda')
+
+BUCKET = os.environ['AUDIO_BUCKET']
+PROCESS_FUNCTION = os.environ['PROCESS_FUNCTION_NAME']
+MAX_SKIPPED_LISTED = 100
+
+jobs = job_store.from_env(s3, BUCKET)
+
+def handler(event, context):
+    """Body: {"archive_key": "archives/<id>/export.zip"}; opcionales: prefix (destino), start (lanzar el job)"""
+    if 'ingest' in event:
+        return extract(event['ingest'])
+    try:
+        body = api.json_body(event)
+        archive_key = body.get('archive_key', '')
+        
+        if not archive_ingest.is_archive(archive_key):
+            return api.response(400, {'error': 'archive_key debe ser .zip, .tar, .tar.gz o .tgz'})
+        
+        prefix = body.get('prefix', archive_ingest.default_prefix(archive_key)).rstrip('/')
+        job_id = new_job_id()
+        jobs.create(job_id, {'job_id': job_id, 'status': 'extracting', 'archive_key': archive_key, 'prefix': prefix, 'progress': 0})
+        lambda_client.invoke(
+            FunctionName=context.function_name,
+            InvocationType='Event',
+            Payload=json.dumps({'ingest': {'job_id': job_id, 'archive_key': archive_key, 'prefix': prefix, 'start': bool(body.get('start'))}})
+        )
+        return api.response(202, {'job_id': job_id, 'status': 'extracting', 'prefix': prefix})
+        
+    except api.BadRequest as e:
+        return api.response(400, {'error': str(e)})
+    except Exception as e:
+        return api.response(500, {'error': str(e)})
+
+def extract(request):
+    """Invocación asíncrona: extrae el archivo y deja el resultado en el registro del job"""
+    job_id = request['job_id']
+    try:
+        extracted = archive_ingest.ingest(s3, BUCKET, request['archive_key'], request['prefix'])
+    except Exception as e:
+        jobs.update(job_id, {'status': 'error', 'error': f'No se pudo extraer el archivo: {e}'})
+        return
+    
+    skipped = extracted['skipped'][:MAX_SKIPPED_LISTED]
+    if not extracted['audio_keys']:
+        jobs.update(job_id, {'status': 'error', 'error': 'El archivo no contiene WAV', 'skipped': skipped})
+        return
+    
+    updates = {'audio_keys': extracted['audio_keys'], 'xml_keys': extracted['xml_keys'], 'skipped': skipped}
+    if not request.get('start'):
+        jobs.update(job_id, dict(updates, status='extracted', progress=100))
+        return
+    jobs.update(job_id, dict(updates, status='pending', progress=0))
+    dispatch(lambda_client, PROCESS_FUNCTION, job_id, extracted['audio_keys'], extracted['xml_keys'])
@@ -1,30 +1,52 @@
-"""Lambda para consultar estado del job"""
-import json
-import boto3
+"""Lambda para consultar estado del job
+
+Soporta GET condicional (ETag / If-None-Match -> 304 si el registro no cambió) y ?cursor=N para recibir solo
+las transcripciones de clips publicadas desde la última consulta ('next_cursor' es el cursor siguiente).
+"""
+import hashlib
 import os
 
-s3 = boto3.client('s3')
+import job_store
+from core import api, clients
+
+s3 = clients.lazy('s3')
 BUCKET = os.environ['AUDIO_BUCKET']
 
+jobs = job_store.from_env(s3, BUCKET)
+
 def handler(event, context):
     try:
-        job_id = event.get('pathParameters', {}).get('job_id')
+        job_id = (event.get('pathParameters') or {}).get('job_id')
         if not job_id:
             return response(400, {'error': 'job_id requerido'})
         
-        try:
-            obj = s3.get_object(Bucket=BUCKET, Key=f'jobs/{job_id}.json')
-            job_data = json.loads(obj['Body'].read().decode('utf-8'))
-            return response(200, job_data)
-        except s3.exceptions.NoSuchKey:
+        cursor = (event.get('queryStringParameters') or {}).get('cursor')
+        if cursor is not None and not cursor.isdigit():
+            return response(400, {'error': 'cursor inválido'})
+        
+        job_data, version = jobs.get_versioned(job_id)
+        if job_data is None:
             return response(404, {'error': 'Job no encontrado'})
-            
+        
+        # La respuesta depende solo de la versión del registro y del cursor
+        etag = '"' + hashlib.md5(f'{version}:{cursor}'.encode('utf-8')).hexdigest() + '"'
+        headers = {k.lower(): v for k, v in (event.get('headers') or {}).items()}
+        if headers.get('if-none-match') == etag:
+            return response(304, None, etag)
+        
+        if cursor is not None:
+            pages = job_data.get('clip_pages', 0)
+            job_data['clips'] = jobs.get_clips(job_id, min(int(cursor), pages), pages)
+            job_data['next_cursor'] = str(pages)
+        
+        # El resultado completo se guarda aparte y solo se adjunta cuando el job terminó
+        if job_data.get('status') == 'done' and 'result' not in job_data:
+            job_data['result'] = jobs.get_result(job_id)
+        return response(200, job_data, etag)
+        
     except Exception as e:
         return response(500, {'error': str(e)})
 
-def response(status, body):
-    return {
-        'statusCode': status,
-        'headers': {'Access-Control-Allow-Origin': '*', 'Content-Type': 'application/json'},
-        'body': json.dumps(body, ensure_ascii=False)
-    }
+def response(status, body, etag=None):
+    headers = {'ETag': etag, 'Cache-Control': 'no-cache', 'Access-Control-Expose-Headers': 'ETag'} if etag else None
+    return api.response(status, body, headers)
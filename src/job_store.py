@@ -0,0 +1,277 @@
+"""Almacenamiento del estado de los jobs.
+
+El registro de estado (jobs/{job_id}.json) es chico y se actualiza con escrituras condicionales sobre la última
+versión conocida, sin releerlo en cada tick. Las actualizaciones de progreso se acumulan y se escriben como mucho
+cada PROGRESS_MIN_INTERVAL segundos; los cambios de 'status' se escriben siempre. El resultado completo
+(transcripción + evaluación) va aparte en jobs/{job_id}/result.json y el estado acumulado de la sesión, para
+agregarle clips, en jobs/{job_id}/session.json.
+
+Las transcripciones de cada clip se publican a medida que terminan en páginas inmutables
+jobs/{job_id}/clips/{n}.json, una por escritura del registro; 'clip_pages' en el registro sirve de cursor. Cada
+página se crea con escritura condicional (no debe existir), así un escritor con el registro desactualizado no pisa
+una página que otro ya publicó.
+
+Backends: S3 (producción), memoria y archivos locales (pruebas offline). Se elige con JOB_STORE=s3|memory|file.
+"""
+import abc
+import fcntl
+import hashlib
+import json
+import os
+import random
+import threading
+import time
+
+import tracing
+
+PROGRESS_MIN_INTERVAL = float(os.environ.get('JOB_PROGRESS_MIN_INTERVAL', '2'))
+MAX_CONFLICT_RETRIES = 5
+
+class VersionConflict(Exception):
+    """El registro cambió desde la última versión conocida"""
+
+def status_key(job_id):
+    return f'jobs/{job_id}.json'
+
+def result_key(job_id):
+    return f'jobs/{job_id}/result.json'
+
+def checkpoint_key(job_id):
+    return f'jobs/{job_id}/checkpoint.json'
+
+def session_key(job_id):
+    return f'jobs/{job_id}/session.json'
+
+def clips_key(job_id, page):
+    return f'jobs/{job_id}/clips/{page:05d}.json'
+
+class JobStore(abc.ABC):
+    def __init__(self, min_interval=PROGRESS_MIN_INTERVAL):
+        self.min_interval = min_interval
+        self._known = {}  # job_id -> (registro, versión) según la última lectura/escritura propia
+        self._pending = {}  # job_id -> actualizaciones aún no escritas
+        self._clips = {}  # job_id -> clips publicados aún no escritos
+        self._last_write = {}
+        self._lock = threading.RLock()
+
+    # Primitivas de cada backend
+    @abc.abstractmethod
+    def _read(self, key):
+        """Retorna (data, versión) o (None, None) si no existe"""
+
+    @abc.abstractmethod
+    def _write(self, key, data, version):
+        """Escribe solo si la versión actual es 'version' (None = no debe existir). Retorna la nueva versión.
+        VersionConflict si no"""
+
+    @abc.abstractmethod
+    def _put(self, key, data):
+        """Escritura incondicional"""
+
+    def create(self, job_id, record):
+        with self._lock:
+            self._known[job_id] = (record, self._write(status_key(job_id), record, None))
+            self._last_write[job_id] = time.monotonic()
+
+    def get(self, job_id):
+        return self._read(status_key(job_id))[0]
+
+    def get_checkpoint(self, job_id):
+        return self._read(checkpoint_key(job_id))[0]
+
+    def put_checkpoint(self, job_id, checkpoint):
+        with tracing.current().span('job_checkpoint_write'):
+            self._put(checkpoint_key(job_id), checkpoint)
+
+    def get_session(self, job_id):
+        return self._read(session_key(job_id))[0]
+
+    def put_session(self, job_id, session):
+        with tracing.current().span('job_session_write'):
+            self._put(session_key(job_id), session)
+
+    def claim(self, job_id, statuses, updates):
+        """Aplica updates(registro) solo si el status actual está en 'statuses' y nadie escribió el registro
+        entremedio (escritura condicional, sin reintento). Retorna el registro nuevo o None"""
+        with self._lock:
+            record, version = self._read(status_key(job_id))
+            if record is None or record.get('status') not in statuses:
+                return None
+            merged = dict(record, **updates(record))
+            try:
+                version = self._write(status_key(job_id), merged, version)
+            except VersionConflict:
+                return None
+            self._known[job_id] = (merged, version)
+            self._last_write[job_id] = time.monotonic()
+            return merged
+
+    def get_versioned(self, job_id):
+        """Retorna (registro, versión) o (None, None)"""
+        return self._read(status_key(job_id))
+
+    def get_clips(self, job_id, start_page, end_page):
+        """Clips publicados en las páginas [start_page, end_page)"""
+        clips = []
+        for page in range(start_page, end_page):
+            clips.extend(self._read(clips_key(job_id, page))[0] or [])
+        return clips
+
+    def get_result(self, job_id):
+        return self._read(result_key(job_id))[0]
+
+    def put_result(self, job_id, result):
+        with tracing.current().span('job_result_write'):
+            self._put(result_key(job_id), result)
+
+    def update(self, job_id, updates, force=False):
+        """Acumula 'updates' y escribe si hay cambio de status, si force o si pasó el intervalo mínimo"""
+        with self._lock:
+            self._pending.setdefault(job_id, {}).update(updates)
+            elapsed = time.monotonic() - self._last_write.get(job_id, 0)
+            if force or 'status' in updates or elapsed >= self.min_interval:
+                self._flush(job_id)
+
+    def publish_clips(self, job_id, clips):
+        """Agrega clips terminados; se escriben con la próxima escritura del registro"""
+        with self._lock:
+            self._clips.setdefault(job_id, []).extend(clips)
+            self.update(job_id, {})
+
+    def flush(self, job_id=None):
+        with self._lock:
+            for pending_id in ([job_id] if job_id else list(set(self._pending) | set(self._clips))):
+                self._flush(pending_id)
+
+    def _flush(self, job_id):
+        pending = self._pending.pop(job_id, None)
+        clips = self._clips.pop(job_id, None)
+        if not pending and not clips:
+            return
+        pending = pending or {}
+        record, version = self._known.get(job_id, (None, None))
+        written = None  # Página creada en un intento anterior: es nuestra aunque el registro no llegó a escribirse
+        for attempt in range(MAX_CONFLICT_RETRIES):
+            if record is None:
+                record, version = self._read(status_key(job_id))
+            merged = dict(record or {'job_id': job_id})
+            merged.update(pending)
+            if clips:
+                # La página se crea antes que el registro que la referencia y solo si no existe
+                page = merged.get('clip_pages', 0)
+                if page != written:
+                    try:
+                        self._write(clips_key(job_id, page), clips, None)
+                    except VersionConflict:
+                        tracing.current().count('job_state_conflicts')
+                        # Otro escritor ya publicó esa página: el registro conocido estaba viejo o el suyo está por llegar
+                        record = None
+                        time.sleep(random.uniform(0, 0.05 * (attempt + 1)))
+                        continue
+                    written = page
+                merged.update(clip_pages=page + 1, clips_published=merged.get('clips_published', 0) + len(clips))
+            try:
+                with tracing.current().span('job_state_write'):
+                    version = self._write(status_key(job_id), merged, version)
+            except VersionConflict:
+                tracing.current().count('job_state_conflicts')
+                record = None  # Otro escritor ganó: releer y volver a aplicar lo pendiente
+                continue
+            self._known[job_id] = (merged, version)
+            self._last_write[job_id] = time.monotonic()
+            return
+        raise VersionConflict(job_id)
+
+class S3JobStore(JobStore):
+    def __init__(self, s3, bucket, **kwargs):
+        super().__init__(**kwargs)
+        self.s3 = s3
+        self.bucket = bucket
+
+    def _read(self, key):
+        try:
+            obj = self.s3.get_object(Bucket=self.bucket, Key=key)
+        except self.s3.exceptions.NoSuchKey:
+            return None, None
+        return json.loads(obj['Body'].read().decode('utf-8')), obj['ETag']
+
+    def _write(self, key, data, version):
+        condition = {'IfMatch': version} if version else {'IfNoneMatch': '*'}
+        try:
+            resp = self.s3.put_object(Bucket=self.bucket, Key=key, Body=json.dumps(data, ensure_ascii=False),
+                                      ContentType='application/json', **condition)
+        except self.s3.exceptions.ClientError as e:
+            if e.response['Error']['Code'] in ('PreconditionFailed', 'ConditionalRequestConflict'):
+                raise VersionConflict(key)
+            raise
+        return resp['ETag']
+
+    def _put(self, key, data):
+        self.s3.put_object(Bucket=self.bucket, Key=key, Body=json.dumps(data, ensure_ascii=False), ContentType='application/json')
+
+class MemoryJobStore(JobStore):
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.objects = {}  # key -> (json, versión)
+
+    def _read(self, key):
+        if key not in self.objects:
+            return None, None
+        body, version = self.objects[key]
+        return json.loads(body), version
+
+    def _write(self, key, data, version):
+        current = self.objects.get(key, (None, None))[1]
+        if current != version:
+            raise VersionConflict(key)
+        self.objects[key] = (json.dumps(data, ensure_ascii=False), (current or 0) + 1)
+        return self.objects[key][1]
+
+    def _put(self, key, data):
+        current = self.objects.get(key, (None, 0))[1]
+        self.objects[key] = (json.dumps(data, ensure_ascii=False), current + 1)
+
+class LocalFileJobStore(JobStore):
+    """Un archivo JSON por clave bajo base_dir; la versión es el hash del contenido"""
+    def __init__(self, base_dir, **kwargs):
+        super().__init__(**kwargs)
+        self.base_dir = base_dir
+
+    def _path(self, key):
+        path = os.path.join(self.base_dir, key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        return path
+
+    def _read(self, key):
+        try:
+            with open(self._path(key), 'rb') as f:
+                body = f.read()
+        except FileNotFoundError:
+            return None, None
+        return json.loads(body), hashlib.sha1(body).hexdigest()
+
+    def _write(self, key, data, version):
+        with open(self._path(key) + '.lock', 'w') as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            if self._read(key)[1] != version:
+                raise VersionConflict(key)
+            body = json.dumps(data, ensure_ascii=False).encode('utf-8')
+            self._put_bytes(key, body)
+            return hashlib.sha1(body).hexdigest()
+
+    def _put_bytes(self, key, body):
+        tmp = self._path(key) + '.tmp'
+        with open(tmp, 'wb') as f:
+            f.write(body)
+        os.replace(tmp, self._path(key))
+
+    def _put(self, key, data):
+        self._put_bytes(key, json.dumps(data, ensure_ascii=False).encode('utf-8'))
+
+def from_env(s3=None, bucket=None):
+    backend = os.environ.get('JOB_STORE', 's3')
+    if backend == 'memory':
+        return MemoryJobStore()
+    if backend == 'file':
+        return LocalFileJobStore(os.environ.get('JOB_STORE_DIR', '/tmp/emova-jobs'))
+    return S3JobStore(s3, bucket)
@@ -0,0 +1,60 @@
+"""Alta de jobs de análisis: registra el estado inicial e invoca la Lambda de procesamiento de forma asíncrona"""
+import json
+import uuid
+
+def new_job_id():
+    return str(uuid.uuid4())[:8]
+
+def dispatch(lambda_client, function_name, job_id, audio_keys, xml_keys):
+    """Dispara el procesamiento de un job ya registrado"""
+    lambda_client.invoke(
+        FunctionName=function_name,
+        InvocationType='Event',  # Async
+        Payload=json.dumps({'job_id': job_id, 'audio_keys': audio_keys, 'xml_keys': xml_keys})
+    )
+
+def submit_job(jobs, lambda_client, function_name, audio_keys, xml_keys, extra=None):
+    """Crea el job y dispara el procesamiento. Retorna el job_id"""
+    job_id = new_job_id()
+    jobs.create(job_id, dict({
+        'job_id': job_id,
+        'status': 'pending',
+        'audio_keys': audio_keys,
+        'xml_keys': xml_keys,
+        'progress': 0
+    }, **(extra or {})))
+    dispatch(lambda_client, function_name, job_id, audio_keys, xml_keys)
+    return job_id
+
+def append_clips(jobs, lambda_client, function_name, job_id, audio_keys, xml_keys):
+    """Agrega clips a la sesión de un job terminado y dispara su procesamiento incremental (solo los clips nuevos).
+
+    xml_keys puede traer los recordings de los clips nuevos y, si cambiaron, CallRefs/Holders. Retorna
+    (registro, clips nuevos); registro None si el job no existe o no está terminado (otro agregado en curso).
+    """
+    new_keys = []
+
+    def updates(record):
+        known = set(record.get('audio_keys', []))
+        new_keys[:] = [k for k in dict.fromkeys(audio_keys) if k not in known]
+        base = record.get('xml_keys', {})
+        return {
+            'status': 'pending' if new_keys else record['status'],
+            'progress': 0 if new_keys else record.get('progress', 100),
+            'appends': record.get('appends', 0) + bool(new_keys),
+            'audio_keys': record.get('audio_keys', []) + new_keys,
+            'xml_keys': dict(base, **{k: xml_keys[k] for k in ('holders', 'callrefs') if xml_keys.get(k)},
+                             recordings=base.get('recordings', []) + xml_keys.get('recordings', []))
+        }
+
+    record = jobs.claim(job_id, ('done',), updates)
+    if record is None or not new_keys:
+        return record, []
+    lambda_client.invoke(
+        FunctionName=function_name,
+        InvocationType='Event',
+        Payload=json.dumps({'job_id': job_id, 'audio_keys': new_keys, 'append': record['appends'], 'xml_keys': {
+            'holders': record['xml_keys'].get('holders'), 'callrefs': record['xml_keys'].get('callrefs'), 'recordings': xml_keys.get('recordings', [])
+        }})
+    )
+    return record, new_keys
@@ -0,0 +1,173 @@
+"""Pre-evaluación local de FRASEOLOGÍA y FORMALIDAD por léxico, con las listas del prompt de clip (clip.v1).
+
+Los términos se buscan en una sola pasada sobre toda la sesión con un autómata Aho-Corasick por palabras (texto en
+minúsculas, sin acentos ni puntuación), así las frases de varias palabras y las repeticiones ('copiado, copiado')
+no necesitan un recorrido por patrón y los límites de palabra salen gratis. Las penalizaciones son las del prompt,
+una vez por término distinto para que el puntaje no dependa del largo de la sesión.
+
+El resultado va al modelo como evidencia (los términos encontrados y los puntajes del conteo) y, en clips o sesiones que solo son acuses de recibo, reemplaza
+la llamada a Bedrock. Los puntajes del modelo se conservan; con LEXICON_OVERRIDE_SCORES=true fraseología y
+formalidad se reemplazan por las locales y el score se recalcula (apply).
+"""
+import hashlib
+import os
+import re
+import unicodedata
+from collections import Counter, deque
+
+OFFICIAL = {  # Grupo de términos obligatorios -> términos
+    'confirmación': ('afirmativo', 'negativo', 'copiado', 'recibido'),
+    'solicitud': ('solicito', 'requiero autorización'),
+    'verificación': ('confirme', 'repita'),
+}
+ROLES = ('tren', 'pco', 'conductor', 'mantenimiento')
+NICKNAMES = ('pecho', 'claudito', 'amigo', 'flaco')
+COLLOQUIAL = ('dale', 'bueno bueno', 'le pego un vistazo')
+TUTEO = ('vos', 'che', 'fijate', 'tenés', 'podés', 'sabés')
+FILLERS = ('eh', 'digamos')  # 'este' queda afuera: sin la coma no se distingue del demostrativo
+ACKNOWLEDGEMENTS = ('cambio', 'ok', 'okey', 'gracias', 'entendido')  # 'sí'/'no'/'bien' solos pueden ser una respuesta con contenido
+TRIVIAL_MAX_WORDS = 6
+ACK_REQUIRED = ('confirmación',)  # Un acuse de recibo solo necesita el término de confirmación
+OVERRIDE_SCORES = os.environ.get('LEXICON_OVERRIDE_SCORES', 'false').lower() == 'true'
+PENALTIES = {'apodo': 3, 'repeticion': 2, 'faltante': 2, 'coloquial': 3, 'tuteo': 3, 'muletilla': 1}
+WORD = re.compile(r'[a-z0-9]+')
+
+def normalize(text):
+    """Minúsculas y sin acentos"""
+    return ''.join(c for c in unicodedata.normalize('NFKD', text.lower()) if not unicodedata.combining(c))
+
+def words(text):
+    return WORD.findall(normalize(text))
+
+class Matcher:
+    """Aho-Corasick sobre secuencias de palabras: add() los patrones, después scan()"""
+    def __init__(self):
+        self.goto, self.fail, self.out = [{}], [0], [[]]
+
+    def add(self, phrase, payload):
+        state = 0
+        for word in words(phrase):
+            if word not in self.goto[state]:
+                self.goto.append({})
+                self.fail.append(0)
+                self.out.append([])
+                self.goto[state][word] = len(self.goto) - 1
+            state = self.goto[state][word]
+        self.out[state].append(payload)
+
+    def build(self):
+        queue = deque(self.goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for word, child in self.goto[state].items():
+                queue.append(child)
+                fallback = self.fail[state]
+                while fallback and word not in self.goto[fallback]:
+                    fallback = self.fail[fallback]
+                self.fail[child] = self.goto[fallback].get(word, 0)
+                self.out[child] = self.out[child] + self.out[self.fail[child]]
+        return self
+
+    def scan(self, tokens):
+        """(índice de la última palabra, payload) de cada aparición; None en tokens corta los patrones"""
+        state = 0
+        for i, word in enumerate(tokens):
+            if word is None:
+                state = 0
+                continue
+            while state and word not in self.goto[state]:
+                state = self.fail[state]
+            state = self.goto[state].get(word, 0)
+            for payload in self.out[state]:
+                yield i, payload
+
+def _patterns():
+    for group, terms in OFFICIAL.items():
+        for term in terms:
+            yield term, ('oficial', group, term)
+    for term in OFFICIAL['confirmación']:
+        yield f'{term} {term}', ('repeticion', None, term)
+    for kind, terms in (('rol', ROLES), ('apodo', NICKNAMES), ('coloquial', COLLOQUIAL), ('tuteo', TUTEO), ('muletilla', FILLERS)):
+        for term in terms:
+            yield term, (kind, None, term)
+
+MATCHER = Matcher()
+for _phrase, _payload in _patterns():
+    MATCHER.add(_phrase, _payload)
+MATCHER.build()
+TRIVIAL_WORDS = {w for term in OFFICIAL['confirmación'] + ACKNOWLEDGEMENTS + FILLERS for w in words(term)}
+# Todo lo que cambia la evaluación final: términos, acuses que se evalúan sin modelo y si se imponen los puntajes
+FINGERPRINT = hashlib.sha256(repr((sorted(_patterns()), sorted(TRIVIAL_WORDS), OVERRIDE_SCORES)).encode('utf-8')).hexdigest()[:12]
+
+def scan(texts):
+    """Una pasada sobre todos los textos: un Counter de (tipo, grupo, término) por texto"""
+    tokens, owner = [], []
+    for i, text in enumerate(texts):
+        for word in words(text):
+            tokens.append(word)
+            owner.append(i)
+        tokens.append(None)
+        owner.append(i)
+    found = [Counter() for _ in texts]
+    for position, payload in MATCHER.scan(tokens):
+        found[owner[position]][payload] += 1
+    return found
+
+def summarize(matches, required=tuple(OFFICIAL)):
+    """Sub-puntajes y errores a partir de los Counter de scan() (de una sesión, una ventana o un operador);
+    'required' son los grupos de términos obligatorios cuya ausencia se penaliza"""
+    total = sum(matches, Counter())
+    terms = lambda kind: sorted({term for k, _, term in total if k == kind})
+    groups = {group for kind, group, _ in total if kind == 'oficial'}
+    missing = [group for group in required if group not in groups]
+    found = {kind: terms(kind) for kind in ('oficial', 'rol', 'repeticion', 'apodo', 'coloquial', 'tuteo', 'muletilla')}
+
+    fraseologia = 10 - PENALTIES['apodo'] * len(found['apodo']) - PENALTIES['repeticion'] * len(found['repeticion']) - PENALTIES['faltante'] * len(missing)
+    formalidad = (10 - PENALTIES['apodo'] * len(found['apodo']) - PENALTIES['coloquial'] * len(found['coloquial'])
+                  - PENALTIES['tuteo'] * bool(found['tuteo']) - PENALTIES['muletilla'] * len(found['muletilla']))
+    errors = [f"Sin términos de {group} ({', '.join(OFFICIAL[group])})" for group in missing]
+    labels = (('apodo', 'Uso de apodos'), ('repeticion', 'Repetición innecesaria'), ('coloquial', 'Expresiones coloquiales'),
+              ('tuteo', 'Tuteo inapropiado'), ('muletilla', 'Muletillas'))
+    errors += [f"{label}: {', '.join(found[kind])}" for kind, label in labels if found[kind]]
+    return {'fraseologia': max(0, fraseologia), 'formalidad': max(0, formalidad), 'terminos': found, 'faltantes': missing, 'errores': errors}
+
+def facts(report):
+    """Texto de los hechos para el prompt"""
+    found = report['terminos']
+    return "\n".join([
+        f"- Fraseología: {report['fraseologia']}/10; formalidad: {report['formalidad']}/10",
+        f"- Términos oficiales usados: {', '.join(found['oficial']) or 'ninguno'}; roles nombrados: {', '.join(found['rol']) or 'ninguno'}",
+        f"- Errores de léxico: {'; '.join(report['errores']) or 'ninguno'}",
+    ])
+
+def is_trivial(texts):
+    """Sin palabras o solo acuses de recibo cortos ('Copiado, cambio'): no hace falta el modelo para evaluarlo"""
+    tokens = [w for text in texts for w in words(text)]
+    return len(tokens) <= TRIVIAL_MAX_WORDS and all(w in TRIVIAL_WORDS for w in tokens)
+
+def apply(result, report):
+    """Fraseología y formalidad locales sobre la respuesta del modelo (el score se recalcula si estaban los cuatro)"""
+    if not isinstance(result, dict):
+        return result
+    merged = dict(result, fraseologia=report['fraseologia'], formalidad=report['formalidad'])
+    criteria = [merged.get(c) for c in ('fraseologia', 'claridad', 'protocolo', 'formalidad')]
+    try:
+        merged['score'] = round(sum(float(c) for c in criteria) / len(criteria), 1)
+    except (TypeError, ValueError):
+        pass
+    if 'errores_detectados' in result:
+        merged['errores_detectados'] = list(dict.fromkeys(report['errores'] + list(result['errores_detectados'] or [])))
+    return merged
+
+def local_evaluation(matches, operators=None):
+    """Evaluación sin modelo para acuses de recibo o clips vacíos, a partir de los Counter de scan(). Un acuse es un
+    mensaje completo (claridad 10) que no requiere solicitud ni verificación; protocolo descuenta la falta de
+    identificación del emisor. operators: nombre -> Counters de sus intervenciones"""
+    acknowledgement = {'claridad': 10, 'protocolo': 7, 'errores_detectados': ['Sin identificación del emisor'],
+                       'justification': 'Evaluación local: solo acuses de recibo, sin contenido para evaluar con el modelo.',
+                       'recommendations': ['Identificar emisor y receptor también al confirmar']}
+    result = apply(acknowledgement, summarize(matches, ACK_REQUIRED))
+    if operators is not None:
+        result['analisis_por_operador'] = {name: {'score': apply(acknowledgement, summarize(op, ACK_REQUIRED))['score'], 'observacion': 'Solo acuses de recibo'}
+                                           for name, op in operators.items()}
+    return result
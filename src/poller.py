@@ -0,0 +1,135 @@
+"""Polling compartido de jobs de Transcribe.
+
+Cada job tiene su propio próximo chequeo (backoff exponencial con jitter, arrancando en proporción a la duración
+del audio) y un deadline. Cuando hay varios jobs en vuelo se consulta el estado de todos con list_transcription_jobs
+filtrando por el prefijo del nombre, en vez de un get_transcription_job por job.
+"""
+import os
+import random
+import time
+
+import rate_limit
+import tracing
+
+MIN_DELAY = 2.0
+MAX_DELAY = 20.0
+SECONDS_PER_AUDIO_SECOND = 0.25  # Primer chequeo ~ tiempo típico de procesamiento según la duración del clip
+DEADLINE_BASE = float(os.environ.get('TRANSCRIBE_JOB_DEADLINE_SECONDS', '300'))
+DEADLINE_PER_AUDIO_SECOND = 2.0
+LIST_THRESHOLD = 3  # Con menos jobs en vuelo conviene un get por job
+
+def deadline_seconds(duration=None):
+    """Cuánto se espera a un job antes de darlo por fallido (también el lease de su cupo en rate_limit)"""
+    return DEADLINE_BASE + (duration or 0) * DEADLINE_PER_AUDIO_SECOND
+
+class TranscribePoller:
+    def __init__(self, transcribe, prefix, clock=None, sleep=None):
+        self.transcribe = transcribe
+        self.prefix = prefix
+        self.clock = clock or time.monotonic
+        self.sleep = sleep or time.sleep
+        self.jobs = {}  # job_name -> {'duration', 'attempt', 'next_check', 'deadline'}
+        self.api_calls = 0
+
+    def __len__(self):
+        return len(self.jobs)
+
+    def add(self, job_name, duration=None, resumed=False):
+        """resumed: job lanzado por una ejecución anterior, se consulta enseguida"""
+        now = self.clock()
+        duration = duration or 0
+        if not resumed:
+            tracing.current().count('transcribe_audio_seconds', duration)
+        self.jobs[job_name] = {
+            'duration': duration,
+            'attempt': 0,
+            'next_check': now if resumed else now + MIN_DELAY + duration * SECONDS_PER_AUDIO_SECOND,
+            'deadline': now + deadline_seconds(duration),
+        }
+
+    def _reschedule(self, job, now):
+        job['attempt'] += 1
+        delay = min(MAX_DELAY, max(MIN_DELAY, job['duration'] * SECONDS_PER_AUDIO_SECOND) * 2 ** job['attempt'])
+        job['next_check'] = now + random.uniform(delay / 2, delay)
+
+    def _statuses(self, names):
+        """Retorna {job_name: resumen del job} (TranscriptionJobStatus, FailureReason, tiempos) para los jobs consultados"""
+        tracer = tracing.current()
+        if len(names) < LIST_THRESHOLD:
+            statuses = {}
+            for name in names:
+                self.api_calls += 1
+                tracer.count('transcribe_status_calls')
+                statuses[name] = self.transcribe.get_transcription_job(TranscriptionJobName=name)['TranscriptionJob']
+            return statuses
+
+        statuses, token, wanted = {}, None, set(names)
+        while True:
+            self.api_calls += 1
+            tracer.count('transcribe_status_calls')
+            kwargs = {'JobNameContains': self.prefix, 'MaxResults': 100}
+            if token:
+                kwargs['NextToken'] = token
+            page = self.transcribe.list_transcription_jobs(**kwargs)
+            for summary in page.get('TranscriptionJobSummaries', []):
+                if summary['TranscriptionJobName'] in wanted:
+                    statuses[summary['TranscriptionJobName']] = summary
+            token = page.get('NextToken')
+            if not token or len(statuses) == len(wanted):
+                return statuses
+
+    def _trace_finished(self, name, summary):
+        """Separa el tiempo en cola de Transcribe del tiempo de procesamiento"""
+        created, started, completed = summary.get('CreationTime'), summary.get('StartTime'), summary.get('CompletionTime')
+        tracer = tracing.current()
+        if created and started:
+            tracer.add_span('transcribe_queue', (started - created).total_seconds() * 1000, job=name)
+        if started and completed:
+            tracer.add_span('transcribe_processing', (completed - started).total_seconds() * 1000, job=name)
+
+    def poll(self, max_wait=None):
+        """Espera hasta el próximo chequeo pendiente y retorna [(job_name, status, failure_reason)] de los jobs
+        terminados (COMPLETED o FAILED; un job que supera su deadline se reporta como FAILED). Con max_wait
+        retorna [] sin consultar si el próximo chequeo es más tarde. Los terminados liberan su cupo de jobs concurrentes."""
+        if not self.jobs:
+            return []
+        wait = min(job['next_check'] for job in self.jobs.values()) - self.clock()
+        if max_wait is not None and wait > max_wait:
+            self.sleep(max_wait)
+            return []
+        if wait > 0:
+            self.sleep(wait)
+
+        now = self.clock()
+        due = [name for name, job in self.jobs.items() if job['next_check'] <= now]
+        # Una consulta por listado cubre todos los jobs del prefijo, así que se aprovecha para revisar todos
+        names = list(self.jobs) if len(self.jobs) >= LIST_THRESHOLD else due
+        statuses = self._statuses(names)
+
+        finished = []
+        now = self.clock()
+        for name in names:
+            summary = statuses.get(name, {})  # El listado puede no incluir jobs recién creados
+            status = summary.get('TranscriptionJobStatus', 'IN_PROGRESS')
+            job = self.jobs[name]
+            if status in ('COMPLETED', 'FAILED'):
+                finished.append((name, status, summary.get('FailureReason')))
+                self._trace_finished(name, summary)
+            elif now > job['deadline']:
+                finished.append((name, 'FAILED', 'Deadline de transcripción excedido'))
+            else:
+                if name in due:
+                    self._reschedule(job, now)
+                continue
+            del self.jobs[name]
+        if finished:
+            rate_limit.semaphore('transcribe').release(name for name, _, _ in finished)
+        return finished
+
+    def wait_for(self, job_name, duration=None):
+        """Espera un único job y retorna (status, failure_reason)"""
+        self.add(job_name, duration)
+        while True:
+            for name, status, reason in self.poll():
+                if name == job_name:
+                    return status, reason
@@ -1,167 +1,263 @@
 """Lambda para procesar job en background - Transcribe + Bedrock"""
 import json
-import boto3
 import os
 import time
-import xml.etree.ElementTree as ET
 
-transcribe = boto3.client('transcribe')
-bedrock = boto3.client('bedrock-runtime')
-s3 = boto3.client('s3')
+import analytics_store
+import audio_preprocess
+import batching
+import checkpoint
+import evaluation
+import evaluation_cache
+import job_store
+import prompt_builder
+import session_state
+import speaker_attribution
+import tetra_metadata
+import tracing
+import transcription
+import transcription_cache
+from core import clients
+from poller import TranscribePoller
+
+transcribe = clients.lazy('transcribe')
+bedrock = clients.lazy('bedrock-runtime')
+s3 = clients.lazy('s3')
+lambda_client = clients.lazy('lambda')
 
 BUCKET = os.environ['AUDIO_BUCKET']
 MODEL_ID = 'us.anthropic.claude-sonnet-4-20250514-v1:0'
+BATCH_CLIPS = os.environ.get('TRANSCRIBE_BATCH', 'true').lower() == 'true'
+RESUME_MARGIN_SECONDS = float(os.environ.get('RESUME_MARGIN_SECONDS', '120'))  # Antes del timeout: checkpoint y re-invocación
+RESUME_MARGIN_FRACTION = 0.25  # Tope del margen sobre el tiempo de la invocación, para timeouts cortos
+PROCESS_FUNCTION = os.environ.get('PROCESS_FUNCTION_NAME')  # Re-invocación sin context (ejecución local)
+MAX_INVOCATIONS = int(os.environ.get('MAX_INVOCATIONS', '20'))
 
-PROMPT_TEMPLATE = """Eres un evaluador experto en comunicaciones ferroviarias operativas del metro de Buenos Aires.
-
-Analiza la siguiente SESIÓN COMPLETA de comunicaciones del sistema TETRA entre operadores.
-
-CONTEXTO DE LA SESIÓN:
-- Duración total: {duracion_total} segundos
-- Participantes: {participantes}
-- Cantidad de intervenciones: {num_intervenciones}
-
-METADATOS DE INTERVENCIONES:
-{metadatos_intervenciones}
-
-TRANSCRIPCIÓN COMPLETA:
-{transcripcion}
-
-Evalúa según estos criterios (25% cada uno):
-1. FRASEOLOGÍA (0-10): Uso de términos oficiales
-2. CLARIDAD (0-10): Mensajes completos, sin ambigüedades
-3. PROTOCOLO (0-10): Identificación emisor/receptor, estructura correcta
-4. FORMALIDAD (0-10): Lenguaje profesional
-
-Responde ÚNICAMENTE con JSON válido (sin texto adicional):
-{{
-  "score": <promedio numérico 0-10>,
-  "fraseologia": <número 0-10>,
-  "claridad": <número 0-10>,
-  "protocolo": <número 0-10>,
-  "formalidad": <número 0-10>,
-  "justification": "<explicación breve>",
-  "errores_detectados": ["<error1>", "<error2>"],
-  "recommendations": ["<mejora1>", "<mejora2>"],
-  "analisis_por_operador": {{
-    "<nombre_operador>": {{"score": <número 0-10>, "observacion": "<comentario breve>"}}
-  }}
-}}
-
-IMPORTANTE: En analisis_por_operador, incluye TODOS los participantes con su score numérico y observación."""""
-
-def update_job(job_id, updates):
-    """Actualiza estado del job en S3"""
-    try:
-        obj = s3.get_object(Bucket=BUCKET, Key=f'jobs/{job_id}.json')
-        job_data = json.loads(obj['Body'].read())
-    except:
-        job_data = {'job_id': job_id}
-    job_data.update(updates)
-    s3.put_object(Bucket=BUCKET, Key=f'jobs/{job_id}.json', Body=json.dumps(job_data, ensure_ascii=False), ContentType='application/json')
+eval_cache = evaluation_cache.EvaluationCache(s3, BUCKET)
+jobs = job_store.from_env(s3, BUCKET)
+analytics = analytics_store.from_env(s3, BUCKET)
 
-def parse_callrefs_xml(xml_content):
-    root = ET.fromstring(xml_content)
-    return {cr.get('TetraCallRef'): {'calling_id': cr.get('CallingID'), 'duration': int(cr.get('Duration', 0)), 'timestamp': cr.get('FromDateLoc')} for cr in root.findall('callref')}
-
-def parse_holders_xml(xml_content):
-    root = ET.fromstring(xml_content)
-    return {h.get('ID'): {'name': h.get('Name') or f"Op-{h.get('ID')}"} for h in root.findall('holder')}
-
-def parse_recording_xml(xml_content):
-    root = ET.fromstring(xml_content)
-    return [{'start': r.get('StartDate'), 'duration': int(r.get('Duration', 0)), 'talking_id': r.get('TalkingID')} for r in root.findall('recording')]
+SESSION_PROMPT = prompt_builder.load('session')
+DELTA_PROMPT = prompt_builder.load('session_delta')  # Clips agregados a una sesión ya evaluada
 
 def handler(event, context):
     job_id = event['job_id']
     audio_keys = event['audio_keys']
     xml_keys = event.get('xml_keys', {})
+    append = event.get('append', 0)  # N° de agregado a una sesión ya evaluada (0 = sesión nueva)
+    tracer = tracing.start(job_id)
+    function_name = context.function_name if context is not None else PROCESS_FUNCTION
+    # Con un timeout corto el margen fijo se comería toda la invocación: se acota a una fracción del tiempo inicial
+    margin_ms = RESUME_MARGIN_SECONDS * 1000
+    if context is not None:
+        margin_ms = min(margin_ms, context.get_remaining_time_in_millis() * RESUME_MARGIN_FRACTION)
+    
+    def out_of_time():
+        """Queda menos que el margen para guardar el checkpoint y re-invocar antes del timeout de la Lambda"""
+        return context is not None and context.get_remaining_time_in_millis() < margin_ms
+    
+    def resume():
+        """Sigue en una nueva invocación desde el checkpoint"""
+        jobs.flush(job_id)
+        tracer.count('job_resumes')
+        lambda_client.invoke(FunctionName=function_name, InvocationType='Event', Payload=json.dumps(event))
     
     try:
-        update_job(job_id, {'status': 'processing', 'progress': 5})
-        
-        # Parsear XMLs
-        holders, callrefs, interventions = {}, {}, []
-        if xml_keys.get('holders'):
-            holders = parse_holders_xml(s3.get_object(Bucket=BUCKET, Key=xml_keys['holders'])['Body'].read().decode('utf-8'))
-        if xml_keys.get('callrefs'):
-            callrefs = parse_callrefs_xml(s3.get_object(Bucket=BUCKET, Key=xml_keys['callrefs'])['Body'].read().decode('utf-8'))
-        for rec_key in xml_keys.get('recordings', []):
-            interventions.extend(parse_recording_xml(s3.get_object(Bucket=BUCKET, Key=rec_key)['Body'].read().decode('utf-8')))
-        interventions.sort(key=lambda x: x['start'])
-        
-        update_job(job_id, {'progress': 10})
-        
-        # Transcribir audios
-        all_transcripts = []
+        ckpt = checkpoint.JobCheckpoint(jobs, job_id, run=append)
+        if ckpt.invocation >= MAX_INVOCATIONS:
+            jobs.update(job_id, {'status': 'error', 'error': f'El job no terminó en {MAX_INVOCATIONS} ejecuciones', 'metrics': tracer.summary()})
+            return
+        jobs.update(job_id, {'status': 'processing', 'progress': 5, 'invocations': ckpt.invocation + 1})
+        
+        # Agregado: solo se procesan los clips nuevos sobre el estado guardado de la sesión
+        state = session_state.SessionState(jobs.get_session(job_id) if append else None)
+        if append and state.evaluation is None:
+            # Sesión sin estado guardado (anterior a los agregados): se evalúa completa, con el caché de transcripciones
+            record = jobs.get(job_id)
+            audio_keys, xml_keys = record['audio_keys'], record.get('xml_keys', {})
+        state.appends = append
+        
+        # Parsear XMLs (solo las llamadas de esta sesión)
+        with tracer.span('xml_metadata'):
+            metadata = tetra_metadata.load(s3, BUCKET, xml_keys, call_refs={transcription.clip_id(k) for k in audio_keys}, holder_name_format='Op-{}')
+        holders, callrefs, interventions = metadata.holders, metadata.callrefs, metadata.interventions
+        
+        jobs.update(job_id, {'progress': 10})
+        
+        # Transcribir audios en paralelo; el resultado se arma en orden cronológico
         total_duration = 0
         num_audios = len(audio_keys)
+        ordered_keys = session_state.chronological(audio_keys, callrefs)
+        cache = transcription_cache.TranscriptionCache(s3, BUCKET)
+        
+        # Lo que dejó hecho o en vuelo una ejecución anterior del mismo job (timeout o reintento)
+        running_keys = set(ckpt.keys('running'))
+        hashes = {k: ckpt.clips[k]['hash'] for k in ckpt.keys('done', 'running')}
+        vad_segments = {k: ckpt.clips[k].get('vad') for k in running_keys}
+        with tracer.span('checkpoint_restore'):
+            restored = cache.get_many(hashes[k] for k in ckpt.keys('done'))
+        results = {k: restored[hashes[k]] for k in ckpt.keys('done') if hashes[k] in restored}
+        results.update({k: None for k in ckpt.keys('failed')})
+        resumed = set(results)
+        tracer.count('resumed_clips', len(results) + len(running_keys))
+        new_keys = [k for k in ordered_keys if k not in results and k not in running_keys]
+        
+        # Cache por hash de audio y configuración (Transcribe + VAD): solo se transcriben los clips nunca vistos
+        with tracer.span('audio_download'):
+            audio_data = transcription.download_all(s3, BUCKET, new_keys)
+        with tracer.span('transcription_cache_lookup'):
+            hashes.update({k: audio_preprocess.cache_key(audio_data[k]) for k in new_keys})
+            cached = cache.get_many(hashes[k] for k in new_keys)
+        for k in new_keys:
+            if hashes[k] in cached:
+                results[k] = cached[hashes[k]]
+                ckpt.mark_done(k, hashes[k])
+        misses = [k for k in new_keys if k not in results]
+        tracer.count('transcription_cache_hits', len(new_keys) - len(misses))
+        
+        # Una línea por intervención: las palabras se atribuyen al TalkingID del turno de recordings/*.xml
+        turns = speaker_attribution.SessionTurns(interventions)
+        clip_entries = {}
+        
+        def clip_lines(keys):
+            """Arma las líneas de cada clip. Retorna los clips con texto para publicar"""
+            clips = []
+            for audio_key in keys:
+                call_info = callrefs.get(transcription.clip_id(audio_key), {})
+                entries = clip_entries[audio_key] = []
+                if transcription.transcript_text(results.get(audio_key)):
+                    entries.extend(prompt_builder.clip_entries(results[audio_key], call_info, turns, holders))
+                if entries:
+                    clips.append({'clip': transcription.clip_id(audio_key), 'timestamp': call_info.get('timestamp', ''),
+                                  'start': call_info['start_dt'].isoformat() if call_info.get('start_dt') else '',
+                                  'lines': [e['text'] for e in entries]})
+            return clips
+        
+        def publish(keys):
+            """Publica los clips en el job para que el frontend los muestre sin esperar al final"""
+            clips = clip_lines(keys)
+            if clips:
+                jobs.publish_clips(job_id, clips)
+        
+        clip_lines([k for k in ordered_keys if k in resumed])  # Ya publicados por la ejecución anterior
+        publish([k for k in ordered_keys if k in results and k not in resumed])
+        
+        # VAD: recortar silencios y descartar los clips sin voz antes de que lleguen a Transcribe
+        with tracer.span('audio_preprocess'):
+            prepared = {k: audio_preprocess.prepare(audio_data[k]) for k in misses} if audio_preprocess.ENABLED else {}
+        for k in misses:
+            if k in prepared and prepared[k]['audio'] is None:
+                results[k] = audio_preprocess.EMPTY_RESULTS
+                cache.put(hashes[k], results[k])
+                ckpt.mark_done(k, hashes[k])
+                tracer.count('vad_dropped_clips')
+        tracer.count('vad_trimmed_seconds', round(sum(p['original_duration'] - p['duration'] for p in prepared.values() if p['duration'] is not None), 1))
+        misses = [k for k in misses if k not in results]
+        vad_segments.update({k: prepared[k]['segments'] for k in misses if k in prepared})
+        media = {k: prepared[k]['audio'] if k in prepared else audio_data[k] for k in misses}
+        audio_data.clear()  # Los originales ya no se usan
+        source_keys = {}  # Clave del audio preprocesado en S3 -> clave original
+        for job_name, job in ckpt.running().items():
+            if job['segments'] is None:
+                source_keys.update({job['media']: k for k in running_keys if ckpt.clips[k]['job'] == job_name})
+        transcription_started = time.perf_counter()
+        
+        def on_start(job_name, media_key, segments=None):
+            clip_keys = [seg['audio_key'] for seg in segments] if segments else [source_keys.get(media_key, media_key)]
+            ckpt.mark_running(job_name, media_key, {k: {'hash': hashes[k], 'vad': vad_segments.get(k)} for k in clip_keys}, segments)
+        
+        def on_done(audio_key, clip_results, done):
+            audio_key = source_keys.get(audio_key, audio_key)
+            tracer.add_span('clip_transcribed', (time.perf_counter() - transcription_started) * 1000, clip=transcription.clip_id(audio_key))
+            # Timestamps relativos al clip original, alineados con recordings/*.xml
+            results[audio_key] = audio_preprocess.shift_results(clip_results, vad_segments.get(audio_key))
+            if clip_results is not None:
+                cache.put(hashes[audio_key], results[audio_key])
+                ckpt.mark_done(audio_key, hashes[audio_key])
+            else:
+                ckpt.mark_failed(audio_key)
+            publish([audio_key])
+            jobs.update(job_id, {'progress': 10 + int(len(results) / num_audios * 70)})
+        
+        # Los nombres de lotes se repiten entre ejecuciones: cada una usa su propio sufijo y el poller sigue a todas
+        suffix = (f"-a{append}" if append else '') + (f"-r{ckpt.invocation}" if ckpt.invocation else '')
+        poller = TranscribePoller(transcribe, f"emova-{job_id}")
+        with tracer.span('transcription'):
+            if BATCH_CLIPS:
+                batching.transcribe_batched(transcribe, s3, BUCKET, misses, f"emova-{job_id}{suffix}", f"batches/{job_id}{suffix}", on_done=on_done,
+                                            load=media.get, running=ckpt.running(), on_start=on_start, stop=out_of_time, poller=poller)
+            else:
+                # Transcribe lee el audio desde S3: los clips que cambió el VAD se suben aparte
+                for k in misses:
+                    if prepared.get(k, {}).get('segments'):
+                        source_keys[f"preprocessed/{job_id}/{k.split('/')[-1]}"] = k
+                transcription.upload_all(s3, BUCKET, {media_key: media[k] for media_key, k in source_keys.items() if k in media})
+                media_keys = {k: media_key for media_key, k in source_keys.items()}
+                durations = {media_keys.get(k, k): prepared.get(k, {}).get('duration') or callrefs.get(transcription.clip_id(k), {}).get('duration') for k in misses}
+                running = {name: job['media'] for name, job in ckpt.running().items()}
+                transcription.transcribe_all(transcribe, s3, BUCKET, [media_keys.get(k, k) for k in misses], f"emova-{job_id}", on_done=on_done,
+                                             durations=durations, poller=poller, running=running, on_start=on_start, stop=out_of_time)
+            cache.save()
+        ckpt.save()
+        
+        # Quedan clips en vuelo o sin lanzar (se acabó el tiempo): seguir en una nueva invocación desde el checkpoint
+        if any(k not in results for k in ordered_keys):
+            resume()
+            return
+        
+        # Transcripción de la sesión en orden cronológico con las líneas ya armadas al publicar cada clip
+        transcript_entries = []
+        for audio_key in ordered_keys:
+            if clip_entries.get(audio_key):
+                transcript_entries.extend(clip_entries[audio_key])
+                total_duration += callrefs.get(transcription.clip_id(audio_key), {}).get('duration', 0)
+        all_transcripts = [e['text'] for e in transcript_entries]
+        
+        if not all_transcripts and state.evaluation is None:
+            jobs.update(job_id, {'status': 'error', 'error': 'No se pudo transcribir ningún audio', 'metrics': tracer.summary()})
+            return
+        
+        jobs.update(job_id, {'progress': 85})
+        
+        # Evaluar con Bedrock (por ventanas en paralelo si la sesión excede el presupuesto del prompt); en un agregado,
+        # solo el tramo nuevo con la evaluación previa como contexto
+        intervention_entries = prompt_builder.intervention_entries(interventions, holders)
+        previous = state if state.evaluation is not None else None
+        template = DELTA_PROMPT if previous else SESSION_PROMPT
+        build_prompt = prompt_builder.SessionPrompt(template, transcript_entries, intervention_entries, previous=previous)
+        
+        if previous is None:
+            cache_key = evaluation_cache.session_key(MODEL_ID, SESSION_PROMPT, transcript_entries, intervention_entries, total_duration)
+            session_evaluation = eval_cache.get(cache_key)
+        else:
+            cache_key, session_evaluation = None, None
         
-        for i, audio_key in enumerate(sorted(audio_keys)):
-            job_name = f"emova-{job_id}-{audio_key.split('/')[-1].replace('.wav','')}"[:64]
-            
-            transcribe.start_transcription_job(
-                TranscriptionJobName=job_name, LanguageCode='es-ES', MediaFormat='wav',
-                Media={'MediaFileUri': f's3://{BUCKET}/{audio_key}'},
-                OutputBucketName=BUCKET, OutputKey=f'transcriptions/{job_name}.json',
-                Settings={'ShowSpeakerLabels': True, 'MaxSpeakerLabels': 10}
-            )
-            
-            while True:
-                status = transcribe.get_transcription_job(TranscriptionJobName=job_name)['TranscriptionJob']['TranscriptionJobStatus']
-                if status == 'COMPLETED': break
-                elif status == 'FAILED': break
-                time.sleep(3)
-            
-            if status == 'COMPLETED':
-                trans_data = json.loads(s3.get_object(Bucket=BUCKET, Key=f'transcriptions/{job_name}.json')['Body'].read())
-                transcript = trans_data.get('results', {}).get('transcripts', [{}])[0].get('transcript', '')
-                if transcript:
-                    tetra_id = audio_key.split('/')[-1].replace('.wav', '')
-                    call_info = callrefs.get(tetra_id, {})
-                    caller = holders.get(call_info.get('calling_id', ''), {}).get('name', 'Operador')
-                    all_transcripts.append(f"[{call_info.get('timestamp', '')} - {caller}]: {transcript}")
-                    total_duration += call_info.get('duration', 0)
-            
-            progress = 10 + int((i + 1) / num_audios * 70)
-            update_job(job_id, {'progress': progress})
-        
-        if not all_transcripts:
-            update_job(job_id, {'status': 'error', 'error': 'No se pudo transcribir ningún audio'})
+        if not transcript_entries:
+            tracer.count('append_without_speech')  # Los clips agregados no tenían voz: queda la evaluación previa
+        elif session_evaluation is None and build_prompt.trivial():
+            tracer.count('evaluation_local')  # Solo acuses de recibo: no se llama al modelo
+            session_evaluation = build_prompt.local_evaluation()
+        elif session_evaluation is None and out_of_time():
+            resume()  # Solo falta la llamada al modelo y no entra en lo que queda de esta invocación
             return
+        elif session_evaluation is None:
+            tracer.count('prompt_tokens_saved', build_prompt.tokens_saved())  # Frente a la plantilla de referencia (session.v1)
+            with tracer.span('evaluation'):
+                session_evaluation = evaluation.evaluate_session(
+                    bedrock, MODEL_ID, build_prompt, transcript_entries, intervention_entries,
+                    on_partial=lambda partial: jobs.update(job_id, {'partial_evaluation': build_prompt.expand(partial)})  # Se escribe cada PROGRESS_MIN_INTERVAL
+                )
+                session_evaluation = build_prompt.expand(session_evaluation)
+            if cache_key:
+                eval_cache.put(cache_key, session_evaluation)
+        else:
+            tracer.count('evaluation_cache_hits')
         
-        update_job(job_id, {'progress': 85})
-        
-        # Evaluar con Bedrock
-        participantes = {holders.get(inv['talking_id'], {}).get('name', f"Op-{inv['talking_id']}") for inv in interventions}
-        metadatos_str = "\n".join([f"- {inv['start']}: {holders.get(inv['talking_id'], {}).get('name', inv['talking_id'])} ({inv['duration']}s)" for inv in interventions[:20]])
-        
-        prompt = PROMPT_TEMPLATE.format(
-            duracion_total=total_duration or sum(i['duration'] for i in interventions),
-            participantes=", ".join(participantes) or "No identificados",
-            num_intervenciones=len(interventions),
-            metadatos_intervenciones=metadatos_str or "No disponibles",
-            transcripcion="\n".join(all_transcripts)
-        )
-        
-        bedrock_response = bedrock.invoke_model(
-            modelId=MODEL_ID,
-            body=json.dumps({"anthropic_version": "bedrock-2023-05-31", "max_tokens": 2048, "messages": [{"role": "user", "content": prompt}]})
-        )
-        evaluation = json.loads(json.loads(bedrock_response['body'].read())['content'][0]['text'])
-        
-        # Guardar resultado final
-        update_job(job_id, {
-            'status': 'done',
-            'progress': 100,
-            'result': {
-                'transcript': "\n".join(all_transcripts),
-                'evaluation': evaluation,
-                'session_info': {'total_duration': total_duration, 'num_audios': len(audio_keys), 'num_interventions': len(interventions), 'participants': list(participantes)},
-                'interventions': interventions[:30]
-            }
-        })
+        state.record(build_prompt, transcript_entries, interventions, holders, callrefs, total_duration, len(audio_keys), session_evaluation)
+        session_state.complete(jobs, analytics, job_id, state, tracer)
         
     except Exception as e:
         import traceback
-        update_job(job_id, {'status': 'error', 'error': str(e), 'trace': traceback.format_exc()})
+        jobs.update(job_id, {'status': 'error', 'error': str(e), 'trace': traceback.format_exc(), 'metrics': tracer.summary()})
+    finally:
+        tracing.stop().emit()
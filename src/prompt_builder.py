@@ -0,0 +1,212 @@
+"""Plantillas de prompt versionadas y serialización compacta de sesiones para la evaluación con Bedrock.
+
+Las plantillas viven en src/prompts/{nombre}.v{N}.txt (dentro de CodeUri, así viajan en el paquete de la Lambda;
+PROMPTS_DIR apunta a otro directorio) y se leen y compilan una sola vez por contenedor: el texto se parte en
+literales y campos {campo}, por lo que las llaves del JSON de ejemplo no necesitan escaparse. La versión se elige
+con PROMPT_{NOMBRE}_VERSION o es la última del directorio.
+
+La sesión compacta (session.v2) reemplaza el timestamp TETRA completo y el nombre en cada línea por una leyenda
+de alias (A, B, ...) y offsets relativos al inicio, y fusiona los turnos de recordings/*.xml con lo transcripto.
+Las plantillas con {hechos} reciben lo que encontró lexicon. session.v3, session_delta.v1 y clip.v2 piden al modelo
+copiar esos puntajes (pensadas para LEXICON_OVERRIDE_SCORES=true); desde session.v4, session_delta.v2 y clip.v3 son
+solo evidencia y fraseología y formalidad quedan a criterio del modelo.
+"""
+import functools
+import glob
+import hashlib
+import os
+import re
+from bisect import bisect_right
+from datetime import datetime, timedelta
+
+import evaluation
+import lexicon
+import speaker_attribution
+import tetra_metadata
+
+PROMPTS_DIR = os.environ.get('PROMPTS_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'prompts'))
+FIELD = re.compile(r'\{([a-z_]+)\}')
+BASELINE_VERSION = 'v1'  # Referencia para medir los tokens ahorrados
+
+class PromptTemplate:
+    def __init__(self, name, version, text):
+        self.name, self.version, self.text = name, version, text
+        self._parts = FIELD.split(text)  # Literales en posiciones pares, campos en las impares
+        self.fields = tuple(dict.fromkeys(self._parts[1::2]))
+        self.fingerprint = f"{name}.{version}:{hashlib.sha256(text.encode('utf-8')).hexdigest()[:12]}"
+
+    def render(self, **values):
+        parts = list(self._parts)
+        parts[1::2] = [str(values[field]) for field in self._parts[1::2]]
+        return ''.join(parts)
+
+def versions(name, prompts_dir=None):
+    """Versiones disponibles de una plantilla, de la más vieja a la más nueva"""
+    paths = glob.glob(os.path.join(prompts_dir or PROMPTS_DIR, f'{name}.v*.txt'))
+    found = [os.path.basename(p)[len(name) + 1:-len('.txt')] for p in paths]
+    return sorted((v for v in found if v[1:].isdigit()), key=lambda v: int(v[1:]))
+
+@functools.lru_cache(maxsize=None)
+def load(name, version=None):
+    """Plantilla 'name' en la versión pedida, la de PROMPT_{NAME}_VERSION o la última disponible"""
+    version = version or os.environ.get(f'PROMPT_{name.upper()}_VERSION') or (versions(name) or ['v1'])[-1]
+    with open(os.path.join(PROMPTS_DIR, f'{name}.{version}.txt'), encoding='utf-8') as f:
+        return PromptTemplate(name, version, f.read().rstrip('\n'))
+
+def clip_entries(results, call_info, turns, holders):
+    """Entradas de un clip para la sesión, una por intervención atribuida con los turnos de recordings:
+    {'time' (UTC), 'speaker', 'duration', 'words', 'text' (línea con timestamp TETRA y nombre)}"""
+    entries = []
+    for utterance in speaker_attribution.clip_utterances(results, call_info, turns.for_call(call_info.get('id'))):
+        speaker = holders.get(utterance['speaker_id'] or '', {}).get('name', 'Operador')
+        timestamp = tetra_metadata.format_tetra_date(utterance['local']) or call_info.get('timestamp', '')
+        entries.append({'time': utterance['start'], 'speaker': speaker, 'duration': utterance['duration'],
+                        'words': utterance['text'], 'text': f"[{timestamp} - {speaker}]: {utterance['text']}"})
+    return entries
+
+def intervention_entries(interventions, holders):
+    """Turnos de recordings/*.xml como entradas de la sesión (quién habla cuándo y cuánto)"""
+    return [{
+        'time': inv['start_dt'], 'speaker': holders.get(inv['talking_id'], {}).get('name', f"Op-{inv['talking_id']}"), 'duration': inv['duration'],
+        'text': f"- {inv['start']}: {holders.get(inv['talking_id'], {}).get('name', inv['talking_id'])} ({inv['duration']}s)"
+    } for inv in interventions]
+
+def alias(index):
+    """0 -> A, 25 -> Z, 26 -> AA, ..."""
+    name = ''
+    index += 1
+    while index:
+        index, rest = divmod(index - 1, 26)
+        name = chr(ord('A') + rest) + name
+    return name
+
+def _time(entry):
+    return entry.get('time') or datetime.max
+
+class SessionPrompt:
+    """build_prompt(transcript_part, intervention_part) de evaluation.evaluate_session para una sesión.
+
+    Alias y origen de los offsets se fijan con la sesión completa, así todas las ventanas usan los mismos. Con
+    'previous' (session_state.SessionState) las entradas son lo agregado a una sesión ya evaluada: se conservan sus
+    alias y su origen, y el léxico y el resumen previo entran en el prompt.
+    """
+    def __init__(self, template, transcript_entries, intervention_entries, previous=None):
+        self.template, self.previous = template, previous
+        self.transcript_entries, self.intervention_entries = transcript_entries, intervention_entries
+        timeline = sorted(transcript_entries + intervention_entries, key=_time)
+        self.origin = previous.origin if previous and previous.origin else timeline[0].get('time') if timeline else None
+        self.aliases = dict(previous.aliases) if previous else {}
+        for name in dict.fromkeys(e['speaker'] for e in timeline):
+            self.aliases.setdefault(name, alias(len(self.aliases)))
+        self.names = {a: name for name, a in self.aliases.items()}
+        # Léxico de toda la sesión en una pasada; cada ventana suma los de sus entradas
+        self.matches = dict(zip(map(id, transcript_entries), lexicon.scan([e.get('words', e['text']) for e in transcript_entries])))
+        if 'lineas' in template.fields:
+            # Las ventanas se arman con el tamaño de la línea compacta, no el de la línea completa
+            for entry in transcript_entries:
+                entry['tokens'] = evaluation.estimate_tokens(entry.get('words', entry['text'])) + 1
+            for entry in intervention_entries:
+                entry['tokens'] = 4
+
+    def __call__(self, transcript_part, intervention_part):
+        return self.template.render(**{field: getattr(self, '_' + field)(transcript_part, intervention_part)
+                                       for field in self.template.fields})
+
+    @property
+    def local_scores(self):
+        """Fraseología y formalidad salen del léxico y no del modelo (plantillas con {hechos} y LEXICON_OVERRIDE_SCORES)"""
+        return 'hechos' in self.template.fields and lexicon.OVERRIDE_SCORES
+
+    def expand(self, result):
+        """Reemplaza los alias de analisis_por_operador por los nombres de los operadores y, con local_scores,
+        impone fraseología y formalidad del léxico de la sesión"""
+        if self.local_scores:
+            result = lexicon.apply(result, lexicon.summarize(list(self.matches.values()) + ([self.previous.lexicon] if self.previous else [])))
+        operators = (result or {}).get('analisis_por_operador')
+        if not isinstance(operators, dict):
+            return result
+        return dict(result, analisis_por_operador={self.names.get(k.strip(), k): v for k, v in operators.items()})
+
+    def lexicon(self, transcript_part):
+        return lexicon.summarize([self.matches[id(e)] for e in transcript_part])
+
+    def trivial(self):
+        """La sesión no tiene más que acuses de recibo: se evalúa con local_evaluation() sin llamar al modelo"""
+        return lexicon.is_trivial(e.get('words', e['text']) for e in self.transcript_entries)
+
+    def local_evaluation(self):
+        by_speaker = {}
+        for entry in self.transcript_entries:
+            by_speaker.setdefault(entry['speaker'], []).append(self.matches[id(entry)])
+        return lexicon.local_evaluation(list(self.matches.values()), by_speaker)
+
+    def tokens_saved(self, baseline=None):
+        """Tokens estimados del prompt completo con la plantilla de referencia menos los de esta"""
+        baseline = baseline or load(self.template.name, BASELINE_VERSION)
+        full = (self.transcript_entries, self.intervention_entries)
+        return evaluation.estimate_tokens(SessionPrompt(baseline, *full)(*full)) - evaluation.estimate_tokens(self(*full))
+
+    def offset(self, when):
+        if when is None or self.origin is None:
+            return '+?'
+        seconds = max(0, int((when - self.origin).total_seconds()))
+        return f'+{seconds // 60}:{seconds % 60:02d}'
+
+    def lines(self, transcript_part, intervention_part):
+        """Una línea por turno con lo transcripto en él; lo que no cae en ningún turno va en su propia línea"""
+        turns = sorted((e for e in intervention_part if e.get('time')), key=_time)
+        rows = [[e['time'], e['speaker'], e['duration'], []] for e in turns]
+        by_speaker = {}  # speaker -> (índices de sus turnos, inicios)
+        for i, turn in enumerate(turns):
+            indices, starts = by_speaker.setdefault(turn['speaker'], ([], []))
+            indices.append(i)
+            starts.append(turn['time'])
+        tolerance = timedelta(seconds=speaker_attribution.TOLERANCE_SECONDS)
+        for entry in transcript_part:
+            words = entry.get('words', entry['text'])
+            indices, starts = by_speaker.get(entry['speaker'], ([], []))
+            j = bisect_right(starts, entry['time'] + tolerance) - 1 if entry.get('time') else -1
+            i = indices[j] if j >= 0 else None
+            if i is not None and turns[i]['time'] + timedelta(seconds=turns[i]['duration']) + tolerance >= entry['time']:
+                rows[i][3].append(words)
+            else:
+                rows.append([entry.get('time'), entry['speaker'], entry['duration'], [words]])
+        rows.extend([None, e['speaker'], e['duration'], []] for e in intervention_part if not e.get('time'))
+        rows.sort(key=lambda row: row[0] or datetime.max)
+        return [f"{self.offset(when)} {self.aliases.get(speaker, speaker)} {round(duration)}s" + (': ' + ' '.join(words) if words else '')
+                for when, speaker, duration, words in rows]
+
+    # Campos de las plantillas de sesión
+    def _duracion_total(self, transcript_part, intervention_part):
+        return round(sum(e['duration'] for e in transcript_part) or sum(e['duration'] for e in intervention_part), 1)
+
+    def _num_intervenciones(self, transcript_part, intervention_part):
+        return len(intervention_part)
+
+    def _participantes(self, transcript_part, intervention_part):
+        return ", ".join(sorted({e['speaker'] for e in intervention_part})) or "No identificados"
+
+    def _metadatos_intervenciones(self, transcript_part, intervention_part):
+        return "\n".join(e['text'] for e in intervention_part) or "No disponibles"
+
+    def _transcripcion(self, transcript_part, intervention_part):
+        return "\n".join(e['text'] for e in transcript_part)
+
+    def _inicio(self, transcript_part, intervention_part):
+        return self.origin.strftime('%d/%m/%Y %H:%M:%S UTC') if self.origin else "No disponible"
+
+    def _leyenda(self, transcript_part, intervention_part):
+        present = {e['speaker'] for e in transcript_part + intervention_part}
+        return ", ".join(f"{a}={name}" for name, a in self.aliases.items() if name in present) or "No identificados"
+
+    def _lineas(self, transcript_part, intervention_part):
+        return "\n".join(self.lines(transcript_part, intervention_part))
+
+    def _hechos(self, transcript_part, intervention_part):
+        return lexicon.facts(self.lexicon(transcript_part))
+
+    def _resumen_previo(self, transcript_part, intervention_part):
+        return self.previous.summary(self.aliases) if self.previous else "Sin evaluación previa"
+
+    def _evaluado_hasta(self, transcript_part, intervention_part):
+        return self.offset(self.previous.until) if self.previous else "+0:00"
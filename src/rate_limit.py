@@ -0,0 +1,292 @@
+"""Límite de tasa compartido para Transcribe y Bedrock entre invocaciones concurrentes.
+
+Cada recurso es un token bucket ('transcribe': jobs lanzados por segundo, 'bedrock': tokens por minuto) cuyo
+estado vive en ratelimit/{nombre}.json y se actualiza con escrituras condicionales, así todas las Lambdas que
+corren a la vez reparten la misma cuota. Cada invocación toma del bucket compartido una reserva de hasta
+LEASE_SECONDS de tasa y la gasta localmente, para no escribir el estado en cada llamada.
+
+La tasa se ajusta con AIMD: un error de throttling la baja a la mitad (una sola vez por COOLDOWN_SECONDS,
+aunque lo vean varias invocaciones a la vez) y vacía el bucket; después sube linealmente hasta la cuota en
+RECOVERY_SECONDS. Así el total se mantiene cerca de la cuota real aunque la configurada no coincida.
+
+Los jobs de Transcribe además tienen un tope de jobs en vuelo por cuenta: Semaphore reparte esos cupos en
+ratelimit/{nombre}-slots.json. Cada cupo es un lease con vencimiento a nombre del job; se libera cuando el poller
+lo ve terminado y, si la invocación que lo tomó muere sin seguirlo, vence solo.
+
+Backends: S3 (producción), memoria y archivo local (pruebas offline). Se elige con RATE_LIMIT_STORE=s3|memory|file|off;
+sin AUDIO_BUCKET (herramientas locales) el default es memoria.
+"""
+import fcntl
+import hashlib
+import json
+import os
+import random
+import threading
+import time
+
+import tracing
+from core import clients
+
+KEY_PREFIX = 'ratelimit'
+TRANSCRIBE_START_RATE = float(os.environ.get('TRANSCRIBE_START_RATE', '5'))  # StartTranscriptionJob por segundo
+BEDROCK_TOKENS_PER_MINUTE = float(os.environ.get('BEDROCK_TOKENS_PER_MINUTE', '200000'))
+TRANSCRIBE_CONCURRENT_JOBS = int(os.environ.get('TRANSCRIBE_CONCURRENT_JOBS', '250'))  # Jobs en vuelo por cuenta
+BURST_SECONDS = 4.0  # Capacidad del bucket, en segundos de cuota
+LEASE_SECONDS = 1.0
+DECREASE = 0.5
+MIN_RATE_FRACTION = 0.05
+COOLDOWN_SECONDS = 2.0
+RECOVERY_SECONDS = float(os.environ.get('RATE_LIMIT_RECOVERY_SECONDS', '60'))
+MAX_WAIT = 5.0  # Entre reintentos de acquire, para ver enseguida si otra invocación liberó la tasa
+MAX_CONFLICT_RETRIES = 5
+
+# Recurso -> cuota (unidades por segundo)
+LIMITS = {
+    'transcribe': TRANSCRIBE_START_RATE,
+    'bedrock': BEDROCK_TOKENS_PER_MINUTE / 60,
+}
+# Recurso -> cupos concurrentes
+SLOTS = {
+    'transcribe': TRANSCRIBE_CONCURRENT_JOBS,
+}
+
+class VersionConflict(Exception):
+    """El estado cambió desde la lectura"""
+
+class Saturated(Exception):
+    """No hay cupos libres en el semáforo compartido"""
+
+class S3LimitStore:
+    def __init__(self, s3, bucket):
+        self.s3, self.bucket = s3, bucket
+
+    def read(self, key):
+        """Retorna (estado, versión) o (None, None) si no existe"""
+        try:
+            obj = self.s3.get_object(Bucket=self.bucket, Key=key)
+        except self.s3.exceptions.NoSuchKey:
+            return None, None
+        return json.loads(obj['Body'].read()), obj['ETag']
+
+    def write(self, key, state, version):
+        condition = {'IfMatch': version} if version else {'IfNoneMatch': '*'}
+        try:
+            self.s3.put_object(Bucket=self.bucket, Key=key, Body=json.dumps(state), ContentType='application/json', **condition)
+        except self.s3.exceptions.ClientError as e:
+            if e.response['Error']['Code'] in ('PreconditionFailed', 'ConditionalRequestConflict'):
+                raise VersionConflict(key)
+            raise
+
+class MemoryLimitStore:
+    """Estado compartido solo entre los threads del proceso"""
+    def __init__(self):
+        self.objects = {}  # key -> (estado, versión)
+        self._lock = threading.Lock()
+
+    def read(self, key):
+        state, version = self.objects.get(key, (None, None))
+        return (dict(state) if state else None), version
+
+    def write(self, key, state, version):
+        with self._lock:
+            current = self.objects.get(key, (None, None))[1]
+            if current != version:
+                raise VersionConflict(key)
+            self.objects[key] = (dict(state), (current or 0) + 1)
+
+class FileLimitStore:
+    """Un archivo JSON por recurso bajo base_dir, compartido entre procesos locales; la versión es el hash del contenido"""
+    def __init__(self, base_dir):
+        self.base_dir = base_dir
+
+    def _path(self, key):
+        path = os.path.join(self.base_dir, key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        return path
+
+    def read(self, key):
+        try:
+            with open(self._path(key), 'rb') as f:
+                body = f.read()
+        except FileNotFoundError:
+            return None, None
+        return json.loads(body), hashlib.sha1(body).hexdigest()
+
+    def write(self, key, state, version):
+        with open(self._path(key) + '.lock', 'w') as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            if self.read(key)[1] != version:
+                raise VersionConflict(key)
+            tmp = self._path(key) + '.tmp'
+            with open(tmp, 'w') as f:
+                json.dump(state, f)
+            os.replace(tmp, self._path(key))
+
+class RateLimiter:
+    def __init__(self, store, name, rate, burst_seconds=BURST_SECONDS):
+        """rate: cuota del recurso en unidades por segundo"""
+        self.store, self.name, self.limit = store, name, rate
+        self.key = f'{KEY_PREFIX}/{name}.json'
+        self.burst = rate * burst_seconds
+        self._reserve = 0.0  # Tomado del bucket compartido y todavía no usado en esta invocación
+        self._lock = threading.Lock()
+
+    def _rate(self, state, now):
+        """Tasa vigente: la que quedó tras la última baja más la recuperación lineal desde entonces"""
+        recovered = self.limit * (now - state['decreased']) / RECOVERY_SECONDS
+        return max(self.limit * MIN_RATE_FRACTION, min(self.limit, state['rate'] + recovered))
+
+    def _refill(self, state, now):
+        if state is None:
+            return {'tokens': self.burst, 'updated': now, 'rate': self.limit, 'decreased': 0.0}
+        elapsed = max(0.0, now - state['updated'])
+        return dict(state, tokens=min(self.burst, state['tokens'] + elapsed * self._rate(state, now)), updated=now)
+
+    def _take(self, need):
+        """Toma del bucket compartido al menos 'need' (y hasta LEASE_SECONDS de tasa) si alcanza, dejándolo en
+        negativo si 'need' supera la capacidad. Retorna (tomado, segundos a esperar)"""
+        for _ in range(MAX_CONFLICT_RETRIES):
+            state, version = self.store.read(self.key)
+            now = time.time()
+            state = self._refill(state, now)
+            rate = self._rate(state, now)
+            if state['tokens'] < min(need, self.burst):
+                return 0.0, (min(need, self.burst) - state['tokens']) / rate
+            taken = max(need, min(state['tokens'], rate * LEASE_SECONDS))
+            state['tokens'] -= taken
+            try:
+                self.store.write(self.key, state, version)
+            except VersionConflict:
+                tracing.current().count('rate_limit_conflicts')
+                continue
+            return taken, 0.0
+        return 0.0, random.uniform(0, 0.5)
+
+    def acquire(self, amount=1):
+        """Espera hasta poder usar 'amount' unidades. Retorna los segundos esperados"""
+        waited = 0.0
+        while True:
+            with self._lock:
+                if self._reserve < amount:
+                    taken, wait = self._take(amount - self._reserve)
+                    self._reserve += taken
+                if self._reserve >= amount:
+                    self._reserve -= amount
+                    break
+            # Jitter para que las invocaciones que esperan no vuelvan todas juntas
+            wait = min(wait, MAX_WAIT) * random.uniform(1.0, 1.2)
+            time.sleep(wait)
+            waited += wait
+        if waited:
+            tracing.current().add_span(f'rate_limit_{self.name}_wait', waited * 1000)
+        return waited
+
+    def refund(self, amount):
+        """Devuelve a la reserva local lo que se tomó de más (p. ej. tokens estimados que no se usaron)"""
+        with self._lock:
+            self._reserve += max(0.0, amount)
+
+    def throttled(self):
+        """El servicio rechazó una llamada por cuota: baja la tasa compartida (AIMD) y descarta la reserva local"""
+        tracing.current().count(f'{self.name}_throttled')
+        with self._lock:
+            self._reserve = 0.0
+            for _ in range(MAX_CONFLICT_RETRIES):
+                state, version = self.store.read(self.key)
+                now = time.time()
+                state = self._refill(state, now)
+                if now - state['decreased'] < COOLDOWN_SECONDS:
+                    return  # Otra invocación ya la bajó por el mismo pico
+                state.update(rate=self._rate(state, now) * DECREASE, decreased=now, tokens=min(state['tokens'], 0.0))
+                try:
+                    self.store.write(self.key, state, version)
+                    return
+                except VersionConflict:
+                    tracing.current().count('rate_limit_conflicts')
+
+class Semaphore:
+    def __init__(self, store, name, limit):
+        """limit: cupos en vuelo a la vez entre todas las invocaciones"""
+        self.store, self.name, self.limit = store, name, limit
+        self.key = f'{KEY_PREFIX}/{name}-slots.json'
+
+    @staticmethod
+    def _live(state, now):
+        return {slot: expires for slot, expires in (state or {}).get('holders', {}).items() if expires > now}
+
+    def try_acquire(self, slot, lease_seconds):
+        """Toma un cupo a nombre de 'slot' (o renueva el suyo) por lease_seconds. Retorna False si no hay libres"""
+        for _ in range(MAX_CONFLICT_RETRIES):
+            state, version = self.store.read(self.key)
+            now = time.time()
+            holders = self._live(state, now)
+            if slot not in holders and len(holders) >= self.limit:
+                return False
+            holders[slot] = now + lease_seconds
+            try:
+                self.store.write(self.key, {'holders': holders}, version)
+                return True
+            except VersionConflict:
+                tracing.current().count('rate_limit_conflicts')
+        return False  # Mucha contención: se trata como saturado y se reintenta más tarde
+
+    def release(self, slots):
+        """Libera los cupos de 'slots'; si los conflictos no lo permiten, vencen con su lease"""
+        slots = set(slots)
+        for _ in range(MAX_CONFLICT_RETRIES):
+            state, version = self.store.read(self.key)
+            holders = self._live(state, time.time())
+            if not slots & set((state or {}).get('holders', {})):
+                return
+            try:
+                self.store.write(self.key, {'holders': {s: e for s, e in holders.items() if s not in slots}}, version)
+                return
+            except VersionConflict:
+                tracing.current().count('rate_limit_conflicts')
+
+class Unlimited:
+    """RATE_LIMIT_STORE=off: sin límite compartido"""
+    def acquire(self, amount=1):
+        return 0.0
+
+    def try_acquire(self, slot, lease_seconds):
+        return True
+
+    def release(self, slots):
+        pass
+
+    def refund(self, amount):
+        pass
+
+    def throttled(self):
+        tracing.current().count('throttled')
+
+def store_from_env():
+    bucket = os.environ.get('AUDIO_BUCKET')
+    backend = os.environ.get('RATE_LIMIT_STORE', 's3' if bucket else 'memory')
+    if backend == 'off':
+        return None
+    if backend == 'memory':
+        return MemoryLimitStore()
+    if backend == 'file':
+        return FileLimitStore(os.environ.get('RATE_LIMIT_DIR', '/tmp/emova-ratelimit'))
+    return S3LimitStore(clients.lazy('s3'), bucket)
+
+_limiters = {}
+_limiters_lock = threading.Lock()
+
+def get(name):
+    """Limitador del recurso 'name' (ver LIMITS), uno por contenedor"""
+    with _limiters_lock:
+        if name not in _limiters:
+            store = store_from_env()
+            _limiters[name] = RateLimiter(store, name, LIMITS[name]) if store else Unlimited()
+        return _limiters[name]
+
+def semaphore(name):
+    """Semáforo de cupos concurrentes del recurso 'name' (ver SLOTS), uno por contenedor"""
+    with _limiters_lock:
+        if ('slots', name) not in _limiters:
+            store = store_from_env()
+            _limiters[('slots', name)] = Semaphore(store, name, SLOTS[name]) if store else Unlimited()
+        return _limiters[('slots', name)]
@@ -0,0 +1,134 @@
+"""Estado acumulado de una sesión evaluada, para agregarle clips sin volver a procesarla completa.
+
+Vive en jobs/{job_id}/session.json (job_store) y guarda lo que hace falta para evaluar solo lo nuevo: la
+evaluación vigente y su peso (tokens de transcripción evaluados), alias y origen de los offsets, el léxico
+acumulado, hasta dónde se evaluó, totales y las líneas de la transcripción para el resultado completo.
+La evaluación nueva es el promedio ponderado de la previa y la del tramo agregado (como las ventanas de
+evaluation.evaluate_session); fraseología y formalidad salen del léxico de toda la sesión.
+"""
+import json
+from collections import Counter
+from datetime import datetime
+
+import analytics_store
+import evaluation
+import lexicon
+import tracing
+import transcription
+
+TIMELINE_LIMIT = 30
+SUMMARY_LIST_ITEMS = 5
+
+def _parse(value):
+    return datetime.fromisoformat(value) if value else None
+
+def chronological(audio_keys, callrefs):
+    """Clips en orden de inicio según CallRefs (los que no figuran, al final)"""
+    return sorted(audio_keys, key=lambda k: (callrefs.get(transcription.clip_id(k), {}).get('start_dt') or datetime.max, k))
+
+def complete(jobs, analytics, job_id, state, tracer=None, **updates):
+    """Guarda el estado de la sesión y el resultado final (aparte del registro), deja el delta analítico y marca el
+    job como terminado con su resumen y 'updates'. Con tracer, sus métricas van en el registro"""
+    jobs.put_session(job_id, state.to_dict())
+    jobs.put_result(job_id, state.result())
+    with tracing.current().span('analytics_delta'):
+        analytics.add(analytics_store.session_delta(job_id, state.evaluation, state.holders, state.calls))
+    if tracer is not None:
+        updates['metrics'] = tracer.summary()
+    jobs.update(job_id, dict({'status': 'done', 'progress': 100,
+                              'session': {'appends': state.appends, 'num_audios': state.num_audios, 'score': state.evaluation.get('score'),
+                                          'evaluated_until': state.until.isoformat() if state.until else None}}, **updates))
+
+class SessionState:
+    def __init__(self, data=None):
+        data = data or {}
+        self.appends = data.get('appends', 0)
+        self.origin, self.until = _parse(data.get('origin')), _parse(data.get('until'))
+        self.aliases = data.get('aliases', {})
+        self.evaluation, self.weight = data.get('evaluation'), data.get('weight', 0)
+        self.lexicon = Counter({tuple(key): n for *key, n in data.get('lexicon', [])})
+        self.lexicon_errors = data.get('lexicon_errors', [])  # Errores del léxico impuestos en la evaluación vigente
+        self.transcript = data.get('transcript', [])
+        self.total_duration = data.get('total_duration', 0)
+        self.num_audios, self.num_interventions = data.get('num_audios', 0), data.get('num_interventions', 0)
+        self.participants = data.get('participants', [])
+        self.timeline = data.get('timeline', [])
+        self.holders = data.get('holders', {})
+        self.calls = [dict(c, start_dt=_parse(c.get('start_dt'))) for c in data.get('calls', [])]
+
+    def to_dict(self):
+        return {
+            'appends': self.appends, 'origin': self.origin.isoformat() if self.origin else None,
+            'until': self.until.isoformat() if self.until else None, 'aliases': self.aliases,
+            'evaluation': self.evaluation, 'weight': self.weight,
+            'lexicon': [[*key, n] for key, n in self.lexicon.items()], 'lexicon_errors': self.lexicon_errors,
+            'transcript': self.transcript,
+            'total_duration': self.total_duration, 'num_audios': self.num_audios, 'num_interventions': self.num_interventions,
+            'participants': self.participants, 'timeline': self.timeline, 'holders': self.holders,
+            'calls': [dict(c, start_dt=c['start_dt'].isoformat() if c.get('start_dt') else None) for c in self.calls],
+        }
+
+    def summary(self, aliases):
+        """Evaluación vigente para el prompt del tramo agregado, con los alias de la leyenda"""
+        current = self.evaluation or {}
+        operators = {aliases.get(name, name): data.get('score') for name, data in (current.get('analisis_por_operador') or {}).items()
+                     if isinstance(data, dict)}
+        return json.dumps({
+            **{c: current.get(c) for c in ('score',) + evaluation.CRITERIA},
+            'justification': current.get('justification', ''),
+            'errores_detectados': (current.get('errores_detectados') or [])[:SUMMARY_LIST_ITEMS],
+            'score_por_operador': operators,
+        }, ensure_ascii=False)
+
+    def add(self, build_prompt, transcript_entries, interventions, holders, callrefs, duration, num_audios):
+        """Suma un tramo (o la sesión inicial) ya transcripto; build_prompt es el SessionPrompt del tramo"""
+        self.origin = build_prompt.origin
+        self.aliases = build_prompt.aliases
+        self.lexicon.update(sum(build_prompt.matches.values(), Counter()))
+        self.transcript.extend(e['text'] for e in transcript_entries)
+        times = [e['time'] for e in transcript_entries + build_prompt.intervention_entries if e.get('time')]
+        self.until = max(times + ([self.until] if self.until else []), default=self.until)
+        self.total_duration += duration
+        self.num_audios += num_audios
+        self.num_interventions += len(interventions)
+        self.participants = sorted(set(self.participants) | {e['speaker'] for e in build_prompt.intervention_entries})
+        self.timeline = (self.timeline + [{k: v for k, v in inv.items() if k != 'start_dt'} for inv in interventions])[:TIMELINE_LIMIT]
+        self.holders.update({holder_id: {'name': h['name']} for holder_id, h in holders.items() if h['name'] in self.participants})
+        self.calls.extend({'called_id': c.get('called_id'), 'start_dt': c.get('start_dt')} for c in callrefs.values())
+
+    def record(self, build_prompt, transcript_entries, interventions, holders, callrefs, duration, num_audios, session_evaluation):
+        """add() del tramo y, si hubo evaluación, update() ponderada por sus tokens de transcripción"""
+        self.add(build_prompt, transcript_entries, interventions, holders, callrefs, duration, num_audios)
+        if session_evaluation is not None:
+            self.update(session_evaluation, sum(evaluation.estimate_tokens(e['text']) for e in transcript_entries), build_prompt.local_scores)
+
+    def update(self, delta_evaluation, weight, local_scores=False):
+        """Combina la evaluación del tramo con la vigente, ponderadas por tokens de transcripción. Con local_scores
+        (SessionPrompt.local_scores) fraseología y formalidad salen del léxico acumulado"""
+        if self.evaluation is None or not self.weight:
+            merged = delta_evaluation
+        else:
+            # Los errores de léxico se recalculan con toda la sesión ('Sin términos de ...' puede dejar de valer)
+            stale = set(self.lexicon_errors)
+            previous, delta_evaluation = [dict(e, errores_detectados=[x for x in e.get('errores_detectados') or [] if x not in stale])
+                                          for e in (self.evaluation, delta_evaluation)]
+            merged = evaluation.reduce_evaluations([previous, delta_evaluation], [self.weight, weight])
+            # La justificación del tramo ya describe la sesión completa; no se acumulan tramos
+            merged['justification'] = delta_evaluation.get('justification') or previous.get('justification', '')
+        if local_scores:
+            report = lexicon.summarize([self.lexicon])
+            merged, self.lexicon_errors = lexicon.apply(merged, report), report['errores']
+        self.evaluation = merged
+        self.weight += weight
+        return self.evaluation
+
+    def result(self):
+        """Resultado completo del job (jobs/{job_id}/result.json)"""
+        return {
+            'transcript': "\n".join(self.transcript),
+            'evaluation': self.evaluation,
+            'session_info': {'total_duration': self.total_duration, 'num_audios': self.num_audios,
+                             'num_interventions': self.num_interventions, 'participants': self.participants,
+                             'appends': self.appends},
+            'interventions': self.timeline
+        }
@@ -0,0 +1,60 @@
+"""Descubrimiento automático de sesiones a partir de un día de CallRefs.
+
+Una sesión es una secuencia de llamadas al mismo grupo (CalledID) donde el silencio entre el fin de una llamada
+y el inicio de la siguiente no supera gap_seconds. Cada sesión se mapea a sus WAV (por TetraCallRef) y a sus
+recordings/*.xml (por el ID del callref).
+"""
+import os
+from datetime import timedelta
+
+SESSION_GAP_SECONDS = float(os.environ.get('SESSION_GAP_SECONDS', '120'))
+
+def group_calls(metadata, gap_seconds=SESSION_GAP_SECONDS, talk_groups=None):
+    """Agrupa las llamadas por grupo e inactividad. Retorna [{'talk_group', 'start', 'end', 'call_refs'}]"""
+    gap = timedelta(seconds=gap_seconds)
+    sessions = []
+    for talk_group, refs in metadata.by_talk_group.items():
+        if talk_groups and talk_group not in talk_groups:
+            continue
+        current = None
+        for tetra_id in refs:  # by_talk_group ya está ordenado por inicio
+            call = metadata.callrefs[tetra_id]
+            if not call['start_dt']:
+                continue
+            call_end = call['start_dt'] + timedelta(seconds=call['duration'])
+            if current and call['start_dt'] - current['end'] <= gap:
+                current['call_refs'].append(tetra_id)
+                current['end'] = max(current['end'], call_end)
+                continue
+            current = {'talk_group': talk_group, 'start': call['start_dt'], 'end': call_end, 'call_refs': [tetra_id]}
+            sessions.append(current)
+    return sorted(sessions, key=lambda s: (s['start'], s['talk_group']))
+
+def list_keys(s3, bucket, prefix, suffix):
+    """{nombre sin extensión: key} de los objetos bajo prefix que terminan en suffix"""
+    keys = {}
+    for page in s3.get_paginator('list_objects_v2').paginate(Bucket=bucket, Prefix=prefix):
+        for obj in page.get('Contents', []):
+            if obj['Key'].lower().endswith(suffix):
+                keys[obj['Key'].split('/')[-1][:-len(suffix)]] = obj['Key']
+    return keys
+
+def discover(metadata, audio_keys, recording_keys, xml_keys, gap_seconds=SESSION_GAP_SECONDS, talk_groups=None):
+    """Sesiones listas para enviar como jobs: {'talk_group', 'start', 'end', 'audio_keys', 'xml_keys'}.
+
+    audio_keys y recording_keys son {nombre: key} (ver list_keys); las sesiones sin audios se omiten.
+    """
+    discovered = []
+    for session in group_calls(metadata, gap_seconds, talk_groups):
+        audios = [audio_keys[ref] for ref in session['call_refs'] if ref in audio_keys]
+        if not audios:
+            continue
+        recordings = [recording_keys[metadata.callrefs[ref]['id']] for ref in session['call_refs'] if metadata.callrefs[ref]['id'] in recording_keys]
+        discovered.append({
+            'talk_group': session['talk_group'],
+            'start': session['start'].isoformat(),
+            'end': session['end'].isoformat(),
+            'audio_keys': audios,
+            'xml_keys': dict(xml_keys, recordings=recordings),
+        })
+    return discovered
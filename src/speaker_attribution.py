@@ -0,0 +1,86 @@
+"""Atribución de hablantes con los turnos de recordings/*.xml en lugar de la diarización de Transcribe.
+
+Cada palabra se ubica en tiempo absoluto (inicio UTC de la llamada + start_time de Transcribe) y se asigna al
+turno (TalkingID) que la contiene, buscando en un índice de intervalos ordenado por inicio. Las palabras seguidas
+del mismo hablante forman una intervención.
+"""
+import bisect
+import itertools
+from datetime import timedelta
+
+import transcription
+
+TOLERANCE_SECONDS = 1.0  # Duration de recordings viene en segundos enteros
+
+class TurnIndex:
+    """Índice de intervalos [StartDate, StartDate + Duration) de los turnos"""
+    def __init__(self, turns):
+        self.turns = sorted((t for t in turns if t.get('start_dt')), key=lambda t: t['start_dt'])
+        self._starts = [t['start_dt'] for t in self.turns]
+        self._ends = [t['start_dt'] + timedelta(seconds=t['duration']) for t in self.turns]
+        self._max_end = list(itertools.accumulate(self._ends, max))  # Para turnos largos que se solapan con los siguientes
+
+    def __len__(self):
+        return len(self.turns)
+
+    def find(self, when, tolerance=TOLERANCE_SECONDS):
+        """Turno que contiene 'when' (el que empezó más tarde si hay solapes); si ninguno, el más cercano
+        dentro de la tolerancia. None si no hay"""
+        i = bisect.bisect_right(self._starts, when)
+        j = i - 1
+        while j >= 0 and self._max_end[j] > when:
+            if self._ends[j] > when:
+                return self.turns[j]
+            j -= 1
+        candidates = []
+        if i > 0:
+            candidates.append((when - self._ends[i - 1], i - 1))
+        if i < len(self.turns):
+            candidates.append((self._starts[i] - when, i))
+        gap, nearest = min(candidates, default=(None, None))
+        return self.turns[nearest] if gap is not None and gap <= timedelta(seconds=tolerance) else None
+
+class SessionTurns:
+    """Índices por llamada (recordings/{callref ID}.xml) y uno de toda la sesión para turnos sin llamada conocida"""
+    def __init__(self, interventions):
+        by_call = {}
+        for inv in interventions:
+            by_call.setdefault(inv.get('callref_id'), []).append(inv)
+        self.by_call = {call_id: TurnIndex(turns) for call_id, turns in by_call.items()}
+        self.session = TurnIndex(interventions)
+
+    def for_call(self, callref_id):
+        return self.by_call.get(callref_id) or self.session
+
+def attribute(results, clip_start, index, default_speaker=None):
+    """Agrupa las palabras en intervenciones [{'speaker_id', 'start', 'end', 'text'}] (datetimes UTC)"""
+    utterances = []
+    for item in (results or {}).get('items', []):
+        content = item['alternatives'][0]['content']
+        if 'start_time' not in item:
+            if utterances:
+                utterances[-1]['text'] += content  # Puntuación pegada a la palabra anterior
+            continue
+        start = clip_start + timedelta(seconds=float(item['start_time']))
+        end = clip_start + timedelta(seconds=float(item['end_time']))
+        turn = index.find(start + (end - start) / 2)
+        speaker = turn['talking_id'] if turn else default_speaker
+        if utterances and utterances[-1]['speaker_id'] == speaker:
+            utterances[-1]['text'] += ' ' + content
+            utterances[-1]['end'] = end
+        else:
+            utterances.append({'speaker_id': speaker, 'start': start, 'end': end, 'text': content})
+    return utterances
+
+def clip_utterances(results, call_info, index):
+    """Intervenciones de un clip con hora UTC ('start') y local ('local'). Sin timestamps o sin turnos,
+    el clip completo se atribuye al CallingID como antes"""
+    start_utc, start_local = call_info.get('start_utc_dt'), call_info.get('start_dt')
+    utterances = attribute(results, start_utc, index, call_info.get('calling_id')) if start_utc and len(index) else []
+    if not utterances:
+        return [{'speaker_id': call_info.get('calling_id'), 'start': start_utc, 'local': start_local,
+                 'duration': call_info.get('duration', 0), 'text': transcription.transcript_text(results)}]
+    for utterance in utterances:
+        utterance['local'] = start_local + (utterance['start'] - start_utc) if start_local else None
+        utterance['duration'] = round((utterance.pop('end') - utterance['start']).total_seconds(), 2)
+    return utterances
@@ -0,0 +1,112 @@
+"""Carga compartida de metadatos TETRA (CallRefs.xml, Holders.xml y recordings/*.xml).
+
+Los XML se parsean en streaming con iterparse directamente desde el body de S3, los recordings se descargan en
+paralelo y las fechas 'dd/mm/yyyy HH.MM.SS,mmm' se convierten una sola vez a datetime ('start_dt').
+"""
+import bisect
+import xml.etree.ElementTree as ET
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+def parse_tetra_date(value):
+    """Convierte 'dd/mm/yyyy HH.MM.SS,mmm' (o sin milisegundos) a datetime; None si no se puede"""
+    if not value:
+        return None
+    for fmt in ('%d/%m/%Y %H.%M.%S,%f', '%d/%m/%Y %H.%M.%S'):
+        try:
+            return datetime.strptime(value, fmt)
+        except ValueError:
+            pass
+    return None
+
+def format_tetra_date(dt):
+    """Inverso de parse_tetra_date: 'dd/mm/yyyy HH.MM.SS,mmm'"""
+    return dt.strftime('%d/%m/%Y %H.%M.%S,%f')[:-3] if dt else ''
+
+def iter_elements(source, tag):
+    """Recorre los elementos 'tag' de un XML sin construir el árbol completo"""
+    for _, elem in ET.iterparse(source, events=('end',)):
+        if elem.tag == tag:
+            yield elem
+            elem.clear()
+
+def parse_callrefs(source, wanted=None):
+    """TetraCallRef -> info de la llamada. Con 'wanted' solo se conservan esas llamadas"""
+    calls = {}
+    for cr in iter_elements(source, 'callref'):
+        tetra_id = cr.get('TetraCallRef')
+        if wanted is not None and tetra_id not in wanted:
+            continue
+        calls[tetra_id] = {
+            'id': cr.get('ID'),
+            'calling_id': cr.get('CallingID'),
+            'called_id': cr.get('CalledID'),
+            'duration': int(cr.get('Duration', 0)),
+            'timestamp': cr.get('FromDateLoc'),
+            'start_dt': parse_tetra_date(cr.get('FromDateLoc')),
+            'start_utc_dt': parse_tetra_date(cr.get('FromDateUTC')),  # Misma referencia que StartDate de recordings
+            'type': cr.get('Type')
+        }
+    return calls
+
+def parse_holders(source, name_format='Operador-{}'):
+    return {h.get('ID'): {
+        'tetra_address': h.get('TetraAddress'),
+        'type': h.get('Type'),
+        'name': h.get('Name') or name_format.format(h.get('ID'))
+    } for h in iter_elements(source, 'holder')}
+
+def parse_recording(source, callref_id=None):
+    """Turnos de una llamada; callref_id es el ID del CallRef (nombre del archivo recordings/{ID}.xml)"""
+    return [{
+        'callref_id': callref_id,
+        'start': r.get('StartDate'),
+        'start_dt': parse_tetra_date(r.get('StartDate')),
+        'duration': int(r.get('Duration', 0)),
+        'talking_id': r.get('TalkingID'),
+        'calling_id': r.get('CallingID')
+    } for r in iter_elements(source, 'recording')]
+
+def sort_key(item):
+    return item['start_dt'] or datetime.max
+
+class SessionMetadata:
+    """Metadatos de una sesión con índices por TetraCallRef, por grupo (CalledID) y por tiempo"""
+    def __init__(self, holders, callrefs, interventions):
+        self.holders = holders
+        self.callrefs = callrefs
+        self.interventions = sorted(interventions, key=sort_key)
+        self.by_talk_group = {}
+        for tetra_id, call in sorted(callrefs.items(), key=lambda kv: sort_key(kv[1])):
+            self.by_talk_group.setdefault(call['called_id'], []).append(tetra_id)
+        timed = sorted((call['start_dt'], tetra_id) for tetra_id, call in callrefs.items() if call['start_dt'])
+        self._call_times = [t for t, _ in timed]
+        self._call_refs = [ref for _, ref in timed]
+
+    def holder_name(self, holder_id, default=None):
+        return self.holders.get(holder_id, {}).get('name', default)
+
+    def calls_between(self, start, end):
+        """TetraCallRefs cuyo inicio cae en [start, end)"""
+        lo = bisect.bisect_left(self._call_times, start)
+        hi = bisect.bisect_left(self._call_times, end)
+        return self._call_refs[lo:hi]
+
+    def timeline(self, limit=None):
+        """Intervenciones serializables a JSON, en orden cronológico"""
+        return [{k: v for k, v in inv.items() if k != 'start_dt'} for inv in self.interventions[:limit]]
+
+def load(s3, bucket, xml_keys, call_refs=None, holder_name_format='Operador-{}', max_workers=16):
+    """Carga los XML de xml_keys ({'holders', 'callrefs', 'recordings': [...]}) desde S3.
+
+    call_refs limita CallRefs.xml a las llamadas de la sesión (el archivo suele cubrir un día completo).
+    """
+    body = lambda key: s3.get_object(Bucket=bucket, Key=key)['Body']
+    recording_keys = xml_keys.get('recordings', [])
+
+    with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(recording_keys) + 2))) as pool:
+        recordings = pool.map(lambda key: parse_recording(body(key), key.split('/')[-1].rsplit('.', 1)[0]), recording_keys)
+        holders = pool.submit(lambda: parse_holders(body(xml_keys['holders']), holder_name_format)) if xml_keys.get('holders') else None
+        callrefs = pool.submit(lambda: parse_callrefs(body(xml_keys['callrefs']), call_refs)) if xml_keys.get('callrefs') else None
+        interventions = [inv for rec in recordings for inv in rec]
+        return SessionMetadata(holders.result() if holders else {}, callrefs.result() if callrefs else {}, interventions)
@@ -0,0 +1,97 @@
+"""Trazas por etapa para los jobs: spans con duración, contadores (tokens de Bedrock, segundos de audio, escrituras)
+y emisión de métricas como líneas de log en formato EMF de CloudWatch.
+
+El tracer activo es global al contenedor (una invocación a la vez), así los módulos compartidos registran
+sus tiempos con tracing.current() sin recibir el tracer por parámetro.
+"""
+import json
+import threading
+import time
+from contextlib import contextmanager
+
+NAMESPACE = 'Emova'
+MAX_STORED_SPANS = 200
+
+class Tracer:
+    def __init__(self, job_id=None):
+        self.job_id = job_id
+        self.started = time.time()
+        self.stages = {}  # nombre -> {'count', 'total_ms', 'max_ms'}
+        self.spans = []
+        self.counters = {}
+        self._lock = threading.Lock()
+
+    def add_span(self, name, ms, **attrs):
+        with self._lock:
+            stage = self.stages.setdefault(name, {'count': 0, 'total_ms': 0.0, 'max_ms': 0.0})
+            stage['count'] += 1
+            stage['total_ms'] += ms
+            stage['max_ms'] = max(stage['max_ms'], ms)
+            if len(self.spans) < MAX_STORED_SPANS:
+                self.spans.append(dict(attrs, name=name, ms=round(ms, 1)))
+
+    @contextmanager
+    def span(self, name, **attrs):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add_span(name, (time.perf_counter() - start) * 1000, **attrs)
+
+    def count(self, name, value=1):
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def summary(self):
+        """Resumen serializable para guardar en el registro del job"""
+        with self._lock:
+            return {
+                'total_ms': round((time.time() - self.started) * 1000, 1),
+                'stages': {name: {k: round(v, 1) for k, v in stage.items()} for name, stage in self.stages.items()},
+                'counters': dict(self.counters),
+                'spans': list(self.spans)
+            }
+
+    def emit(self):
+        """Una línea EMF por etapa más una con los contadores; CloudWatch las convierte en métricas"""
+        summary = self.summary()
+        timestamp = int(time.time() * 1000)
+        for name, stage in summary['stages'].items():
+            print(json.dumps({
+                '_aws': {'Timestamp': timestamp, 'CloudWatchMetrics': [{
+                    'Namespace': NAMESPACE, 'Dimensions': [['Stage']],
+                    'Metrics': [{'Name': 'StageDurationMs', 'Unit': 'Milliseconds'}, {'Name': 'StageCount', 'Unit': 'Count'}]
+                }]},
+                'Stage': name, 'StageDurationMs': stage['total_ms'], 'StageCount': stage['count'], 'job_id': self.job_id
+            }))
+        if summary['counters']:
+            print(json.dumps(dict({
+                '_aws': {'Timestamp': timestamp, 'CloudWatchMetrics': [{
+                    'Namespace': NAMESPACE, 'Dimensions': [[]],
+                    'Metrics': [{'Name': name} for name in summary['counters']]
+                }]},
+                'job_id': self.job_id, 'JobDurationMs': summary['total_ms']
+            }, **summary['counters'])))
+
+class NullTracer(Tracer):
+    """Tracer que no registra nada (cuando no hay un job activo)"""
+    def add_span(self, name, ms, **attrs):
+        pass
+
+    def count(self, name, value=1):
+        pass
+
+_current = NullTracer()
+
+def start(job_id=None):
+    global _current
+    _current = Tracer(job_id)
+    return _current
+
+def current():
+    return _current
+
+def stop():
+    global _current
+    tracer, _current = _current, NullTracer()
+    return tracer
@@ -0,0 +1,138 @@
+"""Etapa de transcripción concurrente: lanza los jobs de Transcribe en paralelo y los sigue en un único loop de polling"""
+import json
+import os
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import rate_limit
+import tracing
+from poller import TranscribePoller, deadline_seconds
+
+LANGUAGE_CODE = 'es-ES'
+# Los hablantes salen de los turnos de recordings/*.xml (speaker_attribution); la diarización solo hace más lento el job
+SETTINGS = {'ShowSpeakerLabels': True, 'MaxSpeakerLabels': 10} if os.environ.get('TRANSCRIBE_SPEAKER_LABELS', 'false').lower() == 'true' else {}
+MAX_CONCURRENCY = int(os.environ.get('TRANSCRIBE_MAX_CONCURRENCY', '20'))
+MIN_RETRY_DELAY = 5
+START_ATTEMPTS = 6
+STOP_CHECK_SECONDS = 15  # Con stop(), cada cuánto se revisa aunque no haya chequeos pendientes
+
+def clip_id(audio_key):
+    """TetraCallRef a partir del nombre del WAV"""
+    name = audio_key.split('/')[-1]
+    return name[:-4] if name.lower().endswith('.wav') else name
+
+def job_name_for(prefix, audio_key):
+    return f"{prefix}-{clip_id(audio_key)}"[:64]
+
+def start_job(transcribe, bucket, job_name, audio_key, settings=None, media_format='wav', duration=None):
+    """Lanza el job dentro de los límites compartidos de Transcribe: toma un cupo de jobs en vuelo (que libera
+    el poller al verlo terminado; rate_limit.Saturated si no hay) y respeta la tasa de lanzamiento.
+    LimitExceededException (cuota de la cuenta) baja la tasa compartida y se propaga"""
+    slots = rate_limit.semaphore('transcribe')
+    if not slots.try_acquire(job_name, deadline_seconds(duration)):
+        tracing.current().count('transcribe_slots_full')
+        raise rate_limit.Saturated('transcribe')
+    limiter = rate_limit.get('transcribe')
+    limiter.acquire()
+    tracing.current().count('transcribe_jobs')
+    try:
+        transcribe.start_transcription_job(
+            TranscriptionJobName=job_name, LanguageCode=LANGUAGE_CODE, MediaFormat=media_format,
+            Media={'MediaFileUri': f's3://{bucket}/{audio_key}'},
+            OutputBucketName=bucket, OutputKey=f'transcriptions/{job_name}.json',
+            **({'Settings': settings or SETTINGS} if settings or SETTINGS else {})
+        )
+    except transcribe.exceptions.ConflictException:
+        raise  # El job ya existe y sigue en vuelo con el cupo
+    except Exception as e:
+        slots.release([job_name])
+        if isinstance(e, transcribe.exceptions.LimitExceededException):
+            limiter.throttled()
+        raise
+
+def start_job_waiting(transcribe, bucket, job_name, audio_key, settings=None, media_format='wav', attempts=START_ATTEMPTS):
+    """start_job para quien no tiene otros jobs propios en vuelo: si la cuenta está al límite espera y reintenta"""
+    for attempt in range(attempts):
+        try:
+            return start_job(transcribe, bucket, job_name, audio_key, settings, media_format)
+        except (transcribe.exceptions.LimitExceededException, rate_limit.Saturated):
+            if attempt == attempts - 1:
+                raise
+            time.sleep(MIN_RETRY_DELAY * 2 ** attempt * random.uniform(0.5, 1.0))
+
+def download_all(s3, bucket, audio_keys, max_workers=16):
+    """Descarga los audios en paralelo. Retorna {audio_key: bytes}"""
+    audio_keys = list(audio_keys)
+    if not audio_keys:
+        return {}
+    read = lambda key: s3.get_object(Bucket=bucket, Key=key)['Body'].read()
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(audio_keys))) as pool:
+        return dict(zip(audio_keys, pool.map(read, audio_keys)))
+
+def upload_all(s3, bucket, objects, max_workers=16):
+    """Sube {key: bytes} en paralelo"""
+    if not objects:
+        return
+    put = lambda item: s3.put_object(Bucket=bucket, Key=item[0], Body=item[1], ContentType='audio/wav')
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(objects))) as pool:
+        list(pool.map(put, objects.items()))
+
+def read_result(s3, bucket, job_name):
+    """Lee el JSON de salida de Transcribe y retorna su sección 'results'"""
+    trans_data = json.loads(s3.get_object(Bucket=bucket, Key=f'transcriptions/{job_name}.json')['Body'].read())
+    return trans_data.get('results', {})
+
+def transcript_text(results):
+    return (results or {}).get('transcripts', [{}])[0].get('transcript', '')
+
+def transcribe_all(transcribe, s3, bucket, audio_keys, job_prefix, max_concurrency=MAX_CONCURRENCY,
+                   settings=None, on_done=None, durations=None, poller=None, running=None, on_start=None, stop=None):
+    """Transcribe todos los audios con hasta max_concurrency jobs en vuelo.
+
+    Retorna {audio_key: results} (None si el job falló). on_done(audio_key, results, completados)
+    se llama a medida que cada job termina, en orden de finalización. durations ({audio_key: segundos})
+    ajusta el ritmo de polling de cada job.
+
+    Para retomar: running ({job_name: audio_key}) son jobs ya lanzados que solo se siguen, on_start(job_name,
+    audio_key) avisa cada job nuevo y stop() corta el loop (sin lanzar ni esperar más) cuando retorna True;
+    los jobs que quedan en vuelo siguen en Transcribe.
+    """
+    durations = durations or {}
+    poller = poller if poller is not None else TranscribePoller(transcribe, job_prefix)
+    pending = list(audio_keys)
+    in_flight = dict(running or {})  # job_name -> audio_key
+    for job_name, audio_key in in_flight.items():
+        poller.add(job_name, durations.get(audio_key), resumed=True)
+    results = {}
+
+    while pending or in_flight:
+        # Llenar los slots libres (aun con stop(): lanzar es barato y queda en el checkpoint)
+        while pending and len(in_flight) < max_concurrency:
+            audio_key = pending[0]
+            job_name = job_name_for(job_prefix, audio_key)
+            try:
+                start_job(transcribe, bucket, job_name, audio_key, settings, duration=durations.get(audio_key))
+            except (transcribe.exceptions.LimitExceededException, rate_limit.Saturated):
+                break  # Cuota de jobs concurrentes de la cuenta: reintentar cuando termine alguno
+            except transcribe.exceptions.ConflictException:
+                pass  # Lanzado por una ejecución anterior que cortó antes de guardar el checkpoint: se sigue
+            pending.pop(0)
+            in_flight[job_name] = audio_key
+            poller.add(job_name, durations.get(audio_key))
+            if on_start:
+                on_start(job_name, audio_key)
+
+        if stop and stop():
+            break
+        if not in_flight:
+            poller.sleep(MIN_RETRY_DELAY)  # Ningún job propio en vuelo y la cuenta sigue al límite
+            continue
+
+        for job_name, status, _ in poller.poll(max_wait=STOP_CHECK_SECONDS if stop else None):
+            audio_key = in_flight.pop(job_name)
+            results[audio_key] = read_result(s3, bucket, job_name) if status == 'COMPLETED' else None
+            if on_done:
+                on_done(audio_key, results[audio_key], len(results))
+
+    return results
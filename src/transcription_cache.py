@@ -0,0 +1,63 @@
+"""Cache de transcripciones direccionado por contenido: hash del audio + configuración de Transcribe.
+
+Cada entrada vive en cache/transcriptions/{hash}.json y un índice (cache_index, index.json) registra creación y
+último uso para aplicar TTL y desalojo LRU cuando se supera la cantidad máxima de entradas.
+"""
+import hashlib
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import cache_index
+
+CACHE_PREFIX = 'cache/transcriptions'
+TTL_DAYS = float(os.environ.get('TRANSCRIPTION_CACHE_TTL_DAYS', '30'))
+MAX_ENTRIES = int(os.environ.get('TRANSCRIPTION_CACHE_MAX_ENTRIES', '20000'))
+
+def cache_key(audio_bytes, language_code, settings):
+    digest = hashlib.sha256(audio_bytes)
+    digest.update(json.dumps({'language': language_code, 'settings': settings}, sort_keys=True).encode('utf-8'))
+    return digest.hexdigest()
+
+class TranscriptionCache:
+    def __init__(self, s3, bucket, prefix=CACHE_PREFIX, ttl_days=TTL_DAYS, max_entries=MAX_ENTRIES):
+        self.s3 = s3
+        self.bucket = bucket
+        self.prefix = prefix
+        self.ttl = ttl_days * 86400
+        self.max_entries = max_entries
+        self.index = cache_index.CacheIndex(s3, bucket, prefix, self.ttl, max_entries, name='transcription_cache')
+
+    def _entry_key(self, key):
+        return self.index.entry_key(key)
+
+    def get(self, key):
+        """Retorna los 'results' de Transcribe cacheados o None si no hay entrada vigente"""
+        try:
+            entry = json.loads(self.s3.get_object(Bucket=self.bucket, Key=self._entry_key(key))['Body'].read())
+        except self.s3.exceptions.NoSuchKey:
+            return None
+        now = time.time()
+        if now - entry.get('created', 0) > self.ttl:
+            return None
+        self.index.touch(key, entry['created'], now)
+        return entry['results']
+
+    def get_many(self, keys, max_workers=16):
+        keys = list(dict.fromkeys(keys))
+        if not keys:
+            return {}
+        with ThreadPoolExecutor(max_workers=min(max_workers, len(keys))) as pool:
+            return {key: value for key, value in zip(keys, pool.map(self.get, keys)) if value is not None}
+
+    def put(self, key, results):
+        now = time.time()
+        self.s3.put_object(Bucket=self.bucket, Key=self._entry_key(key),
+                           Body=json.dumps({'created': now, 'results': results}, ensure_ascii=False),
+                           ContentType='application/json')
+        self.index.touch(key, now, now)
+
+    def save(self):
+        """Fusiona los accesos de esta ejecución en el índice, aplica TTL/LRU y borra lo desalojado"""
+        self.index.save()
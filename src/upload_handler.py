@@ -1,32 +1,62 @@
-import json
-import boto3
 import os
 import uuid
 
-s3 = boto3.client('s3')
+from core import api, clients
+
+s3 = clients.lazy('s3')
 BUCKET = os.environ['AUDIO_BUCKET']
+MAX_BATCH = int(os.environ.get('UPLOAD_MAX_BATCH', '1000'))
+EXPIRES_IN = 300
+UPLOAD_PREFIXES = ('sessions/', 'archives/', 'input/')  # El resto del bucket (jobs/, cache/, ratelimit/, analytics/) es estado interno
 
-def handler(event, context):
-    filename = event.get('queryStringParameters', {}).get('filename', f'{uuid.uuid4()}.wav')
+def content_type_for(filename):
+    """Tiene que coincidir con el Content-Type del PUT del frontend"""
+    lower = filename.lower()
+    if lower.endswith('.wav'):
+        return 'audio/wav'
+    if lower.endswith('.xml'):
+        return 'application/xml'
+    if lower.endswith('.mp3'):
+        return 'audio/mpeg'
+    if lower.endswith('.zip'):
+        return 'application/zip'
+    return 'application/octet-stream'
+
+def upload_key(filename):
+    """Clave de destino de un nombre (sin carpeta va a input/); BadRequest si cae fuera de UPLOAD_PREFIXES"""
     key = filename if '/' in filename else f'input/{filename}'
-    
-    # Determinar content type
-    content_type = 'application/octet-stream'
-    if filename.endswith('.wav'):
-        content_type = 'audio/wav'
-    elif filename.endswith('.xml'):
-        content_type = 'application/xml'
-    elif filename.endswith('.mp3'):
-        content_type = 'audio/mpeg'
-    
+    if not key.startswith(UPLOAD_PREFIXES) or any(part in ('', '.', '..') for part in key.split('/')):
+        raise api.BadRequest(f'clave no permitida: {filename} (solo bajo {", ".join(UPLOAD_PREFIXES)})')
+    return key
+
+def presign(filename):
+    key = upload_key(filename)
     url = s3.generate_presigned_url(
         'put_object',
-        Params={'Bucket': BUCKET, 'Key': key, 'ContentType': content_type},
-        ExpiresIn=300
+        Params={'Bucket': BUCKET, 'Key': key, 'ContentType': content_type_for(filename)},
+        ExpiresIn=EXPIRES_IN
     )
+    return {'upload_url': url, 'key': key, 'content_type': content_type_for(filename)}
+
+def handler(event, context):
+    # POST /upload-urls: {"filenames": [...]} firma todo el lote en una sola llamada
+    if event.get('httpMethod') == 'POST':
+        try:
+            filenames = api.json_body(event).get('filenames', [])
+        except api.BadRequest as e:
+            return api.response(400, {'error': str(e)})
+        if not isinstance(filenames, list) or not filenames or len(filenames) > MAX_BATCH:
+            return api.response(400, {'error': f'filenames requerido: lista de nombres (máximo {MAX_BATCH})'})
+        if not all(isinstance(name, str) and name.strip() for name in filenames):
+            return api.response(400, {'error': 'filenames debe contener solo nombres de archivo (texto no vacío)'})
+        try:
+            uploads = [presign(name) for name in filenames]  # Firmar es local: un nombre inválido rechaza el lote entero
+        except api.BadRequest as e:
+            return api.response(400, {'error': str(e)})
+        return api.response(200, {'uploads': uploads})
     
-    return {
-        'statusCode': 200,
-        'headers': {'Access-Control-Allow-Origin': '*', 'Content-Type': 'application/json'},
-        'body': json.dumps({'upload_url': url, 'key': key})
-    }
+    filename = (event.get('queryStringParameters') or {}).get('filename', f'{uuid.uuid4()}.wav')
+    try:
+        return api.response(200, presign(filename))
+    except api.BadRequest as e:
+        return api.response(400, {'error': str(e)})
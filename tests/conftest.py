@@ -0,0 +1,44 @@
+import os
+import sys
+
+import pytest
+
+# Los módulos de las Lambdas son planos en src/, como los importa el runtime; bench/ aporta los dobles de AWS
+ROOT = os.path.join(os.path.dirname(__file__), '..')
+for path in ('src', 'bench', 'tools'):
+    sys.path.insert(0, os.path.join(ROOT, path))
+
+import fakes
+
+@pytest.fixture
+def clock():
+    return fakes.SimClock(scale=1.0)
+
+@pytest.fixture
+def s3(clock):
+    """Bucket en memoria de bench/fakes.py sin latencia simulada"""
+    return fakes.FakeS3(clock, latency=0.0)
+
+class ManualClock:
+    """Reemplaza el módulo time de los módulos parcheados: el tiempo avanza solo con advance o sleep"""
+    def __init__(self, now=1_700_000_000.0):
+        self.now = now
+
+    def time(self):
+        return self.now
+
+    def monotonic(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += max(0.0, seconds)
+
+    def advance(self, seconds):
+        self.now += seconds
+
+@pytest.fixture
+def manual_clock(monkeypatch):
+    """manual_clock.patch(módulo, ...) hace que esos módulos vean el reloj manual"""
+    clock = ManualClock()
+    clock.patch = lambda *modules: [monkeypatch.setattr(module, 'time', clock) for module in modules]
+    return clock
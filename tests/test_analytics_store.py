@@ -0,0 +1,59 @@
+from datetime import datetime
+
+import pytest
+
+import analytics_store
+
+HOLDERS = {'101': {'name': 'Ana'}, '102': {'name': 'Luis'}}
+CALLS = [{'start_dt': datetime(2024, 5, 2, 10, 0), 'called_id': 'G1'}, {'start_dt': datetime(2024, 5, 2, 10, 5), 'called_id': 'G1'}, None]
+
+def result(score, operators, errors=()):
+    return dict({c: score for c in analytics_store.evaluation.CRITERIA}, score=score, errores_detectados=list(errors),
+                analisis_por_operador={name: {'score': s} for name, s in operators.items()})
+
+@pytest.fixture
+def store(tmp_path):
+    return analytics_store.LocalAnalyticsStore(str(tmp_path / 'analytics.sqlite'))
+
+def test_session_delta():
+    delta = analytics_store.session_delta('job-1', result(8, {'Ana': 7, 'Desconocido': 9}, ['Uso de apodos: pecho']), HOLDERS, CALLS)
+    assert delta['ts'] == '2024-05-02T10:00:00'
+    assert delta['talk_group'] == 'G1'
+    assert delta['errors'] == ['formalidad']
+    assert delta['operators'] == {'101': {'name': 'Ana', 'score': 7.0}, 'Desconocido': {'name': 'Desconocido', 'score': 9.0}}
+    assert delta['version'] == analytics_store.session_delta('job-1', result(8, {'Ana': 7, 'Desconocido': 9}, ['Uso de apodos: pecho']), HOLDERS, CALLS)['version']
+
+def test_apply_same_version_is_noop(store):
+    delta = analytics_store.session_delta('job-1', result(8, {'Ana': 7}), HOLDERS, CALLS)
+    store.add(delta)
+    store.add(delta)
+    with store.connect() as conn:
+        assert not store.apply(conn, delta)
+    [day] = store.series(period='day')
+    assert day['sessions'] == 1
+    assert day['score'] == 8
+
+def test_reprocessed_job_replaces_rollups(store):
+    store.add(analytics_store.session_delta('job-1', result(8, {'Ana': 7}, ['Sin identificación del emisor']), HOLDERS, CALLS))
+    store.add(analytics_store.session_delta('job-2', result(4, {'Luis': 4}), HOLDERS, CALLS))
+    store.add(analytics_store.session_delta('job-1', result(6, {'Luis': 5}), HOLDERS, CALLS))
+
+    [day] = store.series(period='day')
+    assert day['sessions'] == 2
+    assert day['score'] == 5
+    assert day['errors'] == {}
+    [week] = store.series(period='week', talk_group='G1')
+    assert week['bucket'] == '2024-04-29'
+    assert week['score'] == 5
+    # Ana solo estaba en la versión anterior de job-1: sus rollups se restan y desaparecen
+    assert store.series(operator='101') == []
+    assert [(r['operator'], r['sessions'], r['operator_score']) for r in store.ranking()] == [('102', 2, 4.5)]
+
+def test_reapplying_old_version_after_new_one(store):
+    old = analytics_store.session_delta('job-1', result(8, {'Ana': 7}), HOLDERS, CALLS)
+    new = analytics_store.session_delta('job-1', result(6, {'Ana': 5}), HOLDERS, CALLS)
+    for delta in (old, new, new, old):
+        store.add(delta)
+    [day] = store.series(operator='101')
+    assert day['sessions'] == 1
+    assert day['operator_score'] == 7
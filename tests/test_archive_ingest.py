@@ -0,0 +1,91 @@
+import io
+import tarfile
+import zipfile
+
+import pytest
+
+import archive_ingest
+import transcription
+
+MEMBERS = {
+    'export/audios/138928171.WAV': b'RIFF-upper',
+    'export/audios/138928172.wav': b'RIFF-lower',
+    'export/CallRefs.xml': b'<callrefs/>',
+    'export/HOLDERS.XML': b'<holders/>',
+    'export/recordings/55.xml': b'<recordings/>',
+    'export/notas.txt': b'-',
+    '__MACOSX/export/._138928171.WAV': b'-',
+}
+
+def zip_bytes(members):
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, 'w') as archive:
+        for name, data in members.items():
+            archive.writestr(name, data)
+    return buffer.getvalue()
+
+def tar_bytes(members):
+    buffer = io.BytesIO()
+    with tarfile.open(fileobj=buffer, mode='w:gz') as archive:
+        for name, data in members.items():
+            info = tarfile.TarInfo(name)
+            info.size = len(data)
+            archive.addfile(info, io.BytesIO(data))
+    return buffer.getvalue()
+
+@pytest.fixture
+def content_types(s3):
+    """Clave -> ContentType con que se subió cada miembro"""
+    types, upload = {}, s3.upload_fileobj
+
+    def recording_upload(Fileobj, Bucket, Key, ExtraArgs=None, **kwargs):
+        types[Key] = (ExtraArgs or {}).get('ContentType')
+        upload(Fileobj, Bucket, Key, ExtraArgs=ExtraArgs, **kwargs)
+    s3.upload_fileobj = recording_upload
+    return types
+
+def test_destination():
+    assert archive_ingest.destination('a/b/138928171.WAV', 'p') == 'p/audios/138928171.wav'
+    assert archive_ingest.destination('a\\callrefs.XML', 'p') == 'p/CallRefs.xml'
+    assert archive_ingest.destination('Holders.xml', 'p') == 'p/Holders.xml'
+    assert archive_ingest.destination('rec/55.Xml', 'p') == 'p/recordings/55.xml'
+    for skipped in ('notas.txt', '.DS_Store', '._55.xml', '__MACOSX/55.xml', 'audios/'):
+        assert archive_ingest.destination(skipped, 'p') is None
+
+@pytest.mark.parametrize('name,build', [('export.zip', zip_bytes), ('export.tar.gz', tar_bytes)])
+def test_ingest_normalizes_upper_case_extensions(s3, content_types, name, build):
+    s3.seed(f'archives/x/{name}', build(MEMBERS))
+    extracted = archive_ingest.ingest(s3, 'bucket', f'archives/x/{name}', 'sessions/x')
+    assert extracted['audio_keys'] == ['sessions/x/audios/138928171.wav', 'sessions/x/audios/138928172.wav']
+    assert extracted['xml_keys'] == {'callrefs': 'sessions/x/CallRefs.xml', 'holders': 'sessions/x/Holders.xml',
+                                     'recordings': ['sessions/x/recordings/55.xml']}
+    assert sorted(extracted['skipped']) == ['__MACOSX/export/._138928171.WAV', 'export/notas.txt']
+    assert content_types['sessions/x/audios/138928171.wav'] == 'audio/wav'
+    assert content_types['sessions/x/Holders.xml'] == 'application/xml'
+    assert s3.read('sessions/x/audios/138928171.wav') == b'RIFF-upper'
+    assert transcription.clip_id(extracted['audio_keys'][0]) == '138928171'
+
+def test_ingest_rejects_members_with_same_name(s3):
+    s3.seed('archives/x/export.zip', zip_bytes({'dia1/1.wav': b'a', 'dia2/1.WAV': b'b'}))
+    with pytest.raises(archive_ingest.DuplicateMember):
+        archive_ingest.ingest(s3, 'bucket', 'archives/x/export.zip', 'sessions/x')
+
+def test_range_file_reads_zip_with_ranged_gets(s3):
+    data = zip_bytes({f'audios/{i}.wav': bytes(2000) for i in range(20)})
+    s3.seed('archives/x/export.zip', data)
+    remote = archive_ingest.S3RangeFile(s3, 'bucket', 'archives/x/export.zip', chunk=4096)
+    remote.seek(-100, io.SEEK_END)
+    assert remote.read(1000) == data[-100:]
+    remote.seek(0)
+    assert remote.read(10) + remote.read(10) == data[:20]  # La segunda lectura sale del buffer
+    assert remote.requests == 2
+    with zipfile.ZipFile(archive_ingest.S3RangeFile(s3, 'bucket', 'archives/x/export.zip', chunk=4096)) as archive:
+        assert len(archive.infolist()) == 20
+
+def test_clip_id_is_case_insensitive():
+    assert transcription.clip_id('sessions/x/audios/138928171.WAV') == '138928171'
+    assert transcription.clip_id('138928171.wav') == '138928171'
+
+def test_default_prefix():
+    assert archive_ingest.default_prefix('archives/abc/export.tar.gz') == 'sessions/abc/export'
+    assert archive_ingest.default_prefix('export.ZIP') == 'sessions/export'
@@ -0,0 +1,65 @@
+import numpy as np
+import pytest
+
+import audio_preprocess
+import batching
+
+RATE = 8000
+
+def wav(*parts, rate=RATE, channels=1):
+    """parts: (segundos, amplitud); amplitud 0 es silencio y el resto un tono de 440 Hz"""
+    chunks = []
+    for seconds, amplitude in parts:
+        t = np.arange(int(seconds * rate)) / rate
+        chunks.append(amplitude * np.sin(2 * np.pi * 440 * t))
+    samples = np.repeat(np.concatenate(chunks)[:, None], channels, axis=1)
+    return batching.write_wav((channels, 2, rate), [(samples * 32767).astype('<i2').tobytes()])
+
+def test_trims_edges_and_long_pauses():
+    prepared = audio_preprocess.prepare(wav((1, 0), (1, 0.5), (3, 0), (0.5, 0.5), (1, 0)))
+    assert prepared['original_duration'] == pytest.approx(6.5)
+    assert prepared['speech_seconds'] == pytest.approx(1.5)
+    assert [tuple(round(x, 2) for x in s) for s in prepared['segments']] == [(0.75, 0.0, 1.5), (4.75, 1.5, 1.0)]
+    assert prepared['duration'] == pytest.approx(2.5)
+    (channels, width, rate), frames = batching.read_wav(prepared['audio'])
+    assert (channels, width, rate, len(frames)) == (1, 2, RATE, 2.5 * RATE * 2)
+
+def test_short_pauses_are_kept():
+    prepared = audio_preprocess.prepare(wav((1, 0.5), (0.5, 0), (1, 0.5)))
+    assert prepared['segments'] is None  # Voz de punta a punta y ya en PCM mono 16 bits: se sube tal cual
+    assert prepared['duration'] == pytest.approx(2.5)
+
+def test_clip_without_speech_is_dropped():
+    prepared = audio_preprocess.prepare(wav((2, 0), (0.04, 0.8), (2, 0)))  # Clic de PTT más corto que MIN_RUN_FRAMES
+    assert prepared['audio'] is None
+    assert prepared['duration'] == 0.0
+
+def test_stereo_is_downmixed_and_resampled(monkeypatch):
+    monkeypatch.setattr(audio_preprocess, 'TARGET_RATE', 16000)
+    prepared = audio_preprocess.prepare(wav((1, 0.5), channels=2))
+    (channels, width, rate), frames = batching.read_wav(prepared['audio'])
+    assert (channels, width, rate) == (1, 2, 16000)
+    assert len(frames) == 16000 * 2
+
+def test_unreadable_audio_passes_through():
+    prepared = audio_preprocess.prepare(b'no es un wav')
+    assert prepared['audio'] == b'no es un wav'
+    assert prepared['segments'] is None
+
+def test_shift_results_maps_back_to_source_time():
+    segments = [(0.75, 0.0, 1.5), (4.75, 1.5, 1.0)]
+    results = {'items': [{'start_time': '0.5', 'end_time': '1.0'}, {'start_time': '1.6', 'end_time': '2.4'}, {'type': 'punctuation'}]}
+    items = audio_preprocess.shift_results(results, segments)['items']
+    assert [(i['start_time'], i['end_time']) for i in items[:2]] == [('1.250', '1.750'), ('4.850', '5.650')]
+    assert items[2] == {'type': 'punctuation'}
+
+def test_cache_key_depends_on_vad_settings(monkeypatch):
+    audio = wav((1, 0.5))
+    key = audio_preprocess.cache_key(audio)
+    monkeypatch.setitem(audio_preprocess.SETTINGS, 'threshold_db', -30.0)
+    assert audio_preprocess.cache_key(audio) != key
+    monkeypatch.setattr(audio_preprocess, 'ENABLED', False)
+    unprocessed = audio_preprocess.cache_key(audio)
+    monkeypatch.setitem(audio_preprocess.SETTINGS, 'threshold_db', -60.0)
+    assert audio_preprocess.cache_key(audio) == unprocessed  # Sin VAD sus parámetros no influyen
+    assert unprocessed != key
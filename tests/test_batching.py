@@ -0,0 +1,40 @@
+import batching
+
+def word(content, start, end):
+    return {'type': 'pronunciation', 'start_time': str(start), 'end_time': str(end), 'alternatives': [{'content': content}]}
+
+def punctuation(content):
+    return {'type': 'punctuation', 'alternatives': [{'content': content}]}
+
+SEGMENTS = [
+    {'audio_key': 'a.wav', 'start': 0.0, 'end': 5.0},
+    {'audio_key': 'b.wav', 'start': 6.0, 'end': 10.0},
+]
+
+def test_split_results_relative_timestamps():
+    results = {'items': [word('Copiado', 1.0, 1.5), punctuation(','), word('cambio', 7.25, 7.75), punctuation('.')]}
+    split = batching.split_results(results, SEGMENTS)
+    assert split['a.wav']['transcripts'][0]['transcript'] == 'Copiado,'
+    assert split['b.wav']['transcripts'][0]['transcript'] == 'cambio.'
+    assert split['b.wav']['items'][0]['start_time'] == '1.250'
+    assert split['b.wav']['items'][0]['end_time'] == '1.750'
+
+def test_split_results_word_on_boundary_goes_to_next_clip():
+    split = batching.split_results({'items': [word('fin', 4.5, 5.0), word('inicio', 6.0, 6.5)]}, SEGMENTS)
+    assert [i['alternatives'][0]['content'] for i in split['a.wav']['items']] == ['fin']
+    assert [i['alternatives'][0]['content'] for i in split['b.wav']['items']] == ['inicio']
+    assert split['b.wav']['items'][0]['start_time'] == '0.000'
+
+def test_split_results_padding_stays_with_previous_clip():
+    split = batching.split_results({'items': [word('eco', 5.5, 5.9)]}, SEGMENTS)
+    assert split['a.wav']['items'][0]['start_time'] == '5.500'
+    assert split['b.wav']['items'] == []
+
+def test_split_results_leading_punctuation_dropped():
+    split = batching.split_results({'items': [punctuation('.'), word('hola', 0.5, 0.9)]}, SEGMENTS)
+    assert split['a.wav']['transcripts'][0]['transcript'] == 'hola'
+
+def test_split_results_failed_batch_and_single_clip():
+    assert batching.split_results(None, SEGMENTS) == {'a.wav': None, 'b.wav': None}
+    results = {'items': [word('hola', 0.5, 0.9)]}
+    assert batching.split_results(results, [{'audio_key': 'c.wav', 'start': 0.0, 'end': None}]) == {'c.wav': results}
@@ -0,0 +1,116 @@
+import json
+
+import pytest
+
+import analytics_store
+import audio_preprocess
+import batch_inference
+import bulk_reprocess
+import dataset
+import evaluation_cache
+import fakes
+import job_store
+import transcription_cache
+
+WORDS = ['Central', 'a', 'móvil', 'uno', 'adelante']
+
+def results(text_words=WORDS):
+    items = [{'type': 'pronunciation', 'start_time': f'{0.3 * i:.2f}', 'end_time': f'{0.3 * i + 0.25:.2f}',
+              'alternatives': [{'content': w, 'confidence': '0.9'}]} for i, w in enumerate(text_words)]
+    return {'transcripts': [{'transcript': ' '.join(text_words)}], 'items': items}
+
+@pytest.fixture
+def runtime():
+    return fakes.FakeBedrock(fakes.SimClock(0.0001))
+
+@pytest.fixture
+def export(s3):
+    """Un export del grabador con las transcripciones de sus clips en el caché"""
+    audio_keys, _ = dataset.synthetic_session(s3, 'exports/e1', 4, dataset.load_fixtures())
+    cache = transcription_cache.TranscriptionCache(s3, 'bucket')
+    for key in audio_keys:
+        cache.put(audio_preprocess.cache_key(s3.read(key)), results())
+    cache.save()
+    return audio_keys
+
+def bulk(s3, runtime, tmp_path, run='r1'):
+    return bulk_reprocess.BulkRun(run, s3, 'bucket', s3, 'bucket', job_store.S3JobStore(s3, 'bucket', min_interval=0),
+                                  analytics_store.LocalAnalyticsStore(str(tmp_path / 'analytics.sqlite')),
+                                  batch_inference.LocalBatch(s3, 'bucket', runtime, max_parallel=2), runtime)
+
+def test_batch_records_round_trip(s3, runtime):
+    records = [batch_inference.record(f'r{i}', f'Participantes: A\nsesión {i}') for i in range(3)]
+    batch_inference.write_input(s3, 'bucket', 'bulk/in/part-0.jsonl', records)
+    local = batch_inference.LocalBatch(s3, 'bucket', runtime)
+    job_arn = local.submit('prueba', 'modelo', 'bulk/in/part-0.jsonl', 'bulk/out/')
+    assert local.status(job_arn) == ('Completed', None)
+    key = batch_inference.output_key('bulk/out/', job_arn, 'bulk/in/part-0.jsonl')
+    assert key == f'bulk/out/{batch_inference.job_id(job_arn)}/part-0.jsonl.out'
+    outputs = batch_inference.read_output(s3, 'bucket', key)
+    assert sorted(outputs) == ['r0', 'r1', 'r2']
+    text, usage, error = outputs['r0']
+    assert json.loads(text)['score'] and usage['input_tokens'] and error is None
+    assert runtime.calls['InvokeModel'] == 3
+
+def test_failed_record_keeps_the_rest_of_the_batch(s3, runtime):
+    invoke = runtime.invoke_model
+
+    def failing(modelId, body, **kwargs):
+        if 'falla' in body:
+            raise RuntimeError('modelo no disponible')
+        return invoke(modelId=modelId, body=body, **kwargs)
+    runtime.invoke_model = failing
+    batch_inference.write_input(s3, 'bucket', 'in.jsonl', [batch_inference.record('ok', 'bien'), batch_inference.record('ko', 'falla')])
+    local = batch_inference.LocalBatch(s3, 'bucket', runtime)
+    outputs = batch_inference.read_output(s3, 'bucket', batch_inference.output_key('out', local.submit('p', 'm', 'in.jsonl', 'out'), 'in.jsonl'))
+    assert outputs['ok'][0] is not None
+    assert outputs['ko'][0] is None and outputs['ko'][2]['errorMessage'] == 'modelo no disponible'
+
+def test_bulk_run_evaluates_and_resumes(s3, runtime, export, tmp_path):
+    run = bulk(s3, runtime, tmp_path)
+    run.discover('exports/')
+    [job_id] = run.progress['sessions']
+    assert run.progress['sessions'][job_id]['status'] == 'pending'
+    run.submit()
+    assert run.refresh() == 0
+    run.ingest()
+    state = run.progress['sessions'][job_id]
+    assert (state['status'], state['source'], state['reasks']) == ('done', 'batch', 0)
+    record = run.jobs.get(job_id)
+    assert record['status'] == 'done' and record['audio_keys'] == sorted(export)
+    assert run.jobs.get_result(job_id)['evaluation']['score'] == state['score']
+
+    # La clave del caché de evaluaciones es la misma que usa analyze_session
+    info = json.loads(s3.read(run._session_key(job_id)))
+    session = bulk_reprocess.Session(s3, 'bucket', run.cache, info['audio_keys'], info['xml_keys'], info['hashes'])
+    assert session.cache_key == evaluation_cache.session_key(bulk_reprocess.MODEL_ID, bulk_reprocess.SESSION_PROMPT, session.transcript_entries,
+                                                              session.intervention_entries, session.total_duration)
+    assert evaluation_cache.EvaluationCache(s3, 'bucket').get(session.cache_key) is not None
+
+    # Volver a correr el mismo comando no rearma sesiones ni reenvía archivos
+    calls = runtime.calls['InvokeModel']
+    again = bulk(s3, runtime, tmp_path)
+    again.discover('exports/')
+    again.submit()
+    again.refresh()
+    again.ingest()
+    assert runtime.calls['InvokeModel'] == calls
+    assert len(again.progress['files']) == 1
+
+def test_other_run_resolves_from_evaluation_cache(s3, runtime, export, tmp_path):
+    first = bulk(s3, runtime, tmp_path)
+    first.discover('exports/')
+    first.submit()
+    first.refresh()
+    first.ingest()
+    second = bulk(s3, runtime, tmp_path, run='r2')
+    second.discover('exports/')
+    assert [s['source'] for s in second.progress['sessions'].values()] == ['cache']
+    assert second.progress['files'] == []
+
+def test_session_without_cached_transcriptions_is_skipped(s3, runtime, tmp_path):
+    dataset.synthetic_session(s3, 'exports/e1', 3, dataset.load_fixtures())
+    run = bulk(s3, runtime, tmp_path)
+    run.discover('exports/')
+    assert [s['status'] for s in run.progress['sessions'].values()] == ['skipped']
+    assert runtime.calls['InvokeModel'] == 0
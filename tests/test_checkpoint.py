@@ -0,0 +1,51 @@
+import pytest
+
+import checkpoint
+import job_store
+
+@pytest.fixture
+def jobs():
+    return job_store.MemoryJobStore(min_interval=0)
+
+def test_resume_keeps_clip_state_and_live_jobs(jobs):
+    first = checkpoint.JobCheckpoint(jobs, 'j1', min_interval=0)
+    assert first.invocation == 0
+    first.mark_running('job-a', 'batches/a.wav', {'a.wav': {'hash': 'ha', 'vad': None}, 'b.wav': {'hash': 'hb', 'vad': None}},
+                       segments=[{'audio_key': 'a.wav', 'start': 0, 'end': 4}, {'audio_key': 'b.wav', 'start': 5, 'end': 9}])
+    first.mark_running('job-c', 'c.wav', {'c.wav': {'hash': 'hc', 'vad': None}})
+    first.mark_done('c.wav', 'hc')
+    first.mark_failed('d.wav')
+
+    resumed = checkpoint.JobCheckpoint(jobs, 'j1')
+    assert resumed.invocation == 1
+    assert sorted(resumed.keys('running')) == ['a.wav', 'b.wav']
+    assert resumed.keys('done') == ['c.wav'] and resumed.keys('failed') == ['d.wav']
+    assert resumed.clips['c.wav']['output'] == 'cache/transcriptions/hc.json'
+    assert resumed.clips['a.wav']['output'] == 'transcriptions/job-a.json'
+    # job-c ya se resolvió: solo queda el lote en vuelo, con los rangos para repartir su salida
+    assert list(resumed.running()) == ['job-a']
+    assert resumed.running()['job-a']['media'] == 'batches/a.wav'
+
+def test_checkpoint_of_another_run_is_ignored(jobs):
+    first = checkpoint.JobCheckpoint(jobs, 'j1', min_interval=0)
+    first.mark_done('a.wav', 'ha')
+    appended = checkpoint.JobCheckpoint(jobs, 'j1', run=1)
+    assert (appended.invocation, appended.clips, appended.transcribe_jobs) == (0, {}, {})
+
+def test_saves_are_throttled(jobs, manual_clock):
+    manual_clock.patch(checkpoint)
+    writes = []
+    jobs.put_checkpoint = lambda job_id, data: writes.append(data)
+    state = checkpoint.JobCheckpoint(jobs, 'j1', min_interval=10)
+    state.mark_done('a.wav', 'ha')
+    state.mark_done('b.wav', 'hb')
+    assert len(writes) == 1
+    manual_clock.advance(10)
+    state.mark_done('c.wav', 'hc')
+    assert len(writes) == 2
+    state.save()
+    state.save()
+    assert len(writes) == 2  # Sin cambios desde la última escritura
+    state.mark_failed('d.wav')
+    state.save()  # Antes de cortar la ejecución se escribe aunque no haya pasado el intervalo
+    assert len(writes) == 3 and writes[-1]['clips']['d.wav'] == {'status': 'failed'}
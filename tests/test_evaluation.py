@@ -0,0 +1,44 @@
+import evaluation
+
+def feed_chars(text):
+    parser = evaluation.PartialJSON()
+    for c in text:
+        parser.feed(c)
+    return parser
+
+def test_partial_json_ignores_text_around_object():
+    parser = evaluation.PartialJSON()
+    parser.feed('Aquí está la evaluación:\n{"score": 8, "justification": "ok"}\nSaludos {')
+    assert parser.done
+    assert parser.partial() == {'score': 8, 'justification': 'ok'}
+
+def test_partial_json_skips_stray_brace_before_object():
+    parser = evaluation.PartialJSON()
+    parser.feed('Uso el formato {score} pedido: {"score": 8, "claridad": 7}')
+    assert parser.partial() == {'score': 8, 'claridad': 7}
+
+def test_partial_json_skips_unclosed_stray_brace():
+    parser = evaluation.PartialJSON()
+    parser.feed('Abro { y sigo: {"score": 8}')
+    assert parser.partial() == {'score': 8}
+
+def test_partial_json_stray_brace_split_across_chunks():
+    assert feed_chars('Pre {x} {"score": 9, "z": "a}b"}').partial() == {'score': 9, 'z': 'a}b'}
+
+def test_partial_json_truncated_keeps_complete_members():
+    parser = feed_chars('{"score": 7, "b": [1, 2], "analisis_por_operador": {"Ana": {"score": 6}, "Luis": {"sc')
+    assert not parser.done
+    assert parser.partial() == {'score': 7, 'b': [1, 2], 'analisis_por_operador': {'Ana': {'score': 6}}}
+
+def test_partial_json_reset_discards_previous_attempt():
+    parser = evaluation.PartialJSON()
+    parser.feed('{"score": 3, "claridad"')
+    parser.reset()
+    parser.feed('{"score": 9}')
+    assert parser.partial() == {'score': 9}
+
+def test_parse_repairs_score_and_reports_missing():
+    result, missing = evaluation.parse('{"fraseologia": 8, "claridad": 6, "protocolo": 7, "formalidad": 9}')
+    assert result['score'] == 7.5
+    assert result['errores_detectados'] == []
+    assert missing == ['justification']
@@ -0,0 +1,68 @@
+import pytest
+
+import cache_index
+import evaluation_cache
+import lexicon
+import prompt_builder
+
+@pytest.fixture
+def cache(s3, manual_clock):
+    manual_clock.patch(evaluation_cache, cache_index)
+    return evaluation_cache.EvaluationCache(s3, 'bucket', max_entries=2, ttl_seconds=100, max_persisted=3)
+
+def persisted(s3):
+    return sorted(k for k in s3.objects if k.startswith('cache/evaluations/') and not k.endswith('index.json'))
+
+def test_cache_key_ignores_whitespace():
+    first = evaluation_cache.cache_key('m', 'plantilla', 'Copiado,   cambio\n\n  Recibido ')
+    assert first == evaluation_cache.cache_key('m', 'plantilla', 'Copiado, cambio\nRecibido')
+    assert first != evaluation_cache.cache_key('m', 'plantilla v2', 'Copiado, cambio\nRecibido')
+
+def test_session_key_covers_metadata_and_lexicon(monkeypatch):
+    template = prompt_builder.load('session', 'v4')
+    transcript = [{'text': '+0:00 A: Copiado'}]
+    interventions = [{'speaker': 'Ana', 'text': 'Ana 3s'}]
+    key = evaluation_cache.session_key('m', template, transcript, interventions, 10)
+    assert key == evaluation_cache.session_key('m', template, transcript, interventions, 10)
+    assert key != evaluation_cache.session_key('m', template, transcript, interventions, 11)
+    monkeypatch.setattr(lexicon, 'FINGERPRINT', 'otro')
+    assert key != evaluation_cache.session_key('m', template, transcript, interventions, 10)
+
+def test_memory_tier_lru_and_ttl(manual_clock):
+    manual_clock.patch(evaluation_cache)
+    cache = evaluation_cache.EvaluationCache(max_entries=2, ttl_seconds=100)
+    cache.put('a', {'score': 1})
+    cache.put('b', {'score': 2})
+    cache.get('a')
+    cache.put('c', {'score': 3})  # Desaloja b, el menos usado
+    assert cache.get('b') is None
+    assert cache.get('a') == {'score': 1}
+    manual_clock.advance(101)
+    assert cache.get('a') is None
+
+def test_persisted_entry_shared_between_containers(s3, cache):
+    cache.put('a', {'score': 7})
+    other = evaluation_cache.EvaluationCache(s3, 'bucket', ttl_seconds=100)
+    assert other.get('a') == {'score': 7}
+
+def test_expired_entry_deleted_when_read(s3, cache, manual_clock):
+    cache.put('a', {'score': 7})
+    manual_clock.advance(101)
+    other = evaluation_cache.EvaluationCache(s3, 'bucket', ttl_seconds=100)
+    assert other.get('a') is None
+    assert persisted(s3) == []
+
+def test_persisted_tier_bounded_by_index(s3, cache, manual_clock):
+    for key in ('a', 'b', 'c'):
+        cache.put(key, {'score': 1})
+        manual_clock.advance(1)
+    cache._memory.clear()
+    assert cache.get('a')  # a pasa a ser la usada más recientemente
+    cache.put('d', {'score': 1})
+    assert persisted(s3) == ['cache/evaluations/a.json', 'cache/evaluations/c.json', 'cache/evaluations/d.json']
+
+def test_entries_never_read_again_expire(s3, cache, manual_clock):
+    cache.put('a', {'score': 1})
+    manual_clock.advance(101)
+    cache.put('b', {'score': 1})
+    assert persisted(s3) == ['cache/evaluations/b.json']
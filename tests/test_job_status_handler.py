@@ -0,0 +1,57 @@
+import json
+
+import pytest
+
+import job_store
+
+@pytest.fixture
+def store(s3):
+    return job_store.S3JobStore(s3, 'bucket', min_interval=0)
+
+@pytest.fixture
+def job_status(monkeypatch, store):
+    monkeypatch.setenv('AUDIO_BUCKET', 'bucket')
+    import job_status_handler
+    monkeypatch.setattr(job_status_handler, 'jobs', store)
+    return job_status_handler
+
+def get(handler, job_id='j1', cursor=None, etag=None):
+    response = handler.handler({'pathParameters': {'job_id': job_id},
+                                'queryStringParameters': {'cursor': cursor} if cursor is not None else None,
+                                'headers': {'If-None-Match': etag} if etag else {}}, None)
+    return response['statusCode'], json.loads(response['body'] or 'null'), (response['headers'] or {}).get('ETag')
+
+def test_unchanged_record_returns_304(job_status, store):
+    store.create('j1', {'job_id': 'j1', 'status': 'processing'})
+    status, body, etag = get(job_status)
+    assert (status, body['status']) == (200, 'processing')
+    assert get(job_status, etag=etag)[:2] == (304, None)
+    store.update('j1', {'progress': 3})
+    status, body, new_etag = get(job_status, etag=etag)
+    assert (status, body['progress']) == (200, 3)
+    assert new_etag != etag
+
+def test_cursor_returns_only_new_clips(job_status, store):
+    store.create('j1', {'job_id': 'j1', 'status': 'processing'})
+    store.publish_clips('j1', [{'clip': 'a'}, {'clip': 'b'}])
+    store.publish_clips('j1', [{'clip': 'c'}])
+    status, body, etag = get(job_status, cursor='0')
+    assert [c['clip'] for c in body['clips']] == ['a', 'b', 'c']
+    assert body['next_cursor'] == '2'
+    assert get(job_status, cursor='1', etag=etag)[0] == 200  # El ETag depende del cursor
+    store.publish_clips('j1', [{'clip': 'd'}])
+    status, body, _ = get(job_status, cursor=body['next_cursor'])
+    assert ([c['clip'] for c in body['clips']], body['next_cursor']) == (['d'], '3')
+    assert get(job_status, cursor='99')[1]['clips'] == []
+
+def test_result_attached_when_done(job_status, store):
+    store.create('j1', {'job_id': 'j1', 'status': 'processing'})
+    assert 'result' not in get(job_status)[1]
+    store.put_result('j1', {'score': 8})
+    store.update('j1', {'status': 'done'})
+    assert get(job_status)[1]['result'] == {'score': 8}
+
+def test_errors(job_status):
+    assert get(job_status, job_id='no-existe')[:2] == (404, {'error': 'Job no encontrado'})
+    assert get(job_status, cursor='-1')[:2] == (400, {'error': 'cursor inválido'})
+    assert get(job_status, job_id=None)[0] == 400
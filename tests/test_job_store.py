@@ -0,0 +1,82 @@
+import pytest
+
+import job_store
+
+@pytest.fixture
+def stores(s3):
+    """Dos invocaciones con su propio registro conocido sobre el mismo bucket"""
+    return job_store.S3JobStore(s3, 'bucket', min_interval=0), job_store.S3JobStore(s3, 'bucket', min_interval=0)
+
+def pages(s3, job_id):
+    return sorted(k for k in s3.objects if k.startswith(f'jobs/{job_id}/clips/'))
+
+def test_primitives_are_abstract():
+    with pytest.raises(TypeError):
+        job_store.JobStore()
+
+def test_create_is_conditional(stores):
+    first, second = stores
+    first.create('j1', {'job_id': 'j1', 'status': 'pending'})
+    with pytest.raises(job_store.VersionConflict):
+        second.create('j1', {'job_id': 'j1', 'status': 'pending'})
+
+def test_progress_coalesced_until_interval_or_status(s3):
+    store = job_store.S3JobStore(s3, 'bucket', min_interval=3600)
+    store.create('j1', {'job_id': 'j1', 'status': 'processing'})
+    writes = s3.calls['PutObject']
+    store.update('j1', {'progress': 1})
+    store.update('j1', {'progress': 2})
+    assert s3.calls['PutObject'] == writes
+    assert store.get('j1').get('progress') is None
+    store.update('j1', {'status': 'done'})
+    assert store.get('j1') == {'job_id': 'j1', 'status': 'done', 'progress': 2}
+    assert s3.calls['PutObject'] == writes + 1
+
+def test_update_reapplies_pending_after_conflict(stores):
+    first, second = stores
+    first.create('j1', {'job_id': 'j1', 'status': 'processing'})
+    second.update('j1', {'appended': 1})
+    first.update('j1', {'progress': 5})  # Su versión conocida es vieja: relee y vuelve a aplicar
+    assert first.get('j1') == {'job_id': 'j1', 'status': 'processing', 'appended': 1, 'progress': 5}
+
+def test_clip_pages_and_cursor(stores):
+    store = stores[0]
+    store.create('j1', {'job_id': 'j1', 'status': 'processing'})
+    store.publish_clips('j1', [{'clip': 'a'}])
+    store.publish_clips('j1', [{'clip': 'b'}, {'clip': 'c'}])
+    record = store.get('j1')
+    assert (record['clip_pages'], record['clips_published']) == (2, 3)
+    assert store.get_clips('j1', 1, 2) == [{'clip': 'b'}, {'clip': 'c'}]
+
+def test_stale_writer_does_not_overwrite_published_page(s3, stores):
+    first, second = stores
+    first.create('j1', {'job_id': 'j1', 'status': 'processing'})
+    first.publish_clips('j1', [{'clip': 'a'}])
+    second.update('j1', {'note': 1})  # second conoce clip_pages=1
+    first.publish_clips('j1', [{'clip': 'b'}])  # Publica la página 1
+    second.publish_clips('j1', [{'clip': 'c'}])  # Con su registro viejo también iría a la página 1
+    assert pages(s3, 'j1') == ['jobs/j1/clips/00000.json', 'jobs/j1/clips/00001.json', 'jobs/j1/clips/00002.json']
+    assert first.get_clips('j1', 0, first.get('j1')['clip_pages']) == [{'clip': 'a'}, {'clip': 'b'}, {'clip': 'c'}]
+
+def test_record_conflict_reuses_own_page(s3, stores):
+    first, second = stores
+    first.create('j1', {'job_id': 'j1', 'status': 'processing'})
+    second.update('j1', {'note': 1})  # Sin clips: la página 0 sigue libre pero el registro de first está viejo
+    first.publish_clips('j1', [{'clip': 'a'}])
+    assert pages(s3, 'j1') == ['jobs/j1/clips/00000.json']
+    assert first.get('j1') == {'job_id': 'j1', 'status': 'processing', 'note': 1, 'clip_pages': 1, 'clips_published': 1}
+
+def test_claim_only_from_expected_status(stores):
+    first, second = stores
+    first.create('j1', {'job_id': 'j1', 'status': 'pending'})
+    assert first.claim('j1', ('pending',), lambda record: {'status': 'processing'})['status'] == 'processing'
+    assert second.claim('j1', ('pending',), lambda record: {'status': 'processing'}) is None
+
+@pytest.mark.parametrize('backend', ['memory', 'file'])
+def test_local_backends(tmp_path, backend):
+    store = job_store.MemoryJobStore(min_interval=0) if backend == 'memory' else job_store.LocalFileJobStore(str(tmp_path), min_interval=0)
+    store.create('j1', {'job_id': 'j1', 'status': 'pending'})
+    store.publish_clips('j1', [{'clip': 'a'}])
+    with pytest.raises(job_store.VersionConflict):
+        store._write(job_store.clips_key('j1', 0), [{'clip': 'x'}], None)
+    assert store.get_clips('j1', 0, 1) == [{'clip': 'a'}]
@@ -0,0 +1,47 @@
+from collections import Counter
+
+import lexicon
+
+def test_matcher_overlapping_patterns():
+    matcher = lexicon.Matcher()
+    for phrase in ('a b', 'b c', 'b'):
+        matcher.add(phrase, phrase)
+    matcher.build()
+    assert sorted(matcher.scan(['a', 'b', 'c'])) == [(1, 'a b'), (1, 'b'), (2, 'b c')]
+
+def test_matcher_none_breaks_patterns():
+    matcher = lexicon.Matcher()
+    matcher.add('a b', 'ab')
+    matcher.build()
+    assert list(matcher.scan(['a', None, 'b'])) == []
+    assert list(matcher.scan(['x', 'a', 'b'])) == [(2, 'ab')]
+
+def test_scan_counts_per_text_without_crossing_texts():
+    first, second = lexicon.scan(['Copiado copiado', 'copiado'])
+    assert first[('repeticion', None, 'copiado')] == 1
+    assert first[('oficial', 'confirmación', 'copiado')] == 2
+    assert ('repeticion', None, 'copiado') not in second
+
+def test_summarize_penalties():
+    report = lexicon.summarize(lexicon.scan(['Copiado pecho, dale']))
+    assert report['terminos']['apodo'] == ['pecho']
+    assert report['terminos']['coloquial'] == ['dale']
+    assert report['faltantes'] == ['solicitud', 'verificación']
+    assert report['fraseologia'] == 10 - 3 - 2 * 2
+    assert report['formalidad'] == 10 - 3 - 3
+
+def test_summarize_clean_session():
+    report = lexicon.summarize(lexicon.scan(['Solicito vía libre', 'Confirme posición', 'Afirmativo, recibido']))
+    assert report == dict(report, fraseologia=10, formalidad=10, faltantes=[], errores=[])
+
+def test_summarize_accents_and_floor():
+    report = lexicon.summarize([Counter()] + lexicon.scan(['Vos, che, fijate amigo flaco pecho claudito']))
+    assert report['terminos']['tuteo'] == ['che', 'fijate', 'vos']
+    assert report['fraseologia'] == 0
+    assert report['formalidad'] == 0
+
+def test_is_trivial():
+    assert lexicon.is_trivial(['Copiado, cambio'])
+    assert lexicon.is_trivial([''])
+    assert not lexicon.is_trivial(['Sí'])
+    assert not lexicon.is_trivial(['No, hay una demora en la vía'])
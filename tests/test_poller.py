@@ -0,0 +1,86 @@
+import pytest
+
+import poller
+import rate_limit
+
+class StubTranscribe:
+    """Estados fijados por la prueba; list_transcription_jobs pagina de a page_size"""
+    def __init__(self, page_size=2):
+        self.status, self.reasons, self.page_size = {}, {}, page_size
+        self.gets = self.lists = 0
+
+    def _summary(self, name):
+        return {'TranscriptionJobName': name, 'TranscriptionJobStatus': self.status[name], 'FailureReason': self.reasons.get(name)}
+
+    def get_transcription_job(self, TranscriptionJobName):
+        self.gets += 1
+        return {'TranscriptionJob': self._summary(TranscriptionJobName)}
+
+    def list_transcription_jobs(self, JobNameContains, MaxResults, NextToken=None):
+        self.lists += 1
+        names = sorted(n for n in self.status if JobNameContains in n)
+        start = int(NextToken or 0)
+        page = {'TranscriptionJobSummaries': [self._summary(n) for n in names[start:start + self.page_size]]}
+        if start + self.page_size < len(names):
+            page['NextToken'] = str(start + self.page_size)
+        return page
+
+@pytest.fixture
+def transcribe():
+    return StubTranscribe()
+
+@pytest.fixture
+def job_poller(transcribe, manual_clock):
+    return poller.TranscribePoller(transcribe, 'job', clock=manual_clock.monotonic, sleep=manual_clock.sleep)
+
+def test_single_job_first_check_scales_with_duration(job_poller, transcribe, manual_clock):
+    start = manual_clock.now
+    transcribe.status['job-1'] = 'IN_PROGRESS'
+    job_poller.add('job-1', duration=40)
+    assert job_poller.poll() == []
+    assert manual_clock.now - start == poller.MIN_DELAY + 40 * poller.SECONDS_PER_AUDIO_SECOND
+    transcribe.status['job-1'], transcribe.reasons['job-1'] = 'FAILED', 'Audio inválido'
+    assert job_poller.poll() == [('job-1', 'FAILED', 'Audio inválido')]
+    assert (transcribe.gets, transcribe.lists, len(job_poller)) == (2, 0, 0)
+
+def test_many_jobs_use_paginated_listing(job_poller, transcribe):
+    for i in range(5):
+        transcribe.status[f'job-{i}'] = 'COMPLETED' if i % 2 else 'IN_PROGRESS'
+        job_poller.add(f'job-{i}', duration=4)
+    job_poller.add('job-new', duration=4)  # Todavía no aparece en el listado
+    finished = job_poller.poll()
+    assert sorted(name for name, _, _ in finished) == ['job-1', 'job-3']
+    assert (transcribe.gets, transcribe.lists) == (0, 3)
+    assert sorted(job_poller.jobs) == ['job-0', 'job-2', 'job-4', 'job-new']
+
+def test_backoff_grows_and_is_capped(job_poller, transcribe, monkeypatch):
+    monkeypatch.setattr(poller.random, 'uniform', lambda low, high: high)
+    transcribe.status['job-1'] = 'IN_PROGRESS'
+    job_poller.add('job-1', duration=0)
+    delays = []
+    for _ in range(6):
+        job_poller.poll()
+        delays.append(job_poller.jobs['job-1']['next_check'] - job_poller.clock())
+    assert delays == [4.0, 8.0, 16.0, 20.0, 20.0, 20.0]
+
+def test_deadline_reports_failed(job_poller, transcribe, manual_clock):
+    transcribe.status['job-1'] = 'IN_PROGRESS'
+    job_poller.add('job-1', duration=10)
+    manual_clock.advance(poller.deadline_seconds(10) + 1)
+    assert job_poller.poll() == [('job-1', 'FAILED', 'Deadline de transcripción excedido')]
+
+def test_max_wait_returns_without_calls(job_poller, transcribe):
+    transcribe.status['job-1'] = 'COMPLETED'
+    job_poller.add('job-1', duration=60)
+    assert job_poller.poll(max_wait=1) == []
+    assert transcribe.gets == 0
+    job_poller.add('job-2', resumed=True)  # Lanzado por una ejecución anterior: se consulta enseguida
+    transcribe.status['job-2'] = 'COMPLETED'
+    assert job_poller.poll(max_wait=1) == [('job-2', 'COMPLETED', None)]
+
+def test_finished_jobs_release_their_slot(job_poller, transcribe):
+    slots = rate_limit.semaphore('transcribe')
+    assert slots.try_acquire('job-1', 600)
+    transcribe.status['job-1'] = 'COMPLETED'
+    assert job_poller.wait_for('job-1') == ('COMPLETED', None)
+    assert 'job-1' not in (slots.store.read(slots.key)[0] or {}).get('holders', {})
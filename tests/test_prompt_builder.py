@@ -0,0 +1,25 @@
+import pytest
+
+import lexicon
+import prompt_builder
+
+@pytest.mark.parametrize('name', ['session', 'session_delta', 'clip'])
+def test_latest_templates_treat_lexicon_as_evidence(name):
+    template = prompt_builder.load(name, prompt_builder.versions(name)[-1])
+    assert 'hechos' in template.fields
+    assert 'sin recalcularlos' not in template.text
+    assert 'evidencia' in template.text
+
+def test_versions_sorted_numerically():
+    assert prompt_builder.versions('session')[:4] == ['v1', 'v2', 'v3', 'v4']
+
+def test_model_scores_kept_unless_override(monkeypatch):
+    entries = [{'time': None, 'speaker': 'Ana', 'duration': 3, 'text': 'Copiado pecho', 'words': 'Copiado pecho'}]
+    prompt = prompt_builder.SessionPrompt(prompt_builder.load('session', 'v4'), entries, [])
+    result = {'score': 8, 'fraseologia': 9, 'claridad': 8, 'protocolo': 7, 'formalidad': 8}
+    monkeypatch.setattr(lexicon, 'OVERRIDE_SCORES', False)
+    assert not prompt.local_scores
+    assert prompt.expand(dict(result))['fraseologia'] == 9
+    monkeypatch.setattr(lexicon, 'OVERRIDE_SCORES', True)
+    assert prompt.local_scores
+    assert prompt.expand(dict(result))['fraseologia'] < 9
@@ -0,0 +1,92 @@
+import pytest
+
+import rate_limit
+
+class FakeClock:
+    """Reemplaza el módulo time de rate_limit: sleep avanza el reloj en lugar de esperar"""
+    def __init__(self, now=1000.0):
+        self.now, self.slept = now, []
+
+    def time(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.slept.append(seconds)
+        self.now += seconds
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(rate_limit, 'time', clock)
+    return clock
+
+def state(store, key):
+    return store.read(key)[0]
+
+def test_acquire_spends_local_reserve(clock):
+    store = rate_limit.MemoryLimitStore()
+    limiter = rate_limit.RateLimiter(store, 'test', rate=10)
+    for _ in range(10):
+        assert limiter.acquire() == 0.0
+    # Una sola escritura: la primera toma LEASE_SECONDS de tasa y las demás la gastan localmente
+    assert store.read(limiter.key)[1] == 1
+    assert state(store, limiter.key)['tokens'] == 40 - 10
+
+def test_acquire_waits_for_refill(clock):
+    limiter = rate_limit.RateLimiter(rate_limit.MemoryLimitStore(), 'test', rate=10)
+    assert limiter.acquire(50) == 0.0  # Más que la capacidad: pasa y deja el bucket en negativo
+    waited = limiter.acquire(1)
+    assert waited >= 1.1
+    assert clock.slept
+
+def test_limiters_share_bucket(clock):
+    store = rate_limit.MemoryLimitStore()
+    first, second = rate_limit.RateLimiter(store, 'test', rate=10), rate_limit.RateLimiter(store, 'test', rate=10)
+    first.acquire(40)
+    assert second.acquire(1) > 0
+
+def test_throttled_halves_rate_once_per_cooldown(clock):
+    store = rate_limit.MemoryLimitStore()
+    first, second = rate_limit.RateLimiter(store, 'test', rate=10), rate_limit.RateLimiter(store, 'test', rate=10)
+    first.acquire()
+    first.throttled()
+    second.throttled()  # El mismo pico visto por otra invocación
+    assert state(store, first.key)['rate'] == 5
+    assert state(store, first.key)['tokens'] <= 0
+    assert first._reserve == 0
+    clock.now += rate_limit.COOLDOWN_SECONDS
+    second.throttled()
+    assert state(store, first.key)['rate'] == pytest.approx((5 + 10 * rate_limit.COOLDOWN_SECONDS / rate_limit.RECOVERY_SECONDS) / 2)
+
+def test_rate_recovers_linearly(clock):
+    store = rate_limit.MemoryLimitStore()
+    limiter = rate_limit.RateLimiter(store, 'test', rate=10)
+    limiter.throttled()
+    current = state(store, limiter.key)
+    assert limiter._rate(current, clock.now + rate_limit.RECOVERY_SECONDS / 4) == pytest.approx(5 + 2.5)
+    assert limiter._rate(current, clock.now + rate_limit.RECOVERY_SECONDS) == 10
+
+def test_version_conflict():
+    store = rate_limit.MemoryLimitStore()
+    store.write('k', {'a': 1}, None)
+    with pytest.raises(rate_limit.VersionConflict):
+        store.write('k', {'a': 2}, None)
+    store.write('k', {'a': 2}, 1)
+    assert store.read('k') == ({'a': 2}, 2)
+
+def test_semaphore_limit_and_release(clock):
+    semaphore = rate_limit.Semaphore(rate_limit.MemoryLimitStore(), 'test', limit=2)
+    assert semaphore.try_acquire('job-1', 60)
+    assert semaphore.try_acquire('job-2', 60)
+    assert not semaphore.try_acquire('job-3', 60)
+    assert semaphore.try_acquire('job-1', 60)  # Renovar el propio cupo no necesita uno libre
+    semaphore.release(['job-1', 'otro'])
+    assert semaphore.try_acquire('job-3', 60)
+
+def test_semaphore_lease_expires(clock):
+    semaphore = rate_limit.Semaphore(rate_limit.MemoryLimitStore(), 'test', limit=1)
+    assert semaphore.try_acquire('job-1', 60)
+    assert not semaphore.try_acquire('job-2', 60)
+    clock.now += 61
+    assert semaphore.try_acquire('job-2', 60)
+    assert list(state(semaphore.store, semaphore.key)['holders']) == ['job-2']
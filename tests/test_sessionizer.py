@@ -0,0 +1,41 @@
+from datetime import datetime
+
+import sessionizer
+import tetra_metadata
+
+def call(call_id, called_id, start, duration):
+    return {'id': call_id, 'called_id': called_id, 'duration': duration, 'start_dt': datetime(2024, 5, 2, *start)}
+
+METADATA = tetra_metadata.SessionMetadata({}, {
+    'T1': call('1', 'G1', (10, 0, 0), 30),
+    'T2': call('2', 'G1', (10, 2, 30), 10),  # 120 s después del fin de T1: misma sesión
+    'T3': call('3', 'G1', (10, 4, 41), 10),  # 121 s después: sesión nueva
+    'T4': call('4', 'G2', (10, 1, 0), 5),
+    'T5': dict(call('5', 'G2', (10, 1, 0), 5), start_dt=None),
+}, [])
+
+def test_group_calls_by_talk_group_and_gap():
+    sessions = sessionizer.group_calls(METADATA, gap_seconds=120)
+    assert [(s['talk_group'], s['call_refs']) for s in sessions] == [('G1', ['T1', 'T2']), ('G2', ['T4']), ('G1', ['T3'])]
+    assert sessions[0]['end'] == datetime(2024, 5, 2, 10, 2, 40)
+
+def test_group_calls_long_call_covers_next():
+    metadata = tetra_metadata.SessionMetadata({}, {
+        'A': call('1', 'G1', (10, 0, 0), 600),
+        'B': call('2', 'G1', (10, 1, 0), 10),
+        'C': call('3', 'G1', (10, 11, 0), 10),
+    }, [])
+    sessions = sessionizer.group_calls(metadata, gap_seconds=120)
+    assert [s['call_refs'] for s in sessions] == [['A', 'B', 'C']]
+    assert sessions[0]['end'] == datetime(2024, 5, 2, 10, 11, 10)
+
+def test_group_calls_filters_talk_groups():
+    assert [s['talk_group'] for s in sessionizer.group_calls(METADATA, talk_groups={'G2'})] == ['G2']
+
+def test_discover_maps_audio_and_recordings():
+    xml_keys = {'callrefs': 'x/CallRefs.xml', 'holders': 'x/Holders.xml'}
+    sessions = sessionizer.discover(METADATA, {'T1': 'a/T1.wav', 'T2': 'a/T2.wav', 'T4': 'a/T4.wav'},
+                                    {'1': 'x/recordings/1.xml', '4': 'x/recordings/4.xml'}, xml_keys, gap_seconds=120)
+    assert [s['audio_keys'] for s in sessions] == [['a/T1.wav', 'a/T2.wav'], ['a/T4.wav']]  # T3 sin audio: se omite
+    assert sessions[0]['xml_keys'] == dict(xml_keys, recordings=['x/recordings/1.xml'])
+    assert sessions[0]['start'] == '2024-05-02T10:00:00'
@@ -0,0 +1,47 @@
+from datetime import datetime, timedelta
+
+import speaker_attribution
+
+START = datetime(2024, 5, 2, 13, 0, 0)
+
+def turn(talking_id, offset, duration, callref_id='1'):
+    return {'talking_id': talking_id, 'start_dt': START + timedelta(seconds=offset), 'duration': duration, 'callref_id': callref_id}
+
+def at(seconds):
+    return START + timedelta(seconds=seconds)
+
+def test_find_containing_turn():
+    index = speaker_attribution.TurnIndex([turn('B', 10, 5), turn('A', 0, 5), {'talking_id': 'X', 'start_dt': None}])
+    assert len(index) == 2
+    assert index.find(at(2))['talking_id'] == 'A'
+    assert index.find(at(12))['talking_id'] == 'B'
+
+def test_find_overlapping_turn_prefers_latest_start():
+    index = speaker_attribution.TurnIndex([turn('A', 0, 30), turn('B', 10, 5)])
+    assert index.find(at(12))['talking_id'] == 'B'
+    # Pasado el turno corto, el largo que empezó antes sigue abierto
+    assert index.find(at(20))['talking_id'] == 'A'
+
+def test_find_tolerance():
+    index = speaker_attribution.TurnIndex([turn('A', 0, 5), turn('B', 20, 5)])
+    assert index.find(at(5.5))['talking_id'] == 'A'
+    assert index.find(at(19.2))['talking_id'] == 'B'
+    assert index.find(at(12)) is None
+    assert speaker_attribution.TurnIndex([]).find(at(0)) is None
+
+def test_attribute_groups_words_by_turn():
+    index = speaker_attribution.TurnIndex([turn('A', 0, 3), turn('B', 3, 3)])
+    items = [
+        {'start_time': '0.5', 'end_time': '0.9', 'alternatives': [{'content': 'Copiado'}]},
+        {'alternatives': [{'content': ','}]},
+        {'start_time': '1.0', 'end_time': '1.4', 'alternatives': [{'content': 'cambio'}]},
+        {'start_time': '3.5', 'end_time': '4.0', 'alternatives': [{'content': 'Recibido'}]},
+    ]
+    utterances = speaker_attribution.attribute({'items': items}, START, index, default_speaker='?')
+    assert [(u['speaker_id'], u['text']) for u in utterances] == [('A', 'Copiado, cambio'), ('B', 'Recibido')]
+    assert utterances[0]['end'] == at(1.4)
+
+def test_session_turns_falls_back_to_session_index():
+    turns = speaker_attribution.SessionTurns([turn('A', 0, 5, '1'), turn('B', 10, 5, '2')])
+    assert turns.for_call('2').find(at(12))['talking_id'] == 'B'
+    assert turns.for_call('9').find(at(2))['talking_id'] == 'A'
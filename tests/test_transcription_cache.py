@@ -0,0 +1,69 @@
+import json
+import threading
+
+import pytest
+
+import cache_index
+import transcription_cache
+
+@pytest.fixture
+def cache(s3, manual_clock):
+    manual_clock.patch(transcription_cache, cache_index)
+    return transcription_cache.TranscriptionCache(s3, 'bucket', ttl_days=1, max_entries=3)
+
+def entries(s3):
+    return sorted(k for k in s3.objects if k.startswith('cache/transcriptions/') and not k.endswith('index.json'))
+
+def index(s3):
+    return json.loads(s3.read('cache/transcriptions/index.json'))
+
+def test_cache_key_depends_on_audio_language_and_settings():
+    key = transcription_cache.cache_key(b'RIFF', 'es-US', {'vad': True})
+    assert key == transcription_cache.cache_key(b'RIFF', 'es-US', {'vad': True})
+    assert key != transcription_cache.cache_key(b'RIFF', 'es-ES', {'vad': True})
+    assert key != transcription_cache.cache_key(b'RIFF', 'es-US', {'vad': False})
+    assert key != transcription_cache.cache_key(b'RIFX', 'es-US', {'vad': True})
+
+def test_get_put_and_ttl(s3, cache, manual_clock):
+    cache.put('a', {'items': []})
+    assert cache.get('a') == {'items': []}
+    assert cache.get_many(['a', 'b', 'a']) == {'a': {'items': []}}
+    manual_clock.advance(86401)
+    assert cache.get('a') is None
+
+def test_save_evicts_expired_and_least_recently_used(s3, cache, manual_clock):
+    for key in ('a', 'b', 'c'):
+        cache.put(key, {})
+        manual_clock.advance(10)
+    cache.save()
+    cache.get('a')
+    cache.put('d', {})
+    cache.save()
+    assert entries(s3) == [f'cache/transcriptions/{k}.json' for k in ('a', 'c', 'd')]
+    manual_clock.advance(86401)
+    cache.put('e', {})
+    cache.save()
+    assert entries(s3) == ['cache/transcriptions/e.json']
+    assert sorted(index(s3)) == ['e']
+
+def test_concurrent_saves_keep_every_entry(s3):
+    caches = [transcription_cache.TranscriptionCache(s3, 'bucket') for _ in range(8)]
+    for i, cache in enumerate(caches):
+        cache.put(f'k{i}', {})
+    threads = [threading.Thread(target=cache.save) for cache in caches]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert sorted(index(s3)) == [f'k{i}' for i in range(8)]
+
+def test_index_conflict_keeps_pending_touches(s3, cache, monkeypatch):
+    cache.put('a', {})
+    write = cache_index.CacheIndex._write
+    monkeypatch.setattr(cache_index.CacheIndex, '_write', lambda self, index, etag: False)
+    cache.save()
+    assert cache.index._touched  # Sin escribir el índice no se pierde nada ni se borra
+    monkeypatch.setattr(cache_index.CacheIndex, '_write', write)
+    cache.save()
+    assert sorted(index(s3)) == ['a']
+    assert not cache.index._touched
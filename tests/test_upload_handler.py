@@ -0,0 +1,34 @@
+import json
+
+import pytest
+
+@pytest.fixture
+def upload_handler(monkeypatch, s3):
+    monkeypatch.setenv('AUDIO_BUCKET', 'bucket')
+    import upload_handler
+    monkeypatch.setattr(upload_handler, 's3', s3)
+    return upload_handler
+
+def post(handler, filenames):
+    response = handler.handler({'httpMethod': 'POST', 'body': json.dumps({'filenames': filenames})}, None)
+    return response['statusCode'], json.loads(response['body'])
+
+def test_batch_presign(upload_handler):
+    status, body = post(upload_handler, ['1.wav', 'sessions/abc/audios/2.WAV', 'archives/abc/export.zip'])
+    assert status == 200
+    assert [u['key'] for u in body['uploads']] == ['input/1.wav', 'sessions/abc/audios/2.WAV', 'archives/abc/export.zip']
+    assert [u['content_type'] for u in body['uploads']] == ['audio/wav', 'audio/wav', 'application/zip']
+
+@pytest.mark.parametrize('filename', ['jobs/abc.json', 'cache/evaluations/x.json', 'ratelimit/transcribe.json',
+                                      'analytics/analytics.sqlite', 'sessions/../jobs/abc.json', 'input/./x.wav',
+                                      'sessions//x.wav', '/sessions/x.wav', '..'])
+def test_rejects_keys_outside_upload_prefixes(upload_handler, filename):
+    status, body = post(upload_handler, ['ok.wav', filename])
+    assert status == 400
+    assert 'uploads' not in body
+    response = upload_handler.handler({'httpMethod': 'GET', 'queryStringParameters': {'filename': filename}}, None)
+    assert response['statusCode'] == 400
+
+@pytest.mark.parametrize('filenames', ['1.wav', [], [{'name': '1.wav'}], ['  ']])
+def test_rejects_malformed_filenames(upload_handler, filenames):
+    assert post(upload_handler, filenames)[0] == 400
@@ -0,0 +1,381 @@
+"""Reevaluación en masa (nocturna) con inferencia por lotes de Bedrock, después de cambiar el prompt o el modelo.
+
+Recorre los exports del grabador bajo un prefijo de S3 o un directorio local (CallRefs.xml, Holders.xml, audios/,
+recordings/), los agrupa en sesiones como discover_sessions y arma el prompt de cada una con las transcripciones
+del caché (no se llama a Transcribe: una sesión con clips sin transcripción cacheada se omite). Los prompts van a
+archivos JSONL de inferencia por lotes (batch_inference) y las respuestas se ingieren en el job de cada sesión
+(el existente con los mismos audios o uno nuevo bulk-{hash}): resultado, estado para agregados, analítica y caché
+de evaluaciones. Las sesiones con evaluación cacheada o triviales se resuelven sin lote; un registro que falla o
+vuelve incompleto se reevalúa con InvokeModel.
+
+El avance queda en bulk/{corrida}/progress.json: volver a correr el mismo comando retoma donde quedó sin rearmar
+sesiones registradas, reenviar archivos enviados ni reingerir sesiones terminadas. Sin --wait, envía los lotes y
+termina; la corrida siguiente ingiere los que completaron. La corrida por defecto se nombra con la fuente, el
+modelo y las versiones del prompt y el léxico.
+
+Uso:
+    python tools/bulk_reprocess.py --bucket emova-audio-302263078976-dev --prefix exports/ --role-arn arn:aws:iam::302263078976:role/emova-batch
+    python tools/bulk_reprocess.py --bucket emova-audio-302263078976-dev --prefix exports/2024-12 --local-batch --wait
+    python tools/bulk_reprocess.py --dir ./exports --local ./bulk-local --offline --wait    # todo local, modelo simulado
+"""
+import argparse
+import hashlib
+import io
+import json
+import os
+import sys
+import time
+import types
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+import analytics_store
+import audio_preprocess
+import batch_inference
+import evaluation
+import evaluation_cache
+import job_store
+import lexicon
+import prompt_builder
+import session_state
+import sessionizer
+import speaker_attribution
+import tetra_metadata
+import transcription
+import transcription_cache
+
+MODEL_ID = 'us.anthropic.claude-sonnet-4-20250514-v1:0'
+SESSION_PROMPT = prompt_builder.load('session')
+POLL_SECONDS = 60
+SAVE_EVERY = 50  # Sesiones ingeridas entre escrituras del avance
+MAX_SUBMITS = 2  # Envíos de un archivo antes de reevaluar sus registros con InvokeModel
+
+class LocalBucket:
+    """Directorio con la parte de la interfaz de S3 que usan este script y los cachés (Bucket se ignora)"""
+    class NoSuchKey(Exception):
+        pass
+
+    def __init__(self, root):
+        self.root = root
+        self.exceptions = types.SimpleNamespace(NoSuchKey=LocalBucket.NoSuchKey)
+
+    def _path(self, key):
+        return os.path.join(self.root, key)
+
+    def get_object(self, Bucket, Key, **kwargs):
+        try:
+            with open(self._path(Key), 'rb') as f:
+                return {'Body': io.BytesIO(f.read())}
+        except FileNotFoundError:
+            raise LocalBucket.NoSuchKey(Key)
+
+    def put_object(self, Bucket, Key, Body, **kwargs):
+        os.makedirs(os.path.dirname(self._path(Key)), exist_ok=True)
+        with open(self._path(Key), 'wb') as f:
+            f.write(Body.encode('utf-8') if isinstance(Body, str) else Body)
+
+    def get_paginator(self, operation):
+        root = self.root
+
+        class Paginator:
+            def paginate(self, Bucket, Prefix='', Delimiter=None, **kwargs):
+                keys = []
+                for dirpath, _, filenames in os.walk(root):
+                    keys.extend(os.path.relpath(os.path.join(dirpath, name), root).replace(os.sep, '/') for name in filenames)
+                keys = [k for k in sorted(keys) if k.startswith(Prefix) and not (Delimiter and Delimiter in k[len(Prefix):])]
+                yield {'Contents': [{'Key': k} for k in keys]}
+        return Paginator()
+
+class Session:
+    """Una sesión armada como en process_job, a partir de las transcripciones cacheadas"""
+    def __init__(self, source, source_bucket, cache, audio_keys, xml_keys, hashes, model_id=MODEL_ID):
+        self.audio_keys = audio_keys
+        metadata = tetra_metadata.load(source, source_bucket, xml_keys, call_refs={transcription.clip_id(k) for k in audio_keys},
+                                       holder_name_format='Op-{}')
+        self.holders, self.callrefs, self.interventions = metadata.holders, metadata.callrefs, metadata.interventions
+        results = cache.get_many(hashes[k] for k in audio_keys if k in hashes)
+        self.missing = [k for k in audio_keys if hashes.get(k) not in results]
+
+        turns = speaker_attribution.SessionTurns(self.interventions)
+        self.transcript_entries, self.total_duration = [], 0
+        for audio_key in session_state.chronological(audio_keys, self.callrefs):
+            clip_results = results.get(hashes.get(audio_key))
+            if transcription.transcript_text(clip_results):
+                call_info = self.callrefs.get(transcription.clip_id(audio_key), {})
+                entries = prompt_builder.clip_entries(clip_results, call_info, turns, self.holders)
+                self.transcript_entries.extend(entries)
+                self.total_duration += call_info.get('duration', 0) if entries else 0
+        self.intervention_entries = prompt_builder.intervention_entries(self.interventions, self.holders)
+        self.build_prompt = prompt_builder.SessionPrompt(SESSION_PROMPT, self.transcript_entries, self.intervention_entries)
+        self.cache_key = evaluation_cache.session_key(model_id, SESSION_PROMPT, self.transcript_entries, self.intervention_entries, self.total_duration)
+
+    def requests(self):
+        return evaluation.session_requests(self.build_prompt, self.transcript_entries, self.intervention_entries)
+
+class BulkRun:
+    def __init__(self, run, source, source_bucket, s3, bucket, jobs, analytics, batch, runtime, model_id=MODEL_ID,
+                 fallback_batch=None, max_records=batch_inference.MAX_RECORDS):
+        """batch: servicio de lotes (batch_inference.BedrockBatch o LocalBatch); fallback_batch recibe los archivos con
+        menos de MIN_RECORDS registros; runtime (bedrock-runtime) reevalúa los registros fallidos o incompletos"""
+        self.run, self.source, self.source_bucket, self.s3, self.bucket = run, source, source_bucket, s3, bucket
+        self.jobs, self.analytics, self.batch, self.runtime, self.model_id = jobs, analytics, batch, runtime, model_id
+        self.fallback_batch, self.max_records = fallback_batch or batch, max_records
+        self.prefix = f'bulk/{run}'
+        self.cache = transcription_cache.TranscriptionCache(s3, bucket)
+        self.eval_cache = evaluation_cache.EvaluationCache(s3, bucket)
+        try:
+            self.progress = json.loads(s3.get_object(Bucket=bucket, Key=f'{self.prefix}/progress.json')['Body'].read())
+        except s3.exceptions.NoSuchKey:
+            self.progress = {'run': run, 'model': model_id, 'prompt': SESSION_PROMPT.fingerprint, 'sessions': {}, 'files': []}
+
+    def save(self):
+        self.s3.put_object(Bucket=self.bucket, Key=f'{self.prefix}/progress.json', Body=json.dumps(self.progress), ContentType='application/json')
+
+    def _session_key(self, job_id):
+        return f'{self.prefix}/sessions/{job_id}.json'
+
+    # 1. Sesiones y archivos de entrada
+    def existing_jobs(self):
+        """{audio_keys ordenados: job_id} de los jobs del bucket, para reevaluar en el mismo job"""
+        job_ids = [obj['Key'][len('jobs/'):-len('.json')]
+                   for page in self.s3.get_paginator('list_objects_v2').paginate(Bucket=self.bucket, Prefix='jobs/', Delimiter='/')
+                   for obj in page.get('Contents', []) if obj['Key'].endswith('.json') and '/' not in obj['Key'][len('jobs/'):]]
+        with ThreadPoolExecutor(max_workers=16) as pool:
+            records = pool.map(self.jobs.get, job_ids)
+        return {tuple(sorted(r['audio_keys'])): job_id for job_id, r in zip(job_ids, records) if r and r.get('audio_keys')}
+
+    def discover(self, prefix):
+        """Arma las sesiones nuevas de los exports bajo prefix y escribe sus registros en archivos de entrada"""
+        exports = sorted(obj['Key'][:-len('CallRefs.xml')]
+                         for page in self.source.get_paginator('list_objects_v2').paginate(Bucket=self.source_bucket, Prefix=prefix)
+                         for obj in page.get('Contents', []) if obj['Key'].split('/')[-1] == 'CallRefs.xml')
+        index = self.existing_jobs() if exports else {}
+        sessions = self.progress['sessions']
+        pending, records = {}, []
+        for base in exports:
+            xml_keys = {'callrefs': f'{base}CallRefs.xml', 'holders': f'{base}Holders.xml'}
+            found = sessionizer.discover(tetra_metadata.load(self.source, self.source_bucket, xml_keys),
+                                         sessionizer.list_keys(self.source, self.source_bucket, f'{base}audios/', '.wav'),
+                                         sessionizer.list_keys(self.source, self.source_bucket, f'{base}recordings/', '.xml'), xml_keys)
+            for found_session in found:
+                audio_keys = sorted(found_session['audio_keys'])
+                job_id = index.get(tuple(audio_keys)) or 'bulk-' + hashlib.sha1('\n'.join(audio_keys).encode('utf-8')).hexdigest()[:12]
+                if job_id in sessions:
+                    continue  # Registrada por una corrida anterior
+                info = {'audio_keys': audio_keys, 'xml_keys': found_session['xml_keys'], 'hashes': self._hashes(job_id, audio_keys),
+                        'session': {k: found_session[k] for k in ('talk_group', 'start', 'end')}}
+                status = self._prepare(job_id, info)
+                if status:
+                    sessions[job_id] = status
+                    continue
+                records.extend(info.pop('records'))
+                pending[job_id] = info
+                if len(records) >= self.max_records:
+                    self._flush(pending, records)
+                    pending, records = {}, []
+        if pending:
+            self._flush(pending, records)
+        self.save()
+
+    def _hashes(self, job_id, audio_keys):
+        """Hash de caché de cada clip: el del checkpoint del job si lo tiene, si no se baja el audio"""
+        clips = (self.jobs.get_checkpoint(job_id) or {}).get('clips', {}) if not job_id.startswith('bulk-') else {}
+        hashes = {k: clips[k]['hash'] for k in audio_keys if clips.get(k, {}).get('hash')}
+        audio = transcription.download_all(self.source, self.source_bucket, [k for k in audio_keys if k not in hashes])
+        hashes.update({k: audio_preprocess.cache_key(data) for k, data in audio.items()})
+        return hashes
+
+    def _prepare(self, job_id, info):
+        """Resuelve la sesión sin lote si se puede y retorna su estado; si no, deja sus registros en info y retorna None"""
+        session = Session(self.source, self.source_bucket, self.cache, info['audio_keys'], info['xml_keys'], info['hashes'], self.model_id)
+        if session.missing:
+            return {'status': 'skipped', 'reason': f'{len(session.missing)} clips sin transcripción cacheada'}
+        if not session.transcript_entries:
+            return {'status': 'skipped', 'reason': 'sin voz'}
+        cached = self.eval_cache.get(session.cache_key)
+        if cached is not None or session.build_prompt.trivial():
+            return self._store(job_id, info, session, cached or session.build_prompt.local_evaluation(), 'cache' if cached else 'local')
+        info['records'] = [batch_inference.record(f'{job_id}-{i}', prompt) for i, (prompt, _) in enumerate(session.requests())]
+        return None
+
+    def _flush(self, infos, records):
+        """Escribe las sesiones y su archivo de entrada, y recién después el avance que los referencia"""
+        key = f"{self.prefix}/input/part-{len(self.progress['files']):05d}.jsonl"
+        for job_id, info in infos.items():
+            self.s3.put_object(Bucket=self.bucket, Key=self._session_key(job_id), Body=json.dumps(info, ensure_ascii=False),
+                               ContentType='application/json')
+        batch_inference.write_input(self.s3, self.bucket, key, records)
+        self.progress['files'].append({'key': key, 'records': len(records), 'job_arn': None, 'status': None, 'submits': 0})
+        for job_id in infos:
+            self.progress['sessions'][job_id] = {'status': 'pending', 'file': key}
+        self.save()
+        print(f'{key}: {len(records)} registros de {len(infos)} sesiones')
+
+    # 2. Envío y seguimiento de los lotes
+    def _service(self, entry):
+        return self.fallback_batch if entry.get('fallback') else self.batch
+
+    def submit(self):
+        for entry in self.progress['files']:
+            if entry['job_arn']:
+                continue
+            entry['fallback'] = entry['records'] < batch_inference.MIN_RECORDS
+            name = f"emova-{self.run}-{entry['key'].rsplit('-', 1)[-1].split('.')[0]}-{entry['submits']}"[:63]
+            entry['job_arn'] = self._service(entry).submit(name, self.model_id, entry['key'], f'{self.prefix}/output')
+            entry['submits'] += 1
+            entry['status'] = 'Submitted'
+            self.save()
+            print(f"{entry['key']}: enviado ({entry['job_arn']})")
+
+    def refresh(self):
+        """Actualiza el estado de los lotes en curso. Retorna cuántos siguen en curso"""
+        running = 0
+        for entry in self.progress['files']:
+            if not entry['job_arn'] or entry['status'] in batch_inference.TERMINAL:
+                continue
+            entry['status'], message = self._service(entry).status(entry['job_arn'])
+            if entry['status'] in ('Failed', 'Stopped', 'Expired'):
+                print(f"{entry['key']}: {entry['status']} {message or ''}")
+                if entry['submits'] < MAX_SUBMITS:
+                    entry['job_arn'], entry['status'] = None, None  # Se reenvía
+            running += entry['status'] not in batch_inference.TERMINAL
+        self.save()
+        return running
+
+    # 3. Ingesta
+    def ingest(self):
+        sessions = self.progress['sessions']
+        done = 0
+        for entry in self.progress['files']:
+            job_ids = [job_id for job_id, s in sessions.items() if s.get('file') == entry['key'] and s['status'] == 'pending']
+            if not job_ids or entry['status'] not in batch_inference.TERMINAL:
+                continue
+            outputs = {}
+            if entry['status'] in ('Completed', 'PartiallyCompleted'):
+                outputs = batch_inference.read_output(self.s3, self.bucket, batch_inference.output_key(f'{self.prefix}/output', entry['job_arn'], entry['key']))
+            for job_id in job_ids:
+                info = json.loads(self.s3.get_object(Bucket=self.bucket, Key=self._session_key(job_id))['Body'].read())
+                try:
+                    sessions[job_id] = self._ingest(job_id, info, outputs)
+                except Exception as e:
+                    sessions[job_id] = {'status': 'error', 'file': entry['key'], 'reason': str(e)}
+                done += 1
+                if done % SAVE_EVERY == 0:
+                    self.save()
+        self.save()
+
+    def _ingest(self, job_id, info, outputs):
+        session = Session(self.source, self.source_bucket, self.cache, info['audio_keys'], info['xml_keys'], info['hashes'], self.model_id)
+        if session.missing:
+            return {'status': 'error', 'reason': f'{len(session.missing)} transcripciones salieron del caché'}
+        requests = session.requests()
+        evaluations, reasks = [], 0
+        for i, (prompt, _) in enumerate(requests):
+            text, _, error = outputs.get(f'{job_id}-{i}', (None, None, 'sin salida'))
+            result, missing = evaluation.parse(text or '', evaluation.SESSION_REQUIRED_FIELDS)
+            if error or missing:
+                reasks += 1  # Registro fallido o incompleto: se reevalúa de forma interactiva
+                result = evaluation.invoke(self.runtime, self.model_id, prompt, required=evaluation.SESSION_REQUIRED_FIELDS)
+            evaluations.append(result)
+        weights = [weight for _, weight in requests]
+        merged = evaluations[0] if weights[0] is None else evaluation.reduce_evaluations(evaluations, weights)
+        merged = session.build_prompt.expand(merged)
+        self.eval_cache.put(session.cache_key, merged)
+        return dict(self._store(job_id, info, session, merged, 'batch'), reasks=reasks)
+
+    def _store(self, job_id, info, session, session_evaluation, source):
+        """Guarda la evaluación como resultado del job, igual que process_job al terminar. Retorna el estado de la sesión"""
+        record = self.jobs.get(job_id)
+        if record is None:
+            self.jobs.create(job_id, {'job_id': job_id, 'status': 'processing', 'audio_keys': info['audio_keys'], 'xml_keys': info['xml_keys'],
+                                      'progress': 90, 'reprocess': self.run, 'session': info['session']})
+        else:
+            # Un job que otra ejecución está procesando (p. ej. un agregado) no se toca
+            claimable = record.get('status') in ('done', 'error') or record.get('reprocess') == self.run
+            updates = lambda current: {'status': 'processing', 'progress': 90, 'reprocess': self.run}
+            if not claimable or self.jobs.claim(job_id, (record.get('status'),), updates) is None:
+                return {'status': 'skipped', 'reason': f"job en estado {record.get('status')}"}
+
+        state = session_state.SessionState()
+        state.record(session.build_prompt, session.transcript_entries, session.interventions, session.holders, session.callrefs,
+                     session.total_duration, len(info['audio_keys']), session_evaluation)
+        session_state.complete(self.jobs, self.analytics, job_id, state,
+                               reprocessed={'run': self.run, 'model': self.model_id, 'prompt': SESSION_PROMPT.fingerprint, 'source': source})
+        return {'status': 'done', 'source': source, 'score': state.evaluation.get('score')}
+
+    def summary(self):
+        counts = {}
+        for s in self.progress['sessions'].values():
+            label = s['status'] + (f" ({s['source']})" if s.get('source') else '')
+            counts[label] = counts.get(label, 0) + 1
+        files = {}
+        for entry in self.progress['files']:
+            files[entry['status']] = files.get(entry['status'], 0) + 1
+        return counts, files
+
+def run_name(source, model_id):
+    digest = hashlib.sha1(json.dumps([source, model_id, SESSION_PROMPT.fingerprint, lexicon.FINGERPRINT]).encode('utf-8')).hexdigest()
+    return f'{SESSION_PROMPT.version}-{digest[:10]}'
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument('--prefix', help='Prefijo de S3 con exports (en --bucket)')
+    source.add_argument('--dir', help='Directorio local con exports')
+    target = parser.add_mutually_exclusive_group(required=True)
+    target.add_argument('--bucket', help='Bucket con el caché de transcripciones y los jobs')
+    target.add_argument('--local', help='Directorio que hace de bucket (caché, jobs con JOB_STORE=file, analítica SQLite)')
+    parser.add_argument('--run', help='Nombre de la corrida (por defecto derivado de fuente, modelo, prompt y léxico)')
+    parser.add_argument('--model', default=MODEL_ID)
+    parser.add_argument('--role-arn', default=os.environ.get('BATCH_ROLE_ARN'), help='Rol del job de inferencia por lotes')
+    parser.add_argument('--local-batch', action='store_true', help='Sin el servicio: InvokeModel por registro')
+    parser.add_argument('--offline', action='store_true', help='Sustituto local y modelo simulado (bench/fakes.py)')
+    parser.add_argument('--max-records', type=int, default=batch_inference.MAX_RECORDS, help='Registros por archivo de entrada')
+    parser.add_argument('--wait', action='store_true', help='Esperar a que terminen los lotes e ingerirlos')
+    args = parser.parse_args()
+
+    if args.local:
+        s3, bucket = LocalBucket(args.local), None
+        jobs = job_store.LocalFileJobStore(args.local)
+        analytics = analytics_store.LocalAnalyticsStore(os.path.join(args.local, 'analytics.sqlite'))
+    else:
+        import boto3
+        s3, bucket = boto3.client('s3'), args.bucket
+        jobs, analytics = job_store.S3JobStore(s3, bucket), analytics_store.S3AnalyticsStore(s3, bucket)
+    source, source_bucket = (LocalBucket(args.dir), None) if args.dir else (s3, bucket)
+
+    if args.offline:
+        sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'bench'))
+        from fakes import FakeBedrock, SimClock
+        runtime = FakeBedrock(SimClock(0.001))
+    else:
+        import boto3
+        runtime = boto3.client('bedrock-runtime')
+    local_batch = batch_inference.LocalBatch(s3, bucket, runtime)
+    if args.offline or args.local_batch:
+        batch = local_batch
+    elif not args.role_arn:
+        sys.exit('--role-arn (o BATCH_ROLE_ARN) requerido para el servicio de lotes; --local-batch para correr sin él')
+    else:
+        import boto3
+        batch = batch_inference.BedrockBatch(boto3.client('bedrock'), bucket, args.role_arn)
+
+    run = args.run or run_name(os.path.abspath(args.dir) if args.dir else f's3://{bucket}/{args.prefix}', args.model)
+    bulk = BulkRun(run, source, source_bucket, s3, bucket, jobs, analytics, batch, runtime, args.model,
+                   fallback_batch=local_batch, max_records=args.max_records)
+    if bulk.progress['prompt'] != SESSION_PROMPT.fingerprint or bulk.progress['model'] != args.model:
+        sys.exit(f"La corrida {run} se hizo con {bulk.progress['prompt']} y {bulk.progress['model']}; usar otro --run")
+    print(f'Corrida {run} ({SESSION_PROMPT.fingerprint}, {args.model})')
+    bulk.discover(args.prefix or '')
+    bulk.submit()
+    while bulk.refresh() and args.wait:
+        time.sleep(POLL_SECONDS)
+        bulk.submit()  # Archivos fallidos que se reenvían
+    bulk.ingest()
+    counts, files = bulk.summary()
+    print('Sesiones: ' + ', '.join(f'{label} {n}' for label, n in sorted(counts.items())))
+    print('Archivos: ' + ', '.join(f'{status} {n}' for status, n in files.items()))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,97 @@
+"""Reporte de latencias por etapa a partir de las métricas guardadas en jobs/*.json.
+
+Uso:
+    python tools/job_metrics_report.py --bucket emova-audio-302263078976-dev [--prefix jobs/] [--limit 500]
+    python tools/job_metrics_report.py --dir /tmp/emova-jobs        # backend JOB_STORE=file
+"""
+import argparse
+import glob
+import json
+import math
+import os
+
+PERCENTILES = (50, 90, 99)
+
+def percentile(values, p):
+    """Percentil por rango más cercano"""
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(p / 100 * len(ordered)) - 1)]
+
+def load_from_dir(base_dir):
+    for path in glob.glob(os.path.join(base_dir, 'jobs', '*.json')):
+        with open(path, encoding='utf-8') as f:
+            yield json.load(f)
+
+def load_from_s3(bucket, prefix, limit):
+    import boto3
+    s3 = boto3.client('s3')
+    count = 0
+    for page in s3.get_paginator('list_objects_v2').paginate(Bucket=bucket, Prefix=prefix):
+        for obj in page.get('Contents', []):
+            # Solo registros de estado (jobs/{id}.json), no resultados (jobs/{id}/result.json)
+            if '/' in obj['Key'][len(prefix):] or not obj['Key'].endswith('.json'):
+                continue
+            yield json.loads(s3.get_object(Bucket=bucket, Key=obj['Key'])['Body'].read())
+            count += 1
+            if limit and count >= limit:
+                return
+
+def build_report(records):
+    stages, counters, totals, statuses = {}, {}, [], {}
+    for record in records:
+        statuses[record.get('status')] = statuses.get(record.get('status'), 0) + 1
+        metrics = record.get('metrics')
+        if not metrics:
+            continue
+        totals.append(metrics['total_ms'])
+        for name, stage in metrics.get('stages', {}).items():
+            stages.setdefault(name, []).append(stage['total_ms'])
+        for name, value in metrics.get('counters', {}).items():
+            counters.setdefault(name, []).append(value)
+    return {'statuses': statuses, 'jobs_with_metrics': len(totals), 'total_ms': totals, 'stages': stages, 'counters': counters}
+
+def describe(values):
+    return dict({f'p{p}': percentile(values, p) for p in PERCENTILES}, n=len(values), max=max(values))
+
+def summarize(report):
+    """Percentiles por etapa y contador, serializables a JSON"""
+    return {
+        'statuses': report['statuses'],
+        'jobs_with_metrics': report['jobs_with_metrics'],
+        'job_total_ms': describe(report['total_ms']) if report['total_ms'] else None,
+        'stages_ms': {name: describe(values) for name, values in sorted(report['stages'].items())},
+        'counters': {name: describe(values) for name, values in sorted(report['counters'].items())}
+    }
+
+def print_report(report):
+    print(f"Jobs por estado: {report['statuses']}  |  con métricas: {report['jobs_with_metrics']}")
+    if not report['total_ms']:
+        return
+    header = f"{'etapa / contador':<32}{'n':>6}" + ''.join(f"{'p' + str(p):>12}" for p in PERCENTILES) + f"{'max':>12}"
+    print(header)
+    print('-' * len(header))
+    rows = [('job_total_ms', report['total_ms'])]
+    rows += sorted((f'{name}_ms', values) for name, values in report['stages'].items())
+    rows += sorted(report['counters'].items())
+    for name, values in rows:
+        print(f"{name:<32}{len(values):>6}" + ''.join(f"{percentile(values, p):>12.1f}" for p in PERCENTILES) + f"{max(values):>12.1f}")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument('--bucket')
+    source.add_argument('--dir')
+    parser.add_argument('--prefix', default='jobs/')
+    parser.add_argument('--limit', type=int, default=0)
+    parser.add_argument('--json', action='store_true', help='Imprimir el reporte como JSON')
+    args = parser.parse_args()
+
+    records = load_from_dir(args.dir) if args.dir else load_from_s3(args.bucket, args.prefix, args.limit)
+    report = build_report(records)
+    if args.json:
+        print(json.dumps(summarize(report), indent=2, ensure_ascii=False))
+    else:
+        print_report(report)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,125 @@
+"""Compara versiones de la plantilla de sesión sobre las fixtures de 'Prueba de audio': tokens del prompt y,
+con --invoke, los puntajes que devuelve Bedrock con cada una (media y desvío de varias corridas).
+
+Las transcripciones salen de un directorio con la salida de Transcribe por clip ({TetraCallRef}.json), del caché
+de transcripciones del bucket (después de procesar las fixtures una vez) o, sin ninguno, se sintetizan: alcanza
+para comparar tokens pero no calidad.
+
+Uso:
+    python tools/prompt_eval.py                                        # tokens por versión
+    python tools/prompt_eval.py --transcripts /tmp/fixtures-transcripts --invoke --runs 3
+    python tools/prompt_eval.py --bucket emova-audio-302263078976-dev --invoke --versions v1 v2
+"""
+import argparse
+import io
+import json
+import os
+import random
+import statistics
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'bench'))
+
+import audio_preprocess
+import dataset
+import evaluation
+import prompt_builder
+import speaker_attribution
+import tetra_metadata
+import transcription
+import transcription_cache
+
+MODEL_ID = 'us.anthropic.claude-sonnet-4-20250514-v1:0'
+SCORES = ('score',) + evaluation.CRITERIA
+
+def synthetic_results(clip, seconds):
+    """Salida de Transcribe con palabras del dominio cada ~0.5 s"""
+    rng, items, t = random.Random(clip), [], 0.2
+    words = ('tren', 'doce', 'PCO', 'copiado', 'solicito', 'autorización', 'andén', 'dos', 'afirmativo', 'confirme', 'cambio')
+    while t + 0.4 < seconds:
+        items.append({'type': 'pronunciation', 'start_time': f'{t:.2f}', 'end_time': f'{t + 0.35:.2f}',
+                      'alternatives': [{'content': rng.choice(words)}]})
+        t += rng.uniform(0.35, 0.7)
+    return {'transcripts': [{'transcript': ' '.join(i['alternatives'][0]['content'] for i in items)}], 'items': items}
+
+def load_results(fixtures, callrefs, args):
+    if args.transcripts:
+        results = {}
+        for name in fixtures['audios']:
+            path = os.path.join(args.transcripts, transcription.clip_id(name) + '.json')
+            if os.path.exists(path):
+                with open(path, encoding='utf-8') as f:
+                    data = json.load(f)
+                results[name] = data.get('results', data)
+        return results
+    if args.bucket:
+        import boto3
+        cache = transcription_cache.TranscriptionCache(boto3.client('s3'), args.bucket)
+        return {name: cache.get(audio_preprocess.cache_key(audio))
+                for name, audio in fixtures['audios'].items()}
+    return {name: synthetic_results(name, callrefs.get(transcription.clip_id(name), {}).get('duration', 5))
+            for name in fixtures['audios']}
+
+def session_entries(fixtures, args):
+    """(transcript_entries, intervention_entries) de la sesión de fixtures, como los arma process_job"""
+    holders = tetra_metadata.parse_holders(io.BytesIO(fixtures['holders']), 'Op-{}')
+    callrefs = tetra_metadata.parse_callrefs(io.BytesIO(fixtures['callrefs']), {transcription.clip_id(n) for n in fixtures['audios']})
+    interventions = [inv for name, data in fixtures['recordings'].items()
+                     for inv in tetra_metadata.parse_recording(io.BytesIO(data), name.rsplit('.', 1)[0])]
+    metadata = tetra_metadata.SessionMetadata(holders, callrefs, interventions)
+    turns = speaker_attribution.SessionTurns(metadata.interventions)
+    results = load_results(fixtures, callrefs, args)
+
+    transcript_entries = []
+    for name in sorted(fixtures['audios'], key=lambda n: tetra_metadata.sort_key(callrefs.get(transcription.clip_id(n), {'start_dt': None}))):
+        if transcription.transcript_text(results.get(name)):
+            transcript_entries.extend(prompt_builder.clip_entries(results[name], callrefs.get(transcription.clip_id(name), {}), turns, holders))
+    return transcript_entries, prompt_builder.intervention_entries(metadata.interventions, holders)
+
+def summarize(evaluations):
+    row = {}
+    for field in SCORES:
+        values = [float(e.get(field, 0)) for e in evaluations]
+        row[field] = (statistics.mean(values), statistics.pstdev(values))
+    return row
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--versions', nargs='+', help='Versiones de session a comparar (por defecto todas)')
+    parser.add_argument('--transcripts', help='Directorio con la salida de Transcribe por clip')
+    parser.add_argument('--bucket', help='Bucket con el caché de transcripciones de las fixtures')
+    parser.add_argument('--invoke', action='store_true', help='Evaluar con Bedrock y comparar puntajes')
+    parser.add_argument('--runs', type=int, default=3, help='Corridas por versión con --invoke')
+    parser.add_argument('--show', help='Imprimir el prompt de esta versión')
+    args = parser.parse_args()
+
+    transcript_entries, intervention_entries = session_entries(dataset.load_fixtures(), args)
+    if not transcript_entries:
+        sys.exit('Sin transcripciones para las fixtures')
+    versions = args.versions or prompt_builder.versions('session')
+    bedrock = None
+    if args.invoke:
+        import boto3
+        bedrock = boto3.client('bedrock-runtime')
+
+    baseline = None
+    for version in versions:
+        prompt = prompt_builder.SessionPrompt(prompt_builder.load('session', version), transcript_entries, intervention_entries)
+        tokens = evaluation.estimate_tokens(prompt(transcript_entries, intervention_entries))
+        line = f'session.{version}: {tokens} tokens estimados'
+        if args.show == version:
+            print(prompt(transcript_entries, intervention_entries))
+        if bedrock:
+            evaluations = [prompt.expand(evaluation.evaluate_session(bedrock, MODEL_ID, prompt, transcript_entries, intervention_entries))
+                           for _ in range(args.runs)]
+            row = summarize(evaluations)
+            baseline = baseline or row
+            line += '  |  ' + '  '.join(f'{f} {m:.1f}±{s:.1f} ({m - baseline[f][0]:+.1f})' for f, (m, s) in row.items())
+            operators = {e['speaker'] for e in intervention_entries}
+            covered = statistics.mean(len(operators & set(e.get('analisis_por_operador') or {})) / (len(operators) or 1) for e in evaluations)
+            line += f'  |  operadores evaluados {covered:.0%}'
+        print(line)
+
+if __name__ == '__main__':
+    main()